@@ -0,0 +1,85 @@
+"""Measure how many night actions per second can be submitted through the
+HTML gameplay page (a POST and then a GET to render the next form, for each
+action) and through the JSON API (one POST), for a 15-player game. Every
+action is skipped, so that both take the same path through the game.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_api [number of nights]"""
+
+from mafia import views
+from mafia.wsgi import app
+from mafia.engine.game import Game
+
+import re
+import sys
+import time
+
+ROLES = [0, 0, 2, 3, 3, 3, 3, 3, 4, 5, 6, 8, 9, 10, 11]
+
+def html_nights(num_nights):
+    """Play num_nights nights through the gameplay page and return the
+    number of actions submitted."""
+
+    game = Game(ROLES, False, seed=0)
+    for i, player in enumerate(game.players):
+        player.name = "Player {}".format(i)
+    game.unnamed_players = []
+    game_id = views.add_game(game)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["game_id"] = game_id
+
+    num_actions = 0
+    page = client.get("/play").get_data(as_text=True)
+    for i in range(num_nights):
+        while 'id="night-action"' in page:
+            version = re.search(r'name="version" value="(\d+)"', page)
+            client.post("/play", data={"submit": "Skip",
+                                       "version": version.group(1)})
+            num_actions += 1
+            page = client.get("/play", follow_redirects=True).get_data(
+                as_text=True)
+
+        # Day: go straight to the next night
+        version = re.search(r'name="version" value="(\d+)"', page)
+        client.post("/play", data={"start_night": "y",
+                                   "version": version.group(1)})
+        page = client.get("/play").get_data(as_text=True)
+
+    return num_actions
+
+def api_nights(num_nights):
+    """Play num_nights nights through the JSON API and return the number of
+    actions submitted."""
+
+    client = app.test_client()
+    state = client.post("/api/v1/games", json={
+        "roles": ROLES, "day_start": False, "seed": 0}).get_json()
+    url = "/api/v1/games/{}/".format(state["id"])
+    client.environ_base["HTTP_AUTHORIZATION"] = "Bearer " + state["token"]
+
+    num_actions = 0
+    for i in range(num_nights):
+        next_action = state["next_action"]
+        while next_action:
+            state = client.post(url + "night-action", json={}).get_json()
+            next_action = state.get("next_action", next_action)
+            num_actions += 1
+        client.post(url + "end-phase", json={})
+        state = client.post(url + "end-phase", json={}).get_json()
+
+    return num_actions
+
+def main():
+    num_nights = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for name, play in [("HTML", html_nights), ("API", api_nights)]:
+        start = time.perf_counter()
+        num_actions = play(num_nights)
+        elapsed = time.perf_counter() - start
+        print("{:<5} {} actions in {:.2f}s: {:.0f} actions/s".format(
+            name, num_actions, elapsed, num_actions / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare the old recursive roleblock check with the block graph in
+Game.has_been_blocked, on a night where lots of hookers block each other.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_blocks [number of hookers]"""
+
+from mafia.engine.game import Game
+
+from random import Random
+import sys
+import time
+
+def legacy_has_been_blocked(game, player):
+    """Game.has_been_blocked before the block graph was added. Recurses
+    forever on cycles, so the benchmark only makes chains and trees."""
+
+    return any(player in log.targets and log.action.name == "block"
+               and not legacy_has_been_blocked(game, log.player)
+               for log in game.action_log)
+
+def make_game(num_hookers, seed=0):
+    """Return a night-start game where each hooker blocks a random hooker
+    that comes before it, or one of the detectives."""
+
+    rng = Random(seed)
+    game = Game([2] * num_hookers + [4] * 10, False, seed=seed)
+    hookers = [p for p in game.players if p.role.id == 2]
+    detectives = [p for p in game.players if p.role.id == 4]
+
+    for i, hooker in enumerate(hookers):
+        target = rng.choice(hookers[:i] + detectives)
+        game.do_night_action(hooker, hooker.role.night_action, [target])
+    return game
+
+def bench(name, check, game, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        # Make the new version resolve the graph every time too
+        game._blocked = None
+        results = [check(game, player) for player in game.players]
+    elapsed = (time.perf_counter() - start) / repeat
+    print("{:>8}: {:10.1f} us per night".format(name, elapsed * 1e6))
+    return results
+
+def main():
+    num_hookers = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    game = make_game(num_hookers)
+    print("{} hookers, {} players".format(num_hookers, len(game.players)))
+
+    old = bench("legacy", legacy_has_been_blocked, game, 3)
+    new = bench("graph", Game.has_been_blocked, game, 100)
+    assert old == new
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure how long it takes for changes to games to reach clients waiting
+for them on /play/events, with lots of clients at once. Uses gevent if it's
+installed, like a server run under gevent would, and threads otherwise.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_events [number of clients]"""
+
+try:
+    from gevent import monkey
+    monkey.patch_all()
+    using = "gevent"
+except ImportError:
+    using = "threads"
+
+from mafia.views.events import GameEvents
+from mafia.engine.game import Game
+
+from statistics import median
+import sys
+import threading
+import time
+
+CLIENTS_PER_GAME = 10
+ROUNDS = 20
+
+def main():
+    num_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_games = num_clients // CLIENTS_PER_GAME
+    events = GameEvents()
+    games = [Game([0, 3, 3, 3], True, seed=i) for i in range(num_games)]
+    for game_id, game in enumerate(games):
+        events.publish(game_id, game)
+
+    # Time each event was published, and how long after that each client
+    # got it
+    published = {}
+    delays = []
+    done = threading.Barrier(num_clients + 1)
+
+    def client(game_id):
+        last_id = events.last_id(game_id)
+        for i in range(ROUNDS):
+            while True:
+                new_events = events.wait(game_id, last_id, 1)
+                if new_events:
+                    break
+            now = time.perf_counter()
+            for event_id, name, data in new_events:
+                delays.append(now - published[game_id, event_id])
+                last_id = event_id
+            done.wait()
+
+    clients = [threading.Thread(target=client, args=(i // CLIENTS_PER_GAME,))
+               for i in range(num_clients)]
+    for thread in clients:
+        thread.start()
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        for game_id, game in enumerate(games):
+            game.post_message("Message {}".format(i))
+            published[game_id, events.last_id(game_id) + 1] = \
+                time.perf_counter()
+            events.publish(game_id, game)
+        done.wait()
+    elapsed = time.perf_counter() - start
+
+    for thread in clients:
+        thread.join()
+
+    delays.sort()
+    print("{} clients on {} games, using {}".format(
+        num_clients, num_games, using))
+    print("{} events delivered in {:.2f}s: {:.0f} per second".format(
+        len(delays), elapsed, len(delays) / elapsed))
+    print("delay: median {:.2f} ms, 99th percentile {:.2f} ms".format(
+        median(delays) * 1e3, delays[int(len(delays) * 0.99)] * 1e3))
+
+if __name__ == "__main__":
+    main()
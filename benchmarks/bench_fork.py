@@ -0,0 +1,85 @@
+"""Measure how long it takes to fork a 100-player game and preview its
+night, compared with deep-copying the game and resolving the night in the
+copy, and how much memory each fork holds on to.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_fork [number of repeats]"""
+
+from mafia.engine.roles import actions
+from mafia.engine.actions import ActionError
+from mafia.engine.game import Game, GameOver
+
+from copy import deepcopy
+from random import Random
+import gc
+import sys
+import time
+import tracemalloc
+
+# Roughly one mafia member for every four players
+SETUP = [0, 3, 4, 3, 5, 2, 3, 6, 3, 9, 3, 0, 10, 3, 11, 1]
+
+def make_game(num_players, everyone_acts, seed=0):
+    """Return a night-start game where either every player with a night
+    action has submitted it, or only the mafia kill has been."""
+
+    rng = Random(seed)
+    game = Game([SETUP[i % len(SETUP)] for i in range(num_players)], False,
+                seed=seed)
+    for i, player in enumerate(game.players):
+        player.name = "Player {}".format(i)
+
+    for player, action in list(game.action_queue):
+        if action == actions["mafia kill"] or everyone_acts:
+            targets = rng.sample(game.players, action.targets)
+            try:
+                game.do_night_action(player, action, targets)
+            except ActionError:
+                pass
+    return game
+
+def deepcopy_preview(game):
+    """What previewing a night would cost without forks."""
+
+    copied = deepcopy(game)
+    copied.process_night_actions()
+    try:
+        copied.end_night()
+    except GameOver:
+        pass
+
+def time_per_call(f, game, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        f(game)
+    return (time.perf_counter() - start) / repeats
+
+def bytes_per_copy(f, game, num_copies=20):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = [f(game) for i in range(num_copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(copies)
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_players = 100
+
+    for everyone_acts in [False, True]:
+        game = make_game(num_players, everyone_acts)
+        print("{} players, {} night actions submitted:".format(
+            num_players, len(game.action_log)))
+        for name, f, n in [("fork", Game.fork, repeats),
+                           ("preview_night", Game.preview_night, repeats),
+                           ("deepcopy and resolve", deepcopy_preview,
+                            repeats // 20)]:
+            print("  {:<22} {:8.1f} us".format(
+                name, time_per_call(f, game, n) * 1e6))
+        for name, f in [("fork", Game.fork), ("deepcopy", deepcopy)]:
+            print("  {:<22} {:8.0f} bytes".format(
+                "memory per " + name, bytes_per_copy(f, game)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Measure how long it takes to import the game engine, the simulation and
+the whole web app in a fresh interpreter, using python -X importtime, and
+list the slowest modules each one pulls in. Exits with status 1 if the
+engine takes longer than the budget, so this can be run as a check.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_import [engine budget in ms]"""
+
+from statistics import median
+import subprocess
+import sys
+
+MODULES = ["mafia.engine.game", "mafia.simulation", "mafia.wsgi"]
+ENGINE_BUDGET = 60 # ms
+RUNS = 5
+SLOWEST = 5
+
+def import_times(module):
+    """Import module in a new interpreter and return a dict of the time in
+    ms that each module it pulled in took, including the modules that one
+    imported."""
+
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else ENGINE_BUDGET
+
+    results = {}
+    for module in MODULES:
+        runs = [import_times(module) for i in range(RUNS)]
+        results[module] = median(run[module] for run in runs)
+        print("{}: {:.1f} ms".format(module, results[module]))
+
+        # The slowest is always the module itself
+        slowest = sorted(runs[-1].items(), key=lambda item: -item[1])
+        for name, time in slowest[1:SLOWEST + 1]:
+            print("    {:<30} {:.1f} ms".format(name, time))
+
+    engine = results[MODULES[0]]
+    if engine > budget:
+        print("The engine took {:.1f} ms to import, over the budget of "
+              "{:.0f} ms".format(engine, budget))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
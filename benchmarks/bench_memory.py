@@ -0,0 +1,57 @@
+"""Measure how much memory a game takes up, including its players and a
+night's worth of action log entries.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_memory"""
+
+from mafia.engine.actions import ActionError
+from mafia.engine.game import Game, GameOver
+
+from random import Random
+import gc
+import tracemalloc
+
+# Roughly one mafia member for every four players
+SETUP = [0, 3, 4, 3, 5, 2, 3, 6, 3, 9, 3, 0, 10, 3, 11, 1]
+
+def make_game(num_players, seed):
+    """Return a night-start game where every player has submitted their
+    night action."""
+
+    rng = Random(seed)
+    game = Game([SETUP[i % len(SETUP)] for i in range(num_players)], False,
+                seed=seed)
+    for i, player in enumerate(game.players):
+        player.name = "Player {}".format(i)
+
+    for player, action in list(game.action_queue):
+        if action.targets:
+            targets = rng.sample(game.players, action.targets)
+            try:
+                game.do_night_action(player, action, targets)
+            except ActionError:
+                pass
+    try:
+        game.process_night_actions()
+    except GameOver:
+        pass
+    return game
+
+def bytes_per_game(num_players, num_games):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = [make_game(num_players, seed) for seed in range(num_games)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(games)
+
+def main():
+    for num_players, num_games in [(10, 200), (100, 50), (1000, 5)]:
+        size = bytes_per_game(num_players, num_games)
+        print("{:>5} players: {:9.0f} bytes per game, {:6.0f} per player"
+              .format(num_players, size, size / num_players))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Measure what recording metrics costs: recording one duration in a
+histogram, and calling a function wrapped to time it compared to calling
+it directly.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_metrics [number of calls]"""
+
+from mafia.engine.metrics import Histogram
+
+import sys
+import time
+
+def per_call(function, num_calls):
+    """Return the time per call of function, in microseconds."""
+
+    start = time.perf_counter()
+    for i in range(num_calls):
+        function()
+    return (time.perf_counter() - start) / num_calls * 1e6
+
+def main():
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    histogram = Histogram("bench_seconds", "Benchmark.", ["call"])
+
+    def nothing():
+        pass
+    timed = histogram.timed("nothing")(nothing)
+    labels = ("observe",)
+
+    baseline = per_call(nothing, num_calls)
+    observe = per_call(lambda: histogram.observe(labels, 0.001), num_calls)
+    wrapped = per_call(timed, num_calls)
+    print("observe:        {:.2f} us".format(observe - baseline))
+    print("timed function: {:.2f} us more than calling it directly".format(
+        wrapped - baseline))
+
+if __name__ == "__main__":
+    main()
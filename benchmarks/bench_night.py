@@ -0,0 +1,55 @@
+"""Measure how many nights per second the engine can take actions for and
+resolve, for a 15-player game where everyone with a night action uses it.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_night [number of nights]"""
+
+from mafia.engine.game import Game, DeathQueue
+
+from random import Random
+import sys
+import time
+
+def make_plan(game, rng):
+    """Return a list of (player, action, targets) for one night."""
+
+    plan = []
+    for player, action in [(game.killing_mafia(), game.action_queue[0][1])] + \
+            list(game.action_queue)[1:]:
+        others = [p for p in game.players if p != player]
+        plan.append((player, action, rng.sample(others, action.targets)))
+    return plan
+
+def reset(game):
+    """Undo the effects of a night, so that every night is the same."""
+
+    game.death_queue = DeathQueue()
+    game.night_end_hooks = []
+    game.blocked_by = {}
+    game._blocked = None
+    game.message_queue.clear()
+    game.action_queue.clear()
+    for player in game.players:
+        player.last_target = None
+
+def main():
+    num_nights = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    game = Game([0, 0, 2, 3, 3, 3, 3, 3, 4, 5, 6, 8, 9, 10, 11], False,
+                seed=0)
+    plan = make_plan(game, Random(0))
+    reset(game)
+
+    start = time.perf_counter()
+    for i in range(num_nights):
+        game.start_night()
+        for player, action, targets in plan:
+            game.do_night_action(player, action, targets)
+        game.process_night_actions()
+        reset(game)
+    elapsed = time.perf_counter() - start
+
+    print("{} nights in {:.2f}s: {:.0f} nights/s, {:.1f} us per night".format(
+        num_nights, elapsed, num_nights / elapsed, elapsed / num_nights * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Measure how many times per second the gameplay page can be loaded by a
+client that refreshes it without anything changing, with and without
+sending back the ETag it got the last time, for a 15-player game.
+
+Usage, from the repository root:
+    python -m benchmarks.bench_pages [number of loads]"""
+
+from mafia import views
+from mafia.wsgi import app
+from mafia.engine.game import Game
+
+import sys
+import time
+
+ROLES = [0, 0, 2, 3, 3, 3, 3, 3, 4, 5, 6, 8, 9, 10, 11]
+
+def main():
+    num_loads = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    game = Game(ROLES, True, seed=0)
+    for i, player in enumerate(game.players):
+        player.name = "Player {}".format(i)
+    game.unnamed_players = []
+    game_id = views.add_game(game)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["game_id"] = game_id
+    etag = client.get("/play").headers["ETag"]
+
+    for name, headers in [("render", {}),
+                          ("ETag", {"If-None-Match": etag})]:
+        start = time.perf_counter()
+        for i in range(num_loads):
+            client.get("/play", headers=headers)
+        elapsed = time.perf_counter() - start
+        print("{:<6} {} loads in {:.2f}s: {:.0f} loads/s".format(
+            name, num_loads, elapsed, num_loads / elapsed))
+
+if __name__ == "__main__":
+    main()
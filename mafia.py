@@ -1 +1 @@
-from mafia import app
+from mafia.wsgi import app
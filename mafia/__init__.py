@@ -1,6 +1,41 @@
-from flask import Flask
+import os
 
-app = Flask(__name__)
-app.config["SECRET_KEY"] = "super-secret"
+def create_app(config=None):
+    """Create the web app, with the default config updated from config.
+    Flask and the views are only imported here, so that the game engine
+    (mafia.engine) can be imported without them."""
 
-from mafia.views import start, play, done
+    from flask import Flask
+    from mafia import views
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "super-secret"
+    app.config["GAME_DATABASE"] = os.environ.get("MAFIA_GAME_DATABASE")
+    app.config["GAME_COLD_STORAGE"] = os.environ.get("MAFIA_COLD_STORAGE")
+    app.config["GAME_CACHE_MAX_GAMES"] = 1000
+    app.config["GAME_CACHE_MAX_BYTES"] = 64 * 2**20
+    app.config["GAME_IDLE_TIMEOUT"] = 3600 # seconds
+    app.config["FINISHED_GAME_TIMEOUT"] = 300 # seconds before deleting them
+    app.config["GAME_JOURNAL"] = os.environ.get("MAFIA_GAME_JOURNAL")
+    app.config["JOURNAL_SNAPSHOT_INTERVAL"] = 100 # events
+    app.config["EVENT_BUFFER_SIZE"] = 100 # events kept per game for streams
+    app.config["EVENT_HEARTBEAT"] = 15 # seconds
+    app.config["EVENT_STREAM_TIMEOUT"] = 300 # seconds before clients reconnect
+    app.config["CHECKPOINT_DEPTH"] = 20 # undo steps kept per game, 0 for none
+    app.config["ROLES_POLL_INTERVAL"] = 2 # seconds, 0 to never reload roles
+    app.config["PROFILE_DIRECTORY"] = os.environ.get("MAFIA_PROFILE_DIRECTORY")
+    app.config["PROFILE_ADMINS"] = [] # remote addresses allowed to ask
+    app.config["PROFILE_SAMPLE_EVERY"] = 0 # profile 1 in this many, 0 for none
+    app.config["PROFILE_KEEP"] = 50 # profiles
+    app.config["ESTIMATE_GAMES"] = 10000
+    app.config["SOLVER_CACHE"] = os.environ.get("MAFIA_SOLVER_CACHE")
+    app.config["SOLVER_MAX_STEPS"] = 5 * 10**4
+    app.config["SOLVER_MAX_STATES"] = 2 * 10**5 # kept in memory at once
+    app.config["BALANCE_CACHE"] = os.environ.get("MAFIA_BALANCE_CACHE",
+                                                 ":memory:")
+    app.config["BALANCE_CACHE_MAX_SETUPS"] = 10000
+    if config:
+        app.config.update(config)
+
+    views.init_app(app)
+    return app
@@ -0,0 +1,185 @@
+"""Keep track of how balanced setups are, so that the start page doesn't
+have to work it out again every time a setup is used."""
+
+from mafia.engine.roles import registry
+from mafia.estimate import estimate, available as can_estimate
+from mafia.simulation import simulate
+
+from math import sqrt
+from random import getrandbits
+import sqlite3
+import threading
+import time
+
+# Winner -> column in the setups table. Every game is counted in exactly
+# one of them, with None for games that weren't over when the simulation
+# stopped.
+columns = {"Mafia": "mafia", "Town": "town", "Cult": "cult",
+           "Serial Killer": "serial_killer", "no one": "no_one",
+           None: "undecided"}
+
+def wilson_interval(k, n, z=1.96):
+    """Return the Wilson score interval for a probability estimated from k
+    successes in n trials. With the default z, the interval has a 95% chance
+    of containing the true probability."""
+
+    if not n:
+        return (0, 1)
+
+    p = k / n
+    centre = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+    spread = z * sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    return (max(0, centre - spread), min(1, centre + spread))
+
+
+class Balance():
+    """Each faction's chances of winning with a setup. Either exact, or
+    estimated from num_games simulated games, of which wins[winner] were won
+    by each winner."""
+
+    def __init__(self, wins, num_games=None):
+        self.wins = wins
+        self.num_games = num_games
+
+    @classmethod
+    def exact(cls, chances):
+        """Return a Balance for chances worked out exactly, given as a dict of
+        winner -> probability of winning."""
+
+        return cls(chances)
+
+    @property
+    def is_exact(self):
+        return self.num_games is None
+
+    def win_rates(self):
+        """Return a dict of winner -> probability of winning."""
+
+        if self.is_exact:
+            return dict(self.wins)
+        return {winner: n / self.num_games
+                for winner, n in self.wins.items() if n}
+
+    def intervals(self):
+        """Return a dict of winner -> 95% confidence interval for their
+        chances of winning."""
+
+        if self.is_exact:
+            return {winner: (p, p) for winner, p in self.wins.items()}
+        return {winner: wilson_interval(n, self.num_games)
+                for winner, n in self.wins.items() if n}
+
+
+class BalanceCache():
+    """Estimated win rates for setups, kept in an SQLite database at path
+    (which may be ":memory:").
+
+    A setup is identified by the multiset of its role ids, whether it starts
+    during the day and the version of the roles (the current one by
+    default), so the order roles are entered in doesn't matter, and
+    estimates are started again when the roles change.
+    Each time a setup is refined, more games are simulated and added to the
+    ones already counted, so estimates get better the more a setup is used.
+    When there are more than max_setups setups, the least recently used ones
+    are forgotten."""
+
+    def __init__(self, path, max_setups=10000, clock=time.time):
+        self.max_setups = max_setups
+        self.clock = clock
+
+        # One connection, shared by all threads. Queries are tiny, so there's
+        # no point in having more.
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS setups ("
+                            "setup TEXT PRIMARY KEY, "
+                            "num_games INTEGER NOT NULL, "
+                            "last_access REAL NOT NULL)")
+            # Added one at a time, so that databases made before a column
+            # existed get it too
+            existing = {row[1] for row in
+                        self.db.execute("PRAGMA table_info(setups)")}
+            for column in columns.values():
+                if column not in existing:
+                    self.db.execute("ALTER TABLE setups ADD COLUMN {} "
+                                    "INTEGER NOT NULL DEFAULT 0".format(
+                                        column))
+            self.db.execute("CREATE INDEX IF NOT EXISTS setups_last_access "
+                            "ON setups (last_access)")
+
+    @staticmethod
+    def key(game_roles, day_start, role_table=None):
+        return "{} {} {}".format(
+            (role_table or registry.table).version,
+            "day" if day_start else "night",
+            " ".join(str(r) for r in sorted(game_roles)))
+
+    def get(self, game_roles, day_start, role_table=None):
+        """Return the Balance for a setup, or None if it hasn't been
+        estimated."""
+
+        key = self.key(game_roles, day_start, role_table)
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT num_games, {} FROM setups WHERE setup = ?".format(
+                    ", ".join(columns.values())), (key,)).fetchone()
+            if not row:
+                return None
+            self.db.execute("UPDATE setups SET last_access = ? "
+                            "WHERE setup = ?", (self.clock(), key))
+
+        return Balance(dict(zip(columns, row[1:])), row[0])
+
+    def add(self, game_roles, day_start, result, role_table=None):
+        """Add the games in a SimulationResult to the counts for a setup."""
+
+        key = self.key(game_roles, day_start, role_table)
+        unknown = set(result.wins) - set(columns)
+        if unknown:
+            raise ValueError("No column for games won by {}".format(
+                ", ".join(map(str, unknown))))
+        wins = [result.wins.get(winner, 0) for winner in columns]
+
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO setups (setup, num_games, last_access, {}) "
+                "VALUES (?, ?, ?, {}) "
+                "ON CONFLICT (setup) DO UPDATE SET "
+                "num_games = num_games + excluded.num_games, "
+                "last_access = excluded.last_access, {}".format(
+                    ", ".join(columns.values()),
+                    ", ".join("?" for column in columns),
+                    ", ".join("{0} = {0} + excluded.{0}".format(column)
+                              for column in columns.values())),
+                [key, result.num_games, self.clock()] + wins)
+            self.evict()
+
+    def evict(self):
+        """Forget the least recently used setups until there are at most
+        max_setups. Must hold self.lock."""
+
+        num_setups = self.db.execute(
+            "SELECT COUNT(*) FROM setups").fetchone()[0]
+        if num_setups > self.max_setups:
+            self.db.execute("DELETE FROM setups WHERE setup IN ("
+                            "SELECT setup FROM setups "
+                            "ORDER BY last_access LIMIT ?)",
+                            (num_setups - self.max_setups,))
+
+    def refine(self, game_roles, day_start, num_games, role_table=None):
+        """Simulate num_games more games with a setup, and return its updated
+        Balance."""
+
+        role_table = role_table or registry.table
+        if can_estimate:
+            result = estimate(game_roles, day_start, num_games,
+                              role_table=role_table)
+        else:
+            result = simulate(game_roles, day_start, num_games,
+                              seed=getrandbits(32), processes=1,
+                              role_table=role_table)
+
+        self.add(game_roles, day_start, result, role_table)
+        return self.get(game_roles, day_start, role_table)
@@ -0,0 +1,3 @@
+"""The game engine: games, players, roles and actions, and ways of storing
+and replaying games. It doesn't depend on Flask or anything else from the web
+app, so it can be imported quickly by simulations, tests and tools."""
@@ -0,0 +1,173 @@
+from bisect import insort
+from copy import copy
+
+class ActionLog():
+    """A log of actions for a particular phase in a game."""
+
+    __slots__ = ("phase", "actions")
+
+    def __init__(self, phase, actions):
+        self.phase = phase
+        self.actions = actions
+
+    def __copy__(self):
+        return ActionLog(self.phase, copy(self.actions))
+
+    def __iter__(self):
+        return self.actions.__iter__()
+
+    def __len__(self):
+        return len(self.actions)
+
+    def pop(self):
+        return self.actions.pop()
+
+    def sort(self, key=None, reverse=False):
+        self.actions.sort(key=key, reverse=reverse)
+
+    def append(self, action):
+        self.actions.append(action)
+
+class NightActionLog(ActionLog):
+    """The log of actions submitted during a night, indexed by the player
+    performing each action and by its targets, so that roleblocks can cancel
+    a player's actions in constant time and actions can be resolved in
+    priority order without sorting the log."""
+
+    __slots__ = ("by_actor", "by_target", "buckets", "priorities")
+
+    def __init__(self, phase, actions=(), priorities=()):
+        """priorities, if given, are the priorities that actions will be
+        logged with, highest first, so that their buckets don't have to be
+        set up as actions come in."""
+
+        super().__init__(phase, [])
+        self.by_actor = {}
+        self.by_target = {}
+        # Priority -> entries with that priority, in the order submitted
+        self.buckets = {priority: [] for priority in priorities}
+        # Negated priorities of the buckets, so that the highest comes first
+        self.priorities = [-priority for priority in priorities]
+
+        for action in actions:
+            self.append(action)
+
+    def __copy__(self):
+        # Copies are kept as a record of the night, so they don't need the
+        # indexes
+        return ActionLog(self.phase, copy(self.actions))
+
+    def fork(self, players):
+        """Return a copy of this log for a fork of its game, where players
+        maps the players that were copied for the fork to their copies.
+        Entries are copied too, since resolving the night cancels them."""
+
+        fork = NightActionLog(
+            self.phase, priorities=[-priority for priority in self.priorities])
+        for entry in self.actions:
+            copied = ActionEntry(
+                players.get(entry.player, entry.player), entry.action,
+                [players.get(target, target) for target in entry.targets])
+            copied.cancelled = entry.cancelled
+            fork.append(copied)
+        return fork
+
+    def append(self, entry):
+        self.actions.append(entry)
+        self.by_actor.setdefault(entry.player, []).append(entry)
+        for target in entry.targets:
+            self.by_target.setdefault(target, []).append(entry)
+
+        priority = entry.action.priority
+        if priority not in self.buckets:
+            self.buckets[priority] = []
+            insort(self.priorities, -priority)
+        self.buckets[priority].append(entry)
+
+    def cancel(self, player):
+        """Cancel all of player's actions that haven't been resolved yet."""
+
+        for entry in self.by_actor.get(player, ()):
+            entry.cancelled = True
+
+    def targeting(self, player):
+        """Return a list of the entries for actions targeting player."""
+
+        return self.by_target.get(player, [])
+
+    def pending(self):
+        """Iterate over the entries that haven't been cancelled, highest
+        priority first. Entries cancelled during iteration are skipped."""
+
+        for priority in self.priorities:
+            for entry in self.buckets[-priority]:
+                if not entry.cancelled:
+                    yield entry
+
+class LogEntry():
+    """An entry in a game's action log."""
+
+    __slots__ = ()
+
+class ActionEntry(LogEntry):
+    """An action log entry describing an attempted action."""
+
+    __slots__ = ("player", "action", "targets", "cancelled")
+
+    def __init__(self, player, action, targets):
+        self.player = player
+        self.action = action
+        self.targets = targets
+        # Set if the action was roleblocked
+        self.cancelled = False
+
+    def __str__(self):
+        return "{} uses action {} on {}".format(
+            self.player.name, self.action.name,
+            ", ".join(target.name for target in self.targets))
+
+    def data(self):
+        return (self.player, self.action, self.targets)
+
+    def html_str(self):
+        """Return a string representation of this log entry with span tags
+        around the player name, role name, action name, and target names
+        (to use for styling)."""
+
+        return ("<span class=\"player-name\">{}</span> "
+            "(<span class=\"role\">{}</span>) uses action "
+            "<span class=\"action\">{}</span> on {}".format(
+                self.player.name, self.player.role.name, self.action.name,
+                ", ".join("<span class=\"target\">{}</span>".format(t.name)
+                    for t in self.targets)))
+
+class LynchEntry(LogEntry):
+    """An action log entry describing a lynch."""
+
+    __slots__ = ("player",)
+
+    def __init__(self, player):
+        self.player = player
+
+    def __str__(self):
+        return "{} ({}) is lynched".format(self.player.name,
+            self.player.role.name)
+
+    def html_str(self):
+        """Return a string representation of this log entry with span tags
+        around the player name (to use for styling)."""
+
+        return ("<span class=\"player-name\">{}</span> "
+            "(<span class=\"role\">{}</span>) is lynched").format(
+            self.player.name, self.player.role.name)
+
+class NoLynchEntry(LogEntry):
+    """An action log entry for days where there is no lynch."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        return "No one is lynched"
+
+    def html_str(self):
+        return str(self)
@@ -1,3 +1,8 @@
+from .metrics import action_calls
+
+from functools import partial
+from time import perf_counter
+
 class ActionError(Exception):
     """Exception raised when something goes wrong while performing an action."""
 
@@ -26,7 +31,7 @@ def validate_night_action(user, action, targets, game):
     # Note: if actions are added to this category that can't target themselves,
     # this will need to be revised to only raise an error if consecutive
     # targets can be avoided.
-    if action.name in non_consecutive_target_actions:
+    if action.non_consecutive:
         if user.last_target == targets[0]:
             raise InvalidTargetError(
                 "Can't target the same person two nights in a row")
@@ -34,10 +39,10 @@ def validate_night_action(user, action, targets, game):
 
     # Check for duplicates - but only raise an error if there are enough
     # living players that duplicates can be avoided
-    living_players = len(game.living_players())
+    living_players = game.num_living()
     if (len(targets) > len(set(targets)) and
         ((action.can_target_self and living_players >= len(targets)) or
-        len(game.living_players()) > len(targets))):
+        living_players > len(targets))):
         raise InvalidTargetError("All targets must be different")
 
 ### NIGHT ACTIONS
@@ -61,8 +66,8 @@ def heal(user, game, target):
     # game.death_queue.remove(target)
 
 def block(user, game, target):
-    game.action_log = [entry for entry in game.action_log
-                       if entry.player != target]
+    if not game.has_been_blocked(user):
+        game.action_log.cancel(target)
 
 def inspect(user, game, target):
     if game.has_been_blocked(user):
@@ -81,11 +86,13 @@ def give_gun(user, game, target):
     target.guns += 1
 
 def oracle(user, game, target):
-    def alignment_reveal(game):
-        if not user.is_alive:
-            game.message_queue.append("{}'s alignment is {}".format(
-                target.name, target.perceived_alignment))
-    game.night_end_hooks.append(alignment_reveal)
+    # A partial rather than a closure so that the hook can be pickled
+    game.night_end_hooks.append(partial(oracle_reveal, user, target))
+
+def oracle_reveal(user, target, game):
+    if not user.is_alive:
+        game.post_message("{}'s alignment is {}".format(
+            target.name, target.perceived_alignment))
 
 ### DAY ACTIONS
 
@@ -122,7 +129,7 @@ def bleed(user, game, performed_actions):
         # Should bleeder survive all kill attempts in one night?
         game.death_queue.remove(user)
         user.is_bleeding = True
-        game.message_queue.append("{} is bleeding".format(user.name))
+        game.post_message("{} is bleeding".format(user.name))
         return True
 
     return False
@@ -148,17 +155,46 @@ passive_actions = {
     "bleed": bleed,
 }
 
+def bind_actions(actions):
+    """Look up the function that carries out each action, and the flags
+    used to validate it, and store them on the action, so that they don't
+    have to be looked up by name every time the action is used.
+    Raise ValueError if an action has no function, so that a typo in the
+    csv file is caught when the app starts rather than in the middle of a
+    game."""
+
+    for action in actions:
+        for handlers in (night_actions, day_actions, passive_actions):
+            if action.name in handlers:
+                action.handler = handlers[action.name]
+                break
+        else:
+            raise ValueError("No function for action {!r}".format(
+                action.name))
+
+        action.non_consecutive = action.name in non_consecutive_target_actions
+
+def call_handler(action, *args):
+    """Call the function that carries out action, recording how long it
+    takes."""
+
+    start = perf_counter()
+    try:
+        return action.handler(*args)
+    finally:
+        action_calls.observe((action.name,), perf_counter() - start)
+
 def perform_night_action(player, action, game, targets):
-    """Dispatch to the appropriate night action function."""
+    """Carry out a night action."""
 
-    return night_actions[action.name](player, game, *targets)
+    return call_handler(action, player, game, *targets)
 
 def perform_day_action(player, game, targets):
-    """Dispatch to the appropriate day action function."""
+    """Carry out player's day action."""
 
-    return day_actions[player.role.day_action.name](player, game, *targets)
+    return call_handler(player.role.day_action, player, game, *targets)
 
 def perform_passive_action(player, action, game, performed_actions):
-    """Dispatch to the approriate passive action function."""
+    """Carry out a passive action."""
 
-    return passive_actions[action.name](player, game, performed_actions)
+    return call_handler(action, player, game, performed_actions)
@@ -0,0 +1,803 @@
+from .actions import (
+    validate_night_action,
+    perform_night_action,
+    perform_day_action,
+    perform_passive_action,
+    ActionError, InvalidTargetError,
+    immediate_actions
+)
+from .action_log import *
+from .metrics import engine_calls
+from .player import Player
+from .roster import Roster
+from .schedule import NightSchedule, priority_key
+from .roles import registry, MAFIA, TOWN, CULT
+
+from collections import deque
+from copy import copy
+from functools import partial, wraps
+from math import ceil
+from random import Random, getrandbits
+
+# Messages stay on the queue after they've been shown, so that pages can be
+# rendered again without losing them; this many of the latest are kept
+MESSAGES_KEPT = 100
+
+def recorded(method):
+    """Decorator for Game methods that change the game's state. If the game
+    has a journal or history, calls made from outside the game are recorded
+    in them (before they're carried out), so that the game can be rebuilt by
+    replaying them."""
+
+    @wraps(method)
+    def wrapper(self, *args):
+        if not self._depth:
+            if self.journal:
+                self.journal.record(self, method.__name__, args)
+            if self.history:
+                self.history.record(self, method.__name__, args)
+
+        self._depth += 1
+        try:
+            return method(self, *args)
+        except ActionError:
+            # Failed actions don't change anything, so there's no point in
+            # being able to undo them
+            if self.history and self._depth == 1:
+                self.history.discard_checkpoint()
+            raise
+        finally:
+            self._depth -= 1
+
+    return wrapper
+
+def mutation(method):
+    """Like recorded, but also bumps the game's version, so that requests
+    made against an older version of the game can be detected and
+    rejected. Failed calls (ActionErrors) leave the version alone, since
+    they don't change anything."""
+
+    method = recorded(method)
+
+    @wraps(method)
+    def wrapper(self, *args):
+        try:
+            result = method(self, *args)
+        except ActionError:
+            raise
+        except BaseException:
+            # e.g. GameOver, which does change the game
+            self.version += 1
+            raise
+        self.version += 1
+        return result
+
+    return wrapper
+
+
+def resolve_blocks(blocked_by):
+    """Given a dict mapping each targeted player to a list of the players who
+    tried to block them, return the set of players who actually end up
+    blocked.
+
+    A player is blocked if at least one of their blockers isn't blocked.
+    Where that doesn't settle it, because blockers block each other in a
+    cycle, everyone involved is blocked.
+    Runs in time linear in the number of blocks."""
+
+    targets_of = {}
+    for target, blockers in blocked_by.items():
+        for blocker in blockers:
+            targets_of.setdefault(blocker, []).append(target)
+
+    # Number of each player's blockers whose fate is still unknown
+    undecided = {target: len(blockers)
+                 for target, blockers in blocked_by.items()}
+    blocked = set()
+    unblocked = [p for p in targets_of if p not in blocked_by]
+    decided = set(unblocked)
+
+    while unblocked:
+        # All of these players' blocks go through
+        newly_blocked = []
+        for blocker in unblocked:
+            for target in targets_of.get(blocker, ()):
+                if target not in decided:
+                    decided.add(target)
+                    blocked.add(target)
+                    newly_blocked.append(target)
+
+        # Players whose blockers are all blocked aren't blocked
+        unblocked = []
+        for player in newly_blocked:
+            for target in targets_of.get(player, ()):
+                undecided[target] -= 1
+                if not undecided[target] and target not in decided:
+                    decided.add(target)
+                    unblocked.append(target)
+
+    # Anyone left over is part of (or blocked from) a cycle
+    blocked.update(target for target in blocked_by if target not in decided)
+    return blocked
+
+
+class GameOver(Exception):
+    """Raised when the game is over. This is an exception so that it can be
+    raised from anywhere in the call stack to stop game processing.
+    Should be caught by the UI."""
+
+    pass
+
+class DeathQueue():
+    """A multiset of players targeted to die on a particular night.
+    May be modified by night action effects.
+    Adding a player, removing one or all instances of a player, and checking
+    whether a player is in the queue all take constant time.
+    Players are dequeued in the order they were added, with all instances of
+    a player coming out together."""
+
+    def __init__(self):
+        # Player -> number of instances of that player in the queue
+        self.counts = {}
+        # Player -> the time they were (first) added
+        self.added = {}
+        # Deque of (time added, player), which may contain players that have
+        # since been removed
+        self.order = deque()
+        self.size = 0
+        self.clock = 0
+
+    def enqueue(self, x):
+        if x in self.counts:
+            self.counts[x] += 1
+        else:
+            self.counts[x] = 1
+            self.clock += 1
+            self.added[x] = self.clock
+            self.order.append((self.clock, x))
+        self.size += 1
+
+    def dequeue(self):
+        """Remove and return the player that was added first.
+        Raise IndexError if the queue is empty."""
+
+        if not self.size:
+            raise IndexError("dequeue from an empty DeathQueue")
+
+        # Skip players that were removed after being added
+        while self.added.get(self.order[0][1]) != self.order[0][0]:
+            self.order.popleft()
+
+        x = self.order[0][1]
+        self.discard(x, 1)
+        return x
+
+    def remove(self, x):
+        """Remove one instance of x from this DeathQueue.
+        Raise ValueError if x is not found."""
+
+        if x not in self.counts:
+            raise ValueError("DeathQueue.remove(x): x not in DeathQueue")
+
+        self.discard(x, 1)
+
+    def remove_all(self, x):
+        """Remove all instances of x in this DeathQueue."""
+
+        self.discard(x, self.counts.get(x, 0))
+
+    def discard(self, x, n):
+        """Remove n instances of x, which must be in the queue at least n
+        times."""
+
+        if not n:
+            return
+
+        self.size -= n
+        self.counts[x] -= n
+        if not self.counts[x]:
+            del self.counts[x]
+            del self.added[x]
+            if not self.size:
+                self.order.clear()
+
+    def __iter__(self):
+        """Iterate over the players in the queue, in dequeue order."""
+
+        for added, x in self.order:
+            if self.added.get(x) == added:
+                for i in range(self.counts[x]):
+                    yield x
+
+    def fork(self, players):
+        """Return a copy of this queue for a fork of its game, where players
+        maps the players that were copied for the fork to their copies."""
+
+        fork = DeathQueue()
+        fork.counts = {players.get(x, x): n for x, n in self.counts.items()}
+        fork.added = {players.get(x, x): t for x, t in self.added.items()}
+        fork.order = deque((t, players.get(x, x)) for t, x in self.order)
+        fork.size = self.size
+        fork.clock = self.clock
+        return fork
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __contains__(self, x):
+        return x in self.counts
+
+    def __len__(self):
+        return self.size
+
+class Game():
+    """A single mafia game."""
+
+    @engine_calls.timed("Game.__init__")
+    def __init__(self, game_roles, day_start, seed=None, role_table=None):
+
+        # Incremented by every change to the game's state
+        self.version = 0
+
+        # Set by the UI to record changes to the game, and to be able to
+        # undo them; see journal.py
+        self.journal = None
+        self.history = None
+        self._depth = 0
+
+        # Everything needed to create this game again
+        self.game_roles = list(game_roles)
+        self.day_start = day_start
+        self.seed = getrandbits(32) if seed is None else seed
+        # The version of the roles and actions the game was started with,
+        # kept even if they're reloaded (see roles.py)
+        self.role_table = role_table or registry.table
+
+        # Players in the game, sorted by alignment and then decreasing
+        # night action priority
+        self.players = sorted([Player(None, self.role_table.roles[role])
+                               for role in game_roles],
+            key=lambda p: (p.role.alignment_id,
+            priority_key(p.role.night_action)))
+        for i, player in enumerate(self.players):
+            player.id = i
+
+        # Living players, kept up to date as players die
+        # Which actions to ask for and carry out at night, kept up to date
+        # the same way
+        self.schedule = NightSchedule(self.players, self.role_table)
+        self.roster = Roster(self.players, [self.schedule])
+
+        # Random numbers are drawn from self.rng(), which depends only on the
+        # seed and the turn, so that replaying a game gives the same results.
+        self._turn = 0
+        rng = self.rng()
+
+        # Set when a winner is determined
+        self.winner = None
+
+        # In case of multiple players with the same role, give them
+        # distinguishable names (e.g. Vigilante 1 and Vigilante 2)
+        # Not very nice-looking, but the simplest way to only number roles that
+        # actually need to be numbered.
+        players_with_role = {}
+        for player in self.players:
+            if player.role.id in players_with_role:
+                players_with_role[player.role.id].append(player)
+            else:
+                players_with_role[player.role.id] = [player]
+        for _id, players in players_with_role.items():
+            if len(players) > 1 and self.role_table.roles[_id].night_action:
+                for i, player in enumerate(players):
+                    player.role_name += " {}".format(i + 1)
+
+        # Used for the modless functionality.
+        self.is_modless = True
+        self.unnamed_players = self.players[:]
+        rng.shuffle(self.unnamed_players)
+
+        # Queue of messages to be accessed by the UI, and the number of
+        # messages ever posted to it, so that new ones can be told apart.
+        # Each message on the queue is numbered; going back keeps the count
+        # going up, so the numbers are increasing but can skip.
+        self.message_queue = deque(maxlen=MESSAGES_KEPT)
+        self.message_numbers = deque(maxlen=MESSAGES_KEPT)
+        self.num_messages = 0
+
+        # Data for night phase
+        self.action_queue = deque()
+        self.death_queue = DeathQueue()
+        self.action_log = []
+        self.night_end_hooks = []
+
+        # Who tried to block whom tonight, and who was actually blocked
+        # (worked out the first time it's needed)
+        self.blocked_by = {}
+        self._blocked = None
+
+        # Used to figure out which mafia member carries out the kill
+        # This relies on the fact that the plain Mafia role has the lowest id.
+        # Note: self.players is already sorted by alignment, so this could be
+        # made more efficient, but not really worth it.
+        # The random number is to stop plain mafia members from always being
+        # ranked in the order they were initially entered.
+        mafia_members = filter(lambda p: p.alignment_id == MAFIA,
+            self.players)
+        self.mafia_hierarchy = sorted(mafia_members,
+            key=lambda p: (p.role.id, rng.randint(0, 5)))
+
+        # Game log
+        # TODO: Need to create a class for logs, and use them to also record
+        # mafia kills and lynches.
+        self.action_logs = []
+
+        if day_start:
+            self.start_day()
+        else:
+            self.start_night()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Journals hold open files, so they have to be reattached after
+        # loading a game
+        state["journal"] = None
+        return state
+
+    def fork(self):
+        """Should only be called during the night phase.
+        Return a copy of this game that the night can be resolved in without
+        changing this game.
+
+        Only the players that resolving the night can change are copied:
+        those in tonight's action log, the death queue and end-of-night
+        hooks, and players with passive actions. The death queue and action
+        log are copied to refer to them, and everything else is shared with
+        this game, including the roster, which is only copied once one of
+        the games changes it. So anything beyond resolving the night, like
+        starting the next day, may change this game as well."""
+
+        touched = set(self.schedule.passive_actors)
+        touched.update(self.death_queue.counts)
+        for entry in self.action_log:
+            touched.add(entry.player)
+            touched.update(entry.targets)
+        for hook in self.night_end_hooks:
+            touched.update(hook.args)
+        copies = {player: copy(player) for player in touched}
+
+        fork = copy(self)
+        fork.history = None
+        fork._depth = 0
+        fork.players = [copies.get(p, p) for p in self.players]
+        fork.schedule = self.schedule.fork(copies)
+        fork.roster = self.roster.fork(fork.players, [fork.schedule])
+        for player in copies.values():
+            player.roster = fork.roster
+
+        fork.message_queue = copy(self.message_queue)
+        fork.message_numbers = copy(self.message_numbers)
+        fork.action_queue = copy(self.action_queue)
+        fork.death_queue = self.death_queue.fork(copies)
+        fork.action_log = self.action_log.fork(copies)
+        fork.action_logs = copy(self.action_logs)
+        fork.night_end_hooks = [
+            partial(hook.func, *[copies.get(arg, arg) for arg in hook.args])
+            for hook in self.night_end_hooks]
+        fork.blocked_by = {
+            copies.get(target, target): [copies.get(p, p) for p in blockers]
+            for target, blockers in self.blocked_by.items()}
+        fork._blocked = None
+        fork.mafia_hierarchy = [copies.get(p, p)
+                                for p in self.mafia_hierarchy]
+        return fork
+
+    def preview_night(self):
+        """Should only be called during the night phase.
+        Work out what would happen if the night were resolved now, without
+        changing this game. Return a tuple of (list of players who would
+        die, in the order they'd be killed, name of the faction that would
+        win or None)."""
+
+        fork = self.fork()
+        fork.process_night_actions()
+        dying = [self.players[p.id] for p in dict.fromkeys(fork.death_queue)]
+
+        try:
+            fork.end_night()
+        except GameOver:
+            pass
+
+        return dying, fork.winner
+
+    @mutation
+    def undo(self):
+        """Take the game back to just before the last lynch, kill or action
+        that hasn't already been undone. Raise ActionError if there isn't
+        one."""
+
+        self.go_back(self.history and self.history.last(False))
+
+    @mutation
+    def rewind(self):
+        """Take the game back to the start of the current phase, or the
+        previous one if nothing has happened yet in this one. Raise
+        ActionError if that's too far back."""
+
+        self.go_back(self.history and self.history.last(True))
+
+    def go_back(self, num_events):
+        """Replace this game's state with its state after the first
+        num_events events in its history. The version keeps going up, so
+        that pages from before the change are still rejected."""
+
+        if num_events is None:
+            raise ActionError("There's nothing to go back to")
+
+        past = self.history.replay(self, num_events)
+        self.history.truncate(num_events)
+        past.journal, past.history = self.journal, self.history
+        past.version, past._depth = self.version, self._depth
+        # Likewise for the message count, so that messages posted from now
+        # on are new to everyone
+        past.num_messages = self.num_messages
+        self.__dict__.update(past.__dict__)
+
+    def rng(self):
+        """Return a random number generator for the current turn."""
+
+        return Random("{}-{}".format(self.seed, self._turn))
+
+    def next_unnamed_player(self):
+        """Return the next player that needs to enter their name.
+        If all players have entered their names, return None."""
+
+        if self.unnamed_players:
+            return self.unnamed_players[-1]
+
+    @mutation
+    def pop_next_unnamed_player(self):
+        self.unnamed_players.pop()
+
+    @mutation
+    def set_player_name(self, player, name):
+        player.name = name
+        self.roster.names_changed()
+
+    @mutation
+    def switch_to_modded(self):
+        """Start showing the mod all information about players."""
+
+        self.is_modless = False
+
+    def turn(self):
+        """Return the phase and turn number this game is currently in, e.g.
+        "Day 1"."""
+
+        return "{} {}".format(self.phase.capitalize(), ceil(self._turn / 2))
+
+    @mutation
+    def lynch(self, player):
+        """Lynch a player. Triggers win condition for active alien and fool."""
+
+        if player.role.name == "Fool" or (player.role.name == "Alien" and \
+            player.is_activated):
+            # TODO: End the game
+            return
+
+        self.post_message("{} was lynched".format(player.name))
+        self.action_log.append(LynchEntry(player))
+        self.action_logs.append(self.action_log)
+
+        self.kill(player)
+
+    @mutation
+    def kill(self, player):
+        """Kill a player immediately. Used for lynching, gunshots, etc.
+        NOT used for night kills."""
+
+        player.is_alive = False
+        self.check_winner()
+
+    def reset_action_log(self):
+        """Set this game's current action log to a new empty one corresponding
+        to the current phase."""
+
+        if self.phase == "night":
+            self.action_log = NightActionLog(
+                self.turn(), priorities=self.schedule.priorities)
+        else:
+            self.action_log = ActionLog(self.turn(), [])
+
+    @mutation
+    def start_day(self):
+        """Prepare game state for the day phase."""
+
+        self._turn += 1
+        self.phase = "day"
+        self.post_message("Tell everyone to wake up")
+        self.reset_action_log()
+
+    @mutation
+    def do_gunshot(self, player, target):
+        """Should only be called during the day phase. Kill the target
+        immediately and take away player's gun."""
+
+        if not player.guns:
+            raise ActionError("This player doesn't have a gun")
+
+        if player == target:
+            raise InvalidTargetError("You can't shoot yourself with a gun")
+
+        player.guns -= 1
+        self.kill(target)
+
+    @mutation
+    def do_day_action(self, player, targets):
+        """Should only be called during the day phase.
+        Perform the player's day action on the given target(s).
+        Return the result of the action, or None if the action does not
+        give a result."""
+
+        if not player.has_day_action():
+            raise ActionError("This player doesn't have a day action "
+                              "that they can use")
+
+        if player in targets and not player.role.day_action.can_target_self:
+            raise InvalidTargetError("This role can't target itself")
+
+        self.action_log.append(
+            ActionEntry(player, player.role.day_action, targets))
+
+        result = perform_day_action(player, self, targets)
+
+        # Decrement uses remaining if applicable
+        if player.day_action_uses_left > 0:
+            player.day_action_uses_left -= 1
+
+        return result
+
+    @mutation
+    def end_day(self):
+        """End the day without a lynch."""
+
+        self.action_log.append(NoLynchEntry())
+        self.action_logs.append(self.action_log)
+
+    @mutation
+    def start_night(self):
+        """Prepare game state for the night phase."""
+
+        self._turn += 1
+        self.phase = "night"
+        self.post_message("Tell everyone to go to bed")
+        self.reset_action_log()
+
+        # NOTE: currently the mafia kill can't be blocked because it has a
+        # really high priority so that the game will ask for it first.
+        # Need to think of a better way to do this.
+        killer = self.killing_mafia()
+        if killer:
+            self.action_queue.append(
+                (killer, self.role_table.actions["mafia kill"]))
+
+        self.action_queue.extend(self.schedule.ask_order)
+
+    def next_action(self):
+        """Should only be called during the night phase.
+        Return a tuple of (player, action) for the player who should next
+        perform a night action.
+        If every player has taken their night action, return None."""
+
+        if self.action_queue:
+            # NOTE: To add Nurse and Deputy, the best way to arrange it is
+            # probably to return them here instead of the doc/cop if the
+            # original role is dead.
+            return self.action_queue[0]
+
+    @mutation
+    def pop_next_action(self):
+        self.action_queue.popleft()
+
+    def killing_mafia(self):
+        """Return the player that carries out the mafia kill tonight.
+        If all the mafia are dead, return None."""
+
+        return next(filter(lambda p: p.is_alive, self.mafia_hierarchy), None)
+
+    def living_players(self):
+        """Return a list of all the players that are currently alive, in the
+        same order as self.players."""
+
+        return sorted(self.roster, key=lambda p: p.id)
+
+    def num_living(self):
+        """Return the number of players that are currently alive."""
+
+        return len(self.roster)
+
+    def has_been_blocked(self, player):
+        """Return True if player has been blocked tonight, False otherwise.
+        See resolve_blocks for how blocks on blockers are handled."""
+
+        if self._blocked is None:
+            self._blocked = resolve_blocks(self.blocked_by)
+
+        return player in self._blocked
+
+    @mutation
+    def do_night_action(self, player, action, targets):
+        """Should only be called during the night phase.
+        Add player's night action to the action log.
+        If the night action is one that needs to be performed immediately
+        (e.g. inspection), perform it and all results (if any) to the
+        message queue.
+        Return the result of the night action if it was performed immediately,
+        otherwise return None."""
+
+        validate_night_action(player, action, targets, self)
+
+        self.action_log.append(ActionEntry(player, action, targets))
+        if action.name == "block":
+            self.blocked_by.setdefault(targets[0], []).append(player)
+            self._blocked = None
+
+        # Decrement remaining uses, if applicable
+        # Note: limited uses are based on night action attempts, i.e.
+        # if a role is blocked, it still loses a use if it tries to use
+        # its action.
+        if (action == player.role.night_action and
+            player.night_action_uses_left > 0):
+            player.night_action_uses_left -= 1
+
+        # Actions that need to be performed immediately
+        if action.immediate:
+            result = perform_night_action(player, action, self, targets)
+            # TODO: put this in the action function instead
+            self.post_message("Inspection result: {}".format(
+                result))
+            return result
+
+    def do_passive_action(self, player, performed_actions):
+        """Perform a player's passive action, if applicable."""
+
+        result = perform_passive_action(player, player.role.passive_action,
+            self, performed_actions)
+
+        if result and player.passive_action_uses_left > 0:
+            player.passive_action_uses_left -= 1
+            self.schedule.update(player)
+
+    @engine_calls.timed("process_night_actions")
+    @mutation
+    def process_night_actions(self):
+        """Should be called once all night actions have been submitted.
+        Resolve the night actions and change the game state accordingly."""
+
+        self.post_message("All actions in")
+        self.action_logs.append(copy(self.action_log))
+
+        # Need to keep record of actions actually performed for passive roles
+        performed_actions = []
+
+        # Perform each action in decreasing order of priority. Performing
+        # actions may cancel ones that haven't been performed yet (e.g.
+        # roleblocking).
+        for entry in self.action_log.pending():
+            player, action, targets = entry.data()
+            performed_actions.append((player, action, targets))
+            if not action.immediate:
+                perform_night_action(player, action, self, targets)
+
+
+        # Perform passive actions, if applicable.
+        # Currently passive actions don't add anything to the action log.
+        # (Copied, since players that use up their actions are removed)
+        for player in list(self.schedule.passive_actors):
+            self.do_passive_action(player, performed_actions)
+
+
+    @engine_calls.timed("end_night")
+    @mutation
+    def end_night(self):
+        """End the night phase and process all deaths."""
+
+        announcements = []
+
+        if not self.death_queue:
+            self.post_message("No one died!")
+
+        # Empty the death queue
+        while self.death_queue:
+            dead_player = self.death_queue.dequeue()
+            announcements.append("{} is dead".format(dead_player.name))
+            dead_player.is_alive = False
+
+        # Clean up
+        self.blocked_by = {}
+        self._blocked = None
+        for player in self.players:
+            player.reset_nightly_flags()
+
+        # Read all death announcements in a random order
+        self.rng().shuffle(announcements)
+        for announcement in announcements:
+            self.post_message(announcement)
+
+        # Invoke end-of-night hooks
+        while self.night_end_hooks:
+            self.night_end_hooks.pop()(self)
+
+        self.check_winner()
+
+    @engine_calls.timed("check_winner")
+    def check_winner(self):
+        """Check if a win condition has been met. If so, raise GameOver with
+        the name of the winning faction."""
+
+        self.winner = self.calculate_winner()
+        if self.winner:
+            raise GameOver(self.winner)
+
+    def calculate_winner(self):
+        """If a win condition has been met, return the name of the winning
+        faction.
+        If everybody loses, return "no one".
+        Otherwise, return None."""
+
+        num_living = len(self.roster)
+        living_mafia = self.roster.count(MAFIA)
+        living_town = self.roster.count(TOWN)
+        living_cult = self.roster.count(CULT)
+        living_third_party = []
+
+        if num_living > living_mafia + living_town + living_cult:
+            living_third_party = [p for p in self.roster
+                if p.alignment_id not in (MAFIA, TOWN, CULT)]
+
+        # Need to figure out priority of win conditions
+        if not num_living:
+            return "no one" # everybody loses
+
+        for player in living_third_party:
+            # Assumes there can only be one serial killer in a game
+            if player.role.name == "Serial Killer" and num_living <= 2:
+                return "Serial Killer"
+            # Add more third-party roles
+
+        if not living_mafia and not living_cult and not living_third_party:
+            return "Town"
+        elif living_mafia >= num_living / 2:
+            return "Mafia"
+        elif living_cult >= num_living / 2:
+            return "Cult"
+
+    def post_message(self, message):
+        """Add a message to the message queue."""
+
+        self.num_messages += 1
+        self.message_queue.append(message)
+        self.message_numbers.append(self.num_messages)
+
+    def messages_since(self, num_seen):
+        """Return a list of the messages posted after the first num_seen
+        that are still on the message queue. Unlike pop_messages, this
+        doesn't change the game."""
+
+        new = []
+        for number, message in zip(reversed(self.message_numbers),
+                                   reversed(self.message_queue)):
+            if number <= num_seen:
+                break
+            new.append(message)
+        new.reverse()
+        return new
+
+    @recorded
+    def pop_messages(self):
+        """Clear the message queue and return a list of the messages that
+        were on it, in the same order."""
+
+        temp = self.message_queue
+        self.message_queue = deque(maxlen=MESSAGES_KEPT)
+        self.message_numbers = deque(maxlen=MESSAGES_KEPT)
+        return temp
@@ -0,0 +1,297 @@
+from .actions import ActionError
+from .game import Game, GameOver
+from .player import Player
+from .store import dump_game, load_game
+from .roles import Action, get_table
+
+import json
+import os
+
+def encode(value):
+    """Convert a method argument to something that can be written as JSON."""
+
+    if isinstance(value, Player):
+        return {"p": value.id}
+    if isinstance(value, Action):
+        return {"a": value.id}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    return value
+
+def decode(value, game):
+    """Inverse of encode, looking up players in game."""
+
+    if isinstance(value, dict):
+        if "p" in value:
+            return game.players[value["p"]]
+        return game.role_table.action_ids[value["a"]]
+    if isinstance(value, list):
+        return [decode(v, game) for v in value]
+    return value
+
+def apply_event(game, event):
+    """Make the call recorded in event on game. Calls that failed the first
+    time around are expected to fail again."""
+
+    name, *args = event
+    try:
+        getattr(game, name)(*(decode(arg, game) for arg in args))
+    except (ActionError, GameOver):
+        pass
+
+def new_game(init_event):
+    """Return a game created with the arguments recorded in the first line
+    of a journal, with a history attached if it had one. The game gets the
+    version of the roles it was started with."""
+
+    version = init_event[5] if len(init_event) > 5 else None
+    rows = init_event[6] if len(init_event) > 6 else None
+    game = Game(*init_event[1:4], role_table=get_table(version, rows))
+    if len(init_event) > 4 and init_event[4]:
+        game.history = GameHistory(init_event[4])
+    return game
+
+def read_events(path):
+    """Return a list of the events in the journal at path, ignoring a
+    partially written last line."""
+
+    events = []
+    with open(path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            events.append(json.loads(line))
+    return events
+
+
+class GameJournal():
+    """An append-only file recording every call that changed a game's state
+    (see the recorded decorator in game.py), one JSON list per line: the
+    method name followed by its arguments. The first line records the
+    arguments the game was created with, including its random seed.
+
+    Every so often the journal also saves a snapshot of the whole game, so
+    that recovering the latest state of a game only needs to replay the calls
+    made since then. Rebuilding the game at any earlier point replays the
+    journal from the start."""
+
+    def __init__(self, directory, game_id, num_events, snapshot_interval):
+        self.journal_path = os.path.join(
+            directory, "{}.journal".format(game_id))
+        self.snapshot_path = os.path.join(
+            directory, "{}.snapshot".format(game_id))
+        self.num_events = num_events
+        self.snapshot_interval = snapshot_interval
+
+    @classmethod
+    def create(cls, directory, game_id, game, snapshot_interval=100):
+        """Start a journal for a newly created game and attach it."""
+
+        journal = cls(directory, game_id, 0, snapshot_interval)
+        journal.write(["init", game.game_roles, game.day_start, game.seed,
+                       game.history.depth if game.history else 0,
+                       game.role_table.version, game.role_table.rows])
+        game.journal = journal
+        return journal
+
+    @classmethod
+    def recover(cls, directory, game_id, snapshot_interval=100):
+        """Return the latest state of a game from its journal, with the
+        journal attached to it, or None if the game has no journal."""
+
+        path = os.path.join(directory, "{}.journal".format(game_id))
+        if not os.path.exists(path):
+            return None
+
+        events = read_events(path)
+        game, start = cls.load_snapshot(directory, game_id, len(events))
+        if not game:
+            game, start = new_game(events[0]), 1
+        for event in events[start:]:
+            apply_event(game, event)
+
+        game.journal = cls(directory, game_id, len(events), snapshot_interval)
+        return game
+
+    @staticmethod
+    def rebuild(directory, game_id, num_events=None, turn=None):
+        """Return a game as it was after its first num_events events, or at
+        the start of the given turn (e.g. "Night 2"), by replaying its
+        journal from the beginning. The game doesn't get a journal."""
+
+        events = read_events(
+            os.path.join(directory, "{}.journal".format(game_id)))
+        game = new_game(events[0])
+        for event in events[1:num_events]:
+            if turn and game.turn() == turn:
+                break
+            apply_event(game, event)
+        return game
+
+    @classmethod
+    def attach(cls, directory, game_id, game, snapshot_interval=100):
+        """Reattach a game's existing journal to it, e.g. after loading the
+        game from a store. Does nothing if the game has no journal."""
+
+        path = os.path.join(directory, "{}.journal".format(game_id))
+        if os.path.exists(path):
+            game.journal = cls(directory, game_id, len(read_events(path)),
+                               snapshot_interval)
+
+    @staticmethod
+    def delete(directory, game_id):
+        """Delete a game's journal and snapshot, if it has them."""
+
+        for extension in ["journal", "snapshot"]:
+            try:
+                os.remove(os.path.join(
+                    directory, "{}.{}".format(game_id, extension)))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def load_snapshot(directory, game_id, max_events):
+        """Return (game, number of events it includes) from the game's
+        snapshot, or (None, 0) if there is no usable one."""
+
+        path = os.path.join(directory, "{}.snapshot".format(game_id))
+        try:
+            with open(path, "rb") as f:
+                num_events = int(f.readline())
+                data = f.read()
+        except (FileNotFoundError, ValueError):
+            return None, 0
+
+        if num_events > max_events:
+            return None, 0
+        return load_game(data), num_events
+
+    def record(self, game, name, args):
+        """Append a call to the journal, first taking a snapshot of game if
+        one is due."""
+
+        if self.num_events % self.snapshot_interval == 0:
+            self.snapshot(game)
+        self.write([name] + encode(args))
+
+    def write(self, event):
+        # Opened for each write so that games don't hold on to a file each
+        # for as long as they're in memory
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(event, separators=(",", ":")) + "\n")
+        self.num_events += 1
+
+    def snapshot(self, game):
+        """Save a copy of game, which must include every recorded event."""
+
+        temp = self.snapshot_path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write("{}\n".format(self.num_events).encode())
+            f.write(dump_game(game))
+        os.replace(temp, self.snapshot_path)
+
+
+class GameHistory():
+    """An in-memory record of the calls that changed a game since its oldest
+    checkpoint, so that the game can be taken back to any checkpoint by
+    replaying them. Attached to a game as game.history.
+
+    Checkpoints are made before every lynch, kill or action, and at the
+    start of every phase (the first one starting once every player has
+    entered their name). A checkpoint is just a position in the list of
+    calls, so making one costs nothing, and the history only grows by the
+    calls themselves. Only the last depth checkpoints are guaranteed to be
+    kept: once there are twice that many, the older half is dropped, and
+    the game as it was at the oldest remaining one is saved in place of the
+    calls before it."""
+
+    # Calls that are undone by undo()
+    actions = ("lynch", "kill", "do_gunshot", "do_day_action", "end_day",
+               "do_night_action")
+    # Calls that start a phase, which rewind() goes back to
+    phase_starts = ("start_day", "start_night")
+
+    def __init__(self, depth):
+        self.depth = depth
+        # dump_game of the game before the first event, or None if that's
+        # the game as it was created
+        self.base = None
+        self.events = []
+        # List of (number of events, whether it's the start of a phase)
+        self.checkpoints = []
+
+    def record(self, game, name, args):
+        """Add a call to the history, making a checkpoint before it if it's
+        an action or after it if it starts a phase. Calls that move
+        through the history itself aren't recorded."""
+
+        if name in ("undo", "rewind"):
+            return
+
+        if name in self.actions:
+            self.checkpoint(game, False)
+        self.events.append([name] + encode(args))
+        if name in self.phase_starts or (
+                # The first phase starts once everyone has their name
+                name == "pop_next_unnamed_player" and
+                len(game.unnamed_players) == 1):
+            self.checkpoint(game, True)
+
+    def checkpoint(self, game, is_phase_start):
+        self.checkpoints.append((len(self.events), is_phase_start))
+        if len(self.checkpoints) > 2 * self.depth:
+            self.drop(game, len(self.checkpoints) - self.depth)
+
+    def drop(self, game, num_checkpoints):
+        """Forget the first num_checkpoints checkpoints."""
+
+        start = self.checkpoints[num_checkpoints][0]
+        self.base = dump_game(self.replay(game, start))
+        self.events = self.events[start:]
+        self.checkpoints = [(n - start, is_phase_start) for n, is_phase_start
+                            in self.checkpoints[num_checkpoints:]]
+
+    def discard_checkpoint(self):
+        """Forget the last checkpoint, for an action that failed without
+        changing anything."""
+
+        if self.checkpoints[-1:] == [(len(self.events) - 1, False)]:
+            self.checkpoints.pop()
+
+    def last(self, phase_start):
+        """Return the number of events before the last action (or the last
+        start of a phase, if phase_start is set) that something has happened
+        since, or None if there isn't one."""
+
+        for n, is_phase_start in reversed(self.checkpoints):
+            if n < len(self.events) and is_phase_start == phase_start:
+                return n
+
+    def replay(self, game, num_events):
+        """Return a copy of game as it was after the first num_events
+        events, without a journal or history."""
+
+        if self.base:
+            past = load_game(self.base)
+        else:
+            past = Game(game.game_roles, game.day_start, game.seed,
+                        game.role_table)
+        for event in self.events[:num_events]:
+            apply_event(past, event)
+        return past
+
+    def truncate(self, num_events):
+        """Forget everything after the first num_events events."""
+
+        del self.events[num_events:]
+        # Checkpoints for actions that have just been undone go too
+        while self.checkpoints and (
+                self.checkpoints[-1][0] > num_events or
+                self.checkpoints[-1] == (num_events, False)):
+            self.checkpoints.pop()
+
+def last_game_id(directory):
+    """Return the highest id of any game with a journal in directory, or 0."""
+
+    return max((int(name.split(".")[0]) for name in os.listdir(directory)
+                if name.endswith(".journal")), default=0)
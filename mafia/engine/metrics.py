@@ -0,0 +1,137 @@
+"""Latency histograms for the game engine and the web app, exported in the
+Prometheus text format at /metrics (see views/metrics.py).
+
+Each thread counts into its own shard of each histogram, so recording a
+duration takes no lock: the shards are only added up when the metrics are
+exported. When a thread finishes, its shard is folded into the histogram's
+totals."""
+
+from bisect import bisect_left
+from functools import wraps
+from itertools import count
+from time import perf_counter
+import threading
+import weakref
+
+# Upper bounds of the buckets, in seconds
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+           0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class ThreadToken():
+    """Kept in a thread's local data, so that the histogram finds out when
+    the thread finishes."""
+
+    __slots__ = ("__weakref__",)
+
+def escape(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+class Histogram():
+    """A histogram of durations, with one series for each combination of
+    label values (e.g. each route and method)."""
+
+    def __init__(self, name, help, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+        self.local = threading.local()
+        # Only held when a thread records its first duration, when it
+        # finishes, and while exporting
+        self.lock = threading.Lock()
+        # Shards of the threads that are still running, by a unique key.
+        # Each shard maps a tuple of label values to a list of the number of
+        # durations in each bucket (and one more, for slower ones), followed
+        # by their sum.
+        self.shards = {}
+        self.keys = count()
+        # The sum of the shards of finished threads
+        self.retired = {}
+
+    def new_shard(self):
+        shard = self.local.shard = {}
+        token = self.local.token = ThreadToken()
+        key = next(self.keys)
+        with self.lock:
+            self.shards[key] = shard
+        weakref.finalize(token, self.retire, key)
+        return shard
+
+    def retire(self, key):
+        with self.lock:
+            self.add(self.retired, self.shards.pop(key))
+
+    def add(self, totals, shard):
+        for labels, series in list(shard.items()):
+            total = totals.get(labels)
+            if total is None:
+                totals[labels] = list(series)
+            else:
+                for i, value in enumerate(series):
+                    total[i] += value
+
+    def observe(self, labels, seconds):
+        """Record a duration for the series with the given label values."""
+
+        try:
+            shard = self.local.shard
+        except AttributeError:
+            shard = self.new_shard()
+
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def totals(self):
+        """Return the sum of every thread's shard."""
+
+        totals = {}
+        with self.lock:
+            self.add(totals, self.retired)
+            for shard in self.shards.values():
+                self.add(totals, shard)
+        return totals
+
+    def expose(self):
+        """Return the histogram in the Prometheus text format."""
+
+        lines = ["# HELP {} {}".format(self.name, self.help),
+                 "# TYPE {} histogram".format(self.name)]
+        for labels, series in sorted(self.totals().items()):
+            label_text = "".join('{}="{}",'.format(name, escape(value))
+                                 for name, value in zip(self.label_names,
+                                                        labels))
+            cumulative = 0
+            for bound, num in zip(self.buckets + ("+Inf",), series):
+                cumulative += num
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(
+                    self.name, label_text, bound, cumulative))
+            lines.append("{}_sum{{{}}} {}".format(
+                self.name, label_text.rstrip(","), series[-1]))
+            lines.append("{}_count{{{}}} {}".format(
+                self.name, label_text.rstrip(","), cumulative))
+        return "\n".join(lines) + "\n"
+
+    def timed(self, *labels):
+        """Decorator that records how long each call to a function takes."""
+
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(labels, perf_counter() - start)
+            return wrapper
+
+        return decorator
+
+engine_calls = Histogram("mafia_engine_call_seconds",
+                         "Time spent in game engine calls.", ["call"])
+action_calls = Histogram("mafia_action_seconds",
+                         "Time spent carrying out each action.", ["action"])
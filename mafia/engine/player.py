@@ -1,19 +1,29 @@
-from ..models import roles
+from .roles import alignments
 
 class Player():
     """A single player in a specific game."""
 
-    def __init__(self, name, role_id):
+    __slots__ = ("name", "id", "role", "role_name", "_is_alive", "roster",
+                 "alignment_id", "perceived_alignment_id",
+                 "night_action_uses_left", "day_action_uses_left",
+                 "passive_action_uses_left", "is_bleeding", "is_activated",
+                 "_has_lost_action", "guns", "last_target")
+
+    def __init__(self, name, role):
 
         self.name = name
-        self.role = roles[role_id]
+        # Position in the game's list of players, set by the game
+        self.id = None
+        self.role = role
         self.role_name = self.role.name
 
-        self.is_alive = True
+        self._is_alive = True
+        # Notified when this player dies; see roster.py
+        self.roster = None
 
         # Data initially taken from role, but can be changed
-        self.alignment = self.role.alignment
-        self.perceived_alignment = self.role.perceived_alignment
+        self.alignment_id = self.role.alignment_id
+        self.perceived_alignment_id = self.role.perceived_alignment_id
 
         # Data for limited-use actions. -1 means no limit.
         self.night_action_uses_left = self.role.night_action_uses
@@ -23,7 +33,7 @@ class Player():
         # Flags for special roles
         self.is_bleeding = False # bleeder
         self.is_activated = False # alien
-        self.has_lost_action = False # psychic
+        self._has_lost_action = False # psychic
         self.guns = 0 # gunsmith targets
 
         self.last_target = None # protective roles
@@ -31,6 +41,43 @@ class Player():
         # Nightly flags
         # none currently
 
+    def __copy__(self):
+        # Used by Game.fork, so it needs to be quick
+        player = Player.__new__(Player)
+        for attr in Player.__slots__:
+            setattr(player, attr, getattr(self, attr))
+        return player
+
+    @property
+    def alignment(self):
+        return alignments[self.alignment_id]
+
+    @property
+    def perceived_alignment(self):
+        return alignments[self.perceived_alignment_id]
+
+    @property
+    def has_lost_action(self):
+        return self._has_lost_action
+
+    @has_lost_action.setter
+    def has_lost_action(self, has_lost_action):
+        if has_lost_action != self._has_lost_action:
+            self._has_lost_action = has_lost_action
+            if self.roster is not None:
+                self.roster.update(self)
+
+    @property
+    def is_alive(self):
+        return self._is_alive
+
+    @is_alive.setter
+    def is_alive(self, is_alive):
+        if is_alive != self._is_alive:
+            self._is_alive = is_alive
+            if self.roster is not None:
+                self.roster.update(self)
+
     def has_night_action(self):
         """Return True if this player has a night action that it can currently
         use, False otherwise."""
@@ -0,0 +1,69 @@
+"""A binary cache of the converted rows of actions.csv and roles.csv, so that
+processes can load the roles without parsing the csv files, or even
+importing the csv module. Build it after changing the files with
+
+    python -m mafia.engine.rolecache [directory]
+
+Until it's built again, the files are read instead. The cache is a single
+marshalled tuple, which is quicker to load than the files are to parse."""
+
+import marshal
+import os
+import sys
+
+# Changed whenever the layout of the cache changes
+FORMAT = "mafia-roles-1"
+
+def cache_path(directory):
+    return os.path.join(directory, "roles.cache")
+
+def build(directory):
+    """Write the cache for the csv files in directory, and return its
+    version."""
+
+    # Imported here because roles.py imports this module
+    from .roles import csv_mtimes, read_rows
+
+    mtimes = csv_mtimes(directory)
+    version, action_rows, role_rows = read_rows(directory)
+    data = marshal.dumps((FORMAT, marshal.version, version, mtimes,
+                          action_rows, role_rows))
+
+    # Written to a temporary file and moved into place, so that processes
+    # starting up meanwhile never see half a cache
+    path = cache_path(directory)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return version
+
+def load(directory):
+    """Return (version, action rows, role rows) from the cache in directory
+    if it's up to date with the csv files, otherwise None. The cache is up
+    to date if the files' mtimes haven't changed since it was built, or if
+    they have but their contents haven't (e.g. after a fresh checkout)."""
+
+    from .roles import csv_mtimes, csv_version
+
+    try:
+        with open(cache_path(directory), "rb") as f:
+            cache = marshal.load(f)
+        mtimes = csv_mtimes(directory)
+    except (OSError, ValueError, EOFError, TypeError):
+        # Missing, empty or corrupt, or made by another Python version
+        return None
+
+    if (not isinstance(cache, tuple) or len(cache) != 6 or
+            cache[:2] != (FORMAT, marshal.version)):
+        return None
+
+    version, cached_mtimes, action_rows, role_rows = cache[2:]
+    if cached_mtimes != mtimes and csv_version(directory)[1] != version:
+        return None
+    return version, action_rows, role_rows
+
+if __name__ == "__main__":
+    directory = (sys.argv[1] if len(sys.argv) > 1 else
+                 os.path.dirname(os.path.abspath(__file__)))
+    print("Built {} (version {})".format(cache_path(directory),
+                                         build(directory)))
@@ -0,0 +1,298 @@
+from . import rolecache
+
+from types import MappingProxyType
+import io
+import os
+import threading
+import time
+import weakref
+
+alignments = ["mafia", "town", "cult", "self"]
+# Alignments are stored as indices into alignments
+MAFIA, TOWN, CULT, SELF = range(len(alignments))
+
+class Record():
+    """A row read from a csv file. Columns the class knows about are stored
+    in __slots__ to save memory. Any other columns end up in self.extra, but
+    can still be accessed as attributes, so that new columns can be added to
+    the csv files without touching the code."""
+
+    __slots__ = ("extra",)
+
+    def __init__(self, **data):
+        self.extra = {}
+        for key, value in data.items():
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                self.extra[key] = value
+
+    def __getattr__(self, name):
+        # Only called for attributes that aren't in __slots__
+        try:
+            return object.__getattribute__(self, "extra")[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+class Action(Record):
+    """An action (kill, inspect, block, etc.)"""
+
+    __slots__ = ("id", "name", "priority", "can_target_self", "targets",
+                 "immediate", "optional",
+                 # Set by bind_actions in actions.py
+                 "handler", "non_consecutive",
+                 # Version and rows of the RoleTable this belongs to
+                 "version", "rows")
+
+    def __reduce__(self):
+        # Pickle by version and id, so saved games refer to the table of
+        # actions they were started with. The table's rows are pickled once
+        # per game, so that the table can be made again if it's gone.
+        return (get_action, (self.id, self.version, self.rows))
+
+class Role(Record):
+    """A mafia role (mafia, villager, detective, etc.)."""
+
+    __slots__ = ("id", "name", "night_action_id", "night_action_uses",
+                 "day_action_id", "day_action_uses", "passive_action_id",
+                 "passive_action_uses", "alignment_id",
+                 "perceived_alignment_id", "description",
+                 "night_action", "day_action", "passive_action", "version",
+                 "rows")
+
+    def __init__(self, action_ids, **data):
+        """Initialize this role's data. Meant to be invoked on data read from
+        a csv file, with the list of actions read along with it."""
+
+        super().__init__(**data)
+
+        self.night_action = (None if self.night_action_id is None
+                             else action_ids[self.night_action_id])
+        self.day_action = (None if self.day_action_id is None
+                             else action_ids[self.day_action_id])
+        self.passive_action = (None if self.passive_action_id is None
+                             else action_ids[self.passive_action_id])
+
+    @property
+    def alignment(self):
+        return alignments[self.alignment_id]
+
+    @property
+    def perceived_alignment(self):
+        return alignments[self.perceived_alignment_id]
+
+    def __reduce__(self):
+        # Pickle by version and id, like actions
+        return (get_role, (self.id, self.version, self.rows))
+
+def convert_none(row, k, convert=(lambda x: x)):
+    """Replace empty strings with None, and convert non-empty strings using
+    the given convert function."""
+
+    row[k] = convert(row[k]) if row[k] else None
+
+def convert_bool(v):
+    return v == "True"
+
+def convert_action_values(row):
+    """Convert values read from actions.csv to their proper types. This needs
+    to be updated whenever a new non-string action attribute is added."""
+
+    row["id"] = int(row["id"])
+    convert_none(row, "priority", convert=float)
+    convert_none(row, "can_target_self", convert=convert_bool)
+    convert_none(row, "targets", convert=int)
+    convert_none(row, "immediate", convert=convert_bool)
+    convert_none(row, "optional", convert=convert_bool)
+
+    return row
+
+def convert_role_values(row):
+    """Convert values read from roles.csv to their proper types. This needs to
+    be updated whenever a new non-string role attribute is added."""
+
+    row["id"] = int(row["id"])
+    convert_none(row, "night_action_id", convert=int)
+    convert_none(row, "night_action_uses", convert=int)
+    convert_none(row, "day_action_id", convert=int)
+    convert_none(row, "day_action_uses", convert=int)
+    convert_none(row, "passive_action_id", convert=int)
+    convert_none(row, "passive_action_uses", convert=int)
+    row["alignment_id"] = int(row["alignment_id"])
+    row["perceived_alignment_id"] = int(row["perceived_alignment_id"])
+
+    return row
+
+def read_csv(data, converter):
+    """Return the result of applying converter to each row of the csv file
+    with contents data."""
+
+    # Imported here because it's slow to import, and not needed when the
+    # cache is used
+    from csv import DictReader
+
+    return [converter(row) for row in DictReader(io.StringIO(data.decode()))]
+
+def csv_paths(directory):
+    return [os.path.join(directory, name + ".csv")
+            for name in ["actions", "roles"]]
+
+def csv_mtimes(directory):
+    return [os.stat(path).st_mtime_ns for path in csv_paths(directory)]
+
+def csv_version(directory):
+    """Return the contents of the csv files in directory, and their
+    version: a hash of the contents."""
+
+    # Imported here for the same reason as csv
+    import hashlib
+
+    contents = []
+    for path in csv_paths(directory):
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    return contents, hashlib.sha1(b"\0".join(contents)).hexdigest()[:12]
+
+def read_rows(directory):
+    """Parse the csv files in directory, and return their version and the
+    converted rows of actions.csv and roles.csv."""
+
+    contents, version = csv_version(directory)
+    return (version, read_csv(contents[0], convert_action_values),
+            read_csv(contents[1], convert_role_values))
+
+class RoleTable():
+    """One version of the actions and roles, as loaded from the csv files.
+    Tables aren't changed once they've been loaded; when the files change,
+    a new table is loaded instead (see RoleRegistry).
+
+    self.rows has the converted rows of actions.csv and roles.csv the table
+    was made from, so that a game saved with a table can make it again
+    after it's been dropped, or in a process that never loaded it."""
+
+    def __init__(self, version, action_ids, roles, rows):
+        self.version = version
+        self.action_ids = tuple(action_ids)
+        self.actions = MappingProxyType(
+            {action.name: action for action in action_ids})
+        self.roles = tuple(roles)
+        self.rows = rows
+
+    def __reduce__(self):
+        return (get_table, (self.version, self.rows))
+
+def make_table(version, action_rows, role_rows):
+    """Return a RoleTable of the given rows, with the functions that carry
+    out the actions attached."""
+
+    # Imported here because the rest of the engine imports this module
+    from .actions import bind_actions
+
+    rows = (action_rows, role_rows)
+    action_ids = [Action(**row) for row in action_rows]
+    bind_actions(action_ids)
+    roles = [Role(action_ids, **row) for row in role_rows]
+    for record in action_ids + roles:
+        record.version = version
+        record.rows = rows
+    return RoleTable(version, action_ids, roles, rows)
+
+def load_table(directory):
+    """Load the actions and roles in actions.csv and roles.csv in directory.
+    The table's version is a hash of the files' contents. The rows are
+    taken from the cache built by rolecache.py instead if it's up to
+    date."""
+
+    return make_table(*(rolecache.load(directory) or read_rows(directory)))
+
+class RoleRegistry():
+    """The actions and roles in a directory's csv files, loaded again when
+    the files change.
+
+    self.table is the current RoleTable. A new version replaces it in one
+    assignment, so it can be read without a lock, and anything holding on
+    to an older one (like games started with it) keeps a consistent table.
+    self.tables has every version that's still in use: the current one and
+    any that games in memory were started with. Other versions are dropped,
+    so that reloading doesn't use up more and more memory; saved games
+    bring theirs back when they're loaded (see get_table)."""
+
+    def __init__(self, directory, interval=2):
+        self.directory = directory
+        # Seconds between checks of the files' modification times
+        self.interval = interval
+        self.next_poll = time.monotonic() + interval
+        # Held while the files are being loaded
+        self.reloading = threading.Lock()
+
+        self.mtimes = self.stat()
+        self.table = load_table(directory)
+        self.tables = weakref.WeakValueDictionary(
+            {self.table.version: self.table})
+
+    def stat(self):
+        return csv_mtimes(self.directory)
+
+    def poll(self):
+        """Start loading the files again in the background if they've
+        changed since they were last loaded. Only checks once every interval
+        seconds, and never waits, so it can be called before every
+        request."""
+
+        now = time.monotonic()
+        if now < self.next_poll:
+            return
+        self.next_poll = now + self.interval
+
+        try:
+            changed = self.stat() != self.mtimes
+        except OSError:
+            # In the middle of being replaced
+            return
+        if changed and not self.reloading.locked():
+            threading.Thread(target=self.reload, daemon=True).start()
+
+    def reload(self):
+        """Load the files again, make them the current table if they've
+        changed, and return the current table."""
+
+        with self.reloading:
+            # Not tried again until the files change again, even if they
+            # can't be loaded
+            self.mtimes = mtimes = self.stat()
+            table = load_table(self.directory)
+            if self.stat() != mtimes:
+                # Changed while they were being read; try at the next poll
+                self.mtimes = None
+                return self.table
+
+            self.table = self.tables.setdefault(table.version, table)
+            return self.table
+
+def get_table(version=None, rows=None):
+    """Return the table with the given version. If it isn't loaded (e.g. if
+    the files changed before a restart, or the games using it have all been
+    moved out of memory), it's made again from rows, the rows it was made
+    from. Without them, the current table is returned."""
+
+    table = registry.tables.get(version)
+    if table is None and rows is not None:
+        table = registry.tables.setdefault(version,
+                                           make_table(version, *rows))
+    return table or registry.table
+
+def get_action(action_id, version=None, rows=None):
+    return get_table(version, rows).action_ids[action_id]
+
+def get_role(role_id, version=None, rows=None):
+    return get_table(version, rows).roles[role_id]
+
+# The actions and roles in this package, reloaded when the files change
+# (see RoleRegistry.poll). Each game keeps the table it was started with.
+registry = RoleRegistry(os.path.dirname(__file__))
+
+# The table loaded at startup, for code that doesn't need to see changes.
+# Anything that should follow changes to the files uses registry.table.
+action_ids = registry.table.action_ids
+actions = registry.table.actions
+roles = registry.table.roles
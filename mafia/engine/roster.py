@@ -0,0 +1,93 @@
+from .roles import alignments
+
+from copy import copy
+
+class Roster():
+    """The living players in a game, and how many of them there are of each
+    alignment. Kept up to date by the players themselves whenever one of
+    them dies, so that nothing has to go through the whole list of players
+    to find out who's alive."""
+
+    def __init__(self, players, listeners=()):
+        # The game's list of players, indexed by id
+        self.players = players
+        # Objects with an update(player) method, to be called whenever a
+        # player is updated here
+        self.listeners = list(listeners)
+        # Id of living player -> the alignment id they're counted under
+        self.alive = {}
+        # Number of living players with each alignment id
+        self.counts = [0] * len(alignments)
+        # Set when alive and counts are shared with a fork of this roster,
+        # so that they're copied before either roster changes them
+        self._shared = False
+        # List of (id, name) of living players sorted by name, or None if it
+        # needs to be worked out again
+        self._by_name = None
+
+        for player in players:
+            player.roster = self
+            self.update(player)
+
+    def fork(self, players, listeners=()):
+        """Return a roster for a fork of this roster's game, whose list of
+        players is players. The two rosters share their counts until one of
+        them changes."""
+
+        fork = copy(self)
+        fork.players = players
+        fork.listeners = list(listeners)
+        self._shared = fork._shared = True
+        return fork
+
+    def update(self, player):
+        """Count player again. Players call this when they die or lose their
+        action, but it also needs to be called if a living player's
+        alignment changes."""
+
+        if self._shared:
+            self.alive = dict(self.alive)
+            self.counts = list(self.counts)
+            self._shared = False
+
+        alignment_id = self.alive.pop(player.id, None)
+        if alignment_id is not None:
+            self.counts[alignment_id] -= 1
+
+        if player.is_alive:
+            self.alive[player.id] = player.alignment_id
+            self.counts[player.alignment_id] += 1
+
+        self._by_name = None
+        for listener in self.listeners:
+            listener.update(player)
+
+    def count(self, alignment_id):
+        """Return the number of living players with the given alignment id
+        (see roles.py)."""
+
+        return self.counts[alignment_id]
+
+    def names_changed(self):
+        """Needs to be called when a player's name changes."""
+
+        self._by_name = None
+
+    def by_name(self):
+        """Return a list of (id, name) for each living player, sorted by
+        name. The list is shared, so it must not be modified."""
+
+        if self._by_name is None:
+            self._by_name = sorted(
+                ((i, self.players[i].name) for i in self.alive),
+                key=lambda t: t[1])
+        return self._by_name
+
+    def __contains__(self, player):
+        return player.id in self.alive
+
+    def __iter__(self):
+        return map(self.players.__getitem__, self.alive)
+
+    def __len__(self):
+        return len(self.alive)
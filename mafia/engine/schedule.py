@@ -0,0 +1,54 @@
+from copy import copy
+
+def priority_key(action, reverse=True):
+    """Use for sorting players by action priority."""
+
+    if not action or action.priority is None:
+        return float("inf") if reverse else float("-inf")
+
+    return -action.priority if reverse else action.priority
+
+class NightSchedule():
+    """The order in which a game's night actions are asked for and carried
+    out. Roles don't change during a game, so this is worked out once when
+    the game is created, and then kept up to date as players die or lose
+    their actions, instead of going through every player each night."""
+
+    def __init__(self, players, role_table):
+        # (player, night action) for every player whose role has one, in the
+        # order they're asked for them: decreasing priority, since players
+        # are already sorted that way. Dead players are included, so that
+        # the mod can pretend to ask them in modless games.
+        self.ask_order = [(player, player.role.night_action)
+                          for player in players if player.role.night_action]
+
+        # Every priority a night action can be carried out at, highest first
+        self.priorities = sorted(
+            {role_table.actions["mafia kill"].priority} |
+            {action.priority for _, action in self.ask_order
+             if action.priority is not None},
+            reverse=True)
+
+        # Players who can still use their passive action, in the order the
+        # actions are carried out. A dict is used as an ordered set.
+        self.passive_actors = dict.fromkeys(sorted(
+            filter(lambda p: p.has_passive_action(), players),
+            key=lambda p: priority_key(p.role.passive_action)))
+
+    def update(self, player):
+        """Stop scheduling player's passive action if they can't use it any
+        more. Needs to be called when a player dies, loses their action or
+        uses it up."""
+
+        if not player.has_passive_action():
+            self.passive_actors.pop(player, None)
+
+    def fork(self, players):
+        """Return a copy of this schedule for a fork of its game, where
+        players maps the players that were copied for the fork to their
+        copies."""
+
+        fork = copy(self)
+        fork.passive_actors = dict.fromkeys(
+            players.get(p, p) for p in self.passive_actors)
+        return fork
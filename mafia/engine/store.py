@@ -0,0 +1,486 @@
+from collections import OrderedDict
+import io
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+def dump_game(game):
+    """Serialize a game to a compact byte string.
+    Roles and actions are pickled by id (see roles.py), so this only
+    stores the per-game state."""
+
+    return zlib.compress(pickle.dumps(game, pickle.HIGHEST_PROTOCOL))
+
+# Where the engine used to live, for loading games saved before it moved
+MOVED_MODULES = {"mafia.models.roles": "mafia.engine.roles"}
+MOVED_MODULES.update(
+    ("mafia.views." + name, "mafia.engine." + name)
+    for name in ["action_log", "actions", "game", "journal", "player",
+                 "roster", "schedule", "store"])
+
+class GameUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        return super().find_class(MOVED_MODULES.get(module, module), name)
+
+def load_game(data):
+    """Inverse of dump_game."""
+
+    return GameUnpickler(io.BytesIO(zlib.decompress(data))).load()
+
+
+class GameConflict(Exception):
+    """Raised by put when another process has saved the game since this one
+    read it, so saving it would lose the other process's changes."""
+
+    def __init__(self, game_id):
+        super().__init__("Game {} was changed by another process".format(
+            game_id))
+        self.game_id = game_id
+
+
+class GameStore():
+    """A table of running games, keyed by integer game id.
+    Subclasses decide where the games actually live."""
+
+    # Number of games moved out of memory
+    evictions = 0
+
+    def __init__(self):
+        # game_id -> lock for that game
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        # Called with the id of each game moved out of memory, so that
+        # anything else kept about it can be dropped too
+        self.on_evict = None
+
+    def lock(self, game_id):
+        """Return the lock that must be held while getting, changing and
+        putting the game with the given id. Each game has its own lock, so
+        requests for different games don't wait on each other."""
+
+        with self.locks_lock:
+            lock = self.locks.get(game_id)
+            if lock is None:
+                lock = self.locks[game_id] = threading.Lock()
+            return lock
+
+    def evicted(self, game_ids):
+        """Forget the locks of games that have been moved out of memory,
+        unless they're held, and pass their ids to on_evict. Must not hold
+        any of the store's other locks."""
+
+        with self.locks_lock:
+            for game_id in game_ids:
+                lock = self.locks.get(game_id)
+                if lock is not None and not lock.locked():
+                    del self.locks[game_id]
+        if self.on_evict:
+            for game_id in game_ids:
+                self.on_evict(game_id)
+
+    def allocate_id(self):
+        """Reserve and return a new, unused game id."""
+
+        raise NotImplementedError
+
+    def get(self, game_id):
+        """Return the game with the given id, or None if there is none."""
+
+        raise NotImplementedError
+
+    def put(self, game_id, game):
+        """Save game under game_id. Must be called after every change to a
+        game's state, since some stores keep a copy elsewhere. Stores shared
+        between processes raise GameConflict if the game has been saved by
+        another process since it was read."""
+
+        raise NotImplementedError
+
+    def delete(self, game_id):
+        """Forget the game with the given id, if there is one."""
+
+        raise NotImplementedError
+
+    def add(self, game):
+        """Store a new game and return its id."""
+
+        game_id = self.allocate_id()
+        self.put(game_id, game)
+        return game_id
+
+    def loaded_games(self):
+        """Return a list of the games held in this process's memory."""
+
+        return []
+
+
+class MemoryGameStore(GameStore):
+    """Keeps games in a dict in this process. Games are lost on restart and
+    can't be shared between worker processes."""
+
+    def __init__(self):
+        super().__init__()
+        self.games = {}
+        self.next_game_id = 1
+        self.id_lock = threading.Lock()
+
+    def allocate_id(self):
+        with self.id_lock:
+            self.next_game_id += 1
+            return self.next_game_id - 1
+
+    def get(self, game_id):
+        return self.games.get(game_id)
+
+    def put(self, game_id, game):
+        self.games[game_id] = game
+
+    def delete(self, game_id):
+        self.games.pop(game_id, None)
+        self.locks.pop(game_id, None)
+
+    def loaded_games(self):
+        return list(self.games.values())
+
+
+class SQLiteGameStore(GameStore):
+    """Keeps games in an SQLite database (in WAL mode, so readers don't block
+    the writer), which can be shared by several worker processes.
+
+    The last max_games games read or written by this process are also kept
+    in memory along with their revision numbers. A lookup only reads the
+    game's revision from the database, and only reads the game itself back
+    if the revision has changed since. Saving a game only succeeds if its
+    revision is still the one this process read."""
+
+    def __init__(self, path, max_games=1000):
+        super().__init__()
+        self.path = path
+        self.max_games = max_games
+        # sqlite3 connections can't be shared between threads
+        self.local = threading.local()
+        # game_id -> (revision, game), least recently used first
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
+        db = self.connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS games ("
+                   "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                   "revision INTEGER NOT NULL DEFAULT 0, "
+                   "data BLOB)")
+        db.commit()
+
+    def connection(self):
+        """Return this thread's connection to the database."""
+
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path)
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def allocate_id(self):
+        db = self.connection()
+        with db:
+            cursor = db.execute("INSERT INTO games (data) VALUES (NULL)")
+            return cursor.lastrowid
+
+    def get(self, game_id):
+        if game_id is None:
+            return None
+
+        db = self.connection()
+        cached = self.cached(game_id)
+        row = db.execute("SELECT revision FROM games WHERE id = ?",
+                         (game_id,)).fetchone()
+        if not row:
+            with self.cache_lock:
+                self.cache.pop(game_id, None)
+            return None
+
+        if cached and cached[0] == row[0]:
+            return cached[1]
+
+        revision, data = db.execute(
+            "SELECT revision, data FROM games WHERE id = ?",
+            (game_id,)).fetchone()
+        if data is None:
+            return None
+
+        game = load_game(data)
+        self.remember(game_id, revision, game)
+        return game
+
+    def put(self, game_id, game):
+        # The revision this process last read or wrote; new games start at 0
+        cached = self.cached(game_id)
+        revision = cached[0] if cached else 0
+
+        db = self.connection()
+        with db:
+            cursor = db.execute(
+                "UPDATE games SET data = ?, revision = revision + 1 "
+                "WHERE id = ? AND revision = ?",
+                (dump_game(game), game_id, revision))
+        if cursor.rowcount == 0:
+            # Read again next time
+            with self.cache_lock:
+                self.cache.pop(game_id, None)
+            raise GameConflict(game_id)
+        self.remember(game_id, revision + 1, game)
+
+    def delete(self, game_id):
+        db = self.connection()
+        with db:
+            db.execute("DELETE FROM games WHERE id = ?", (game_id,))
+        with self.cache_lock:
+            self.cache.pop(game_id, None)
+        self.locks.pop(game_id, None)
+
+    def loaded_games(self):
+        with self.cache_lock:
+            return [game for revision, game in self.cache.values()]
+
+    def cached(self, game_id):
+        """Return (revision, game) for a game in the cache, or None."""
+
+        with self.cache_lock:
+            cached = self.cache.get(game_id)
+            if cached:
+                self.cache.move_to_end(game_id)
+            return cached
+
+    def remember(self, game_id, revision, game):
+        """Cache a game, dropping the least recently used ones past
+        max_games. Games whose locks are held are kept, since whoever holds
+        the lock needs the revision they read to save the game."""
+
+        evicted = []
+        with self.cache_lock:
+            self.cache[game_id] = (revision, game)
+            self.cache.move_to_end(game_id)
+            for i in range(len(self.cache) - self.max_games):
+                old_id, entry = self.cache.popitem(last=False)
+                lock = self.locks.get(old_id)
+                if lock is not None and lock.locked():
+                    self.cache[old_id] = entry
+                else:
+                    self.evictions += 1
+                    evicted.append(old_id)
+        self.evicted(evicted)
+
+
+class TieredGameStore(GameStore):
+    """Keeps recently used games in memory and moves idle ones to compressed
+    files in a directory, loading them back transparently when they're
+    needed again.
+
+    A game is evicted from memory when it hasn't been used for idle_timeout
+    seconds (finished_timeout for games that are over), or when keeping it
+    would exceed max_games games or max_bytes bytes in memory, least recently
+    used first. Sizes are estimated from the pickled size of each game.
+    Idle games are looked for at most once every sweep_interval seconds.
+
+    Games are serialized in put, before taking the lock on the hot tier, and
+    evicted games are written to disk after letting go of it, so that
+    requests for other games only wait for the bookkeeping."""
+
+    def __init__(self, directory, max_games=1000, max_bytes=64 * 2**20,
+                 idle_timeout=3600, finished_timeout=300, sweep_interval=60,
+                 clock=time.monotonic):
+        super().__init__()
+        self.directory = directory
+        self.max_games = max_games
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.finished_timeout = finished_timeout
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.last_sweep = clock()
+
+        # Hot tier, least recently used first:
+        # game_id -> [game, size, last used, dumped game if it has changed
+        # since it was written to disk, otherwise None]
+        self.hot = OrderedDict()
+        self.hot_bytes = 0
+        self.hot_lock = threading.Lock()
+        # game_id -> dumped game, for evicted games that haven't been
+        # written to disk yet. Also protected by hot_lock.
+        self.pending = {}
+        # Held while writing files, so that a game's file always ends up
+        # with its latest version
+        self.write_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.next_game_id = 1 + max(
+            (int(name.split(".")[0]) for name in os.listdir(directory)
+             if name.endswith(".game")), default=0)
+
+    def path(self, game_id):
+        return os.path.join(self.directory, "{}.game".format(game_id))
+
+    def stats(self):
+        """Return a dict of counters for sizing the hot tier."""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hot_games": len(self.hot),
+            "hot_bytes": self.hot_bytes,
+        }
+
+    def allocate_id(self):
+        with self.hot_lock:
+            self.next_game_id += 1
+            return self.next_game_id - 1
+
+    def get(self, game_id):
+        with self.hot_lock:
+            entry = self.hot.get(game_id)
+            if entry:
+                self.hits += 1
+                entry[2] = self.clock()
+                self.hot.move_to_end(game_id)
+                evicted = self.evict()
+            else:
+                self.misses += 1
+                data = self.pending.get(game_id)
+        if entry:
+            self.write_pending(evicted)
+            self.evicted(evicted)
+            return entry[0]
+
+        try:
+            if data is None:
+                with open(self.path(game_id), "rb") as f:
+                    data = f.read()
+        except FileNotFoundError:
+            return None
+        pickled = zlib.decompress(data)
+        game = GameUnpickler(io.BytesIO(pickled)).load()
+
+        with self.hot_lock:
+            # Another thread may have loaded it in the meantime
+            if game_id in self.hot:
+                return self.hot[game_id][0]
+            # If it came from pending, it's written to disk by whoever
+            # evicted it
+            self.insert(game_id, game, len(pickled), None)
+            evicted = self.evict()
+        self.write_pending(evicted)
+        self.evicted(evicted)
+        return game
+
+    def put(self, game_id, game):
+        pickled = pickle.dumps(game, pickle.HIGHEST_PROTOCOL)
+        data = zlib.compress(pickled)
+        with self.hot_lock:
+            self.insert(game_id, game, len(pickled), data)
+            evicted = self.evict()
+        self.write_pending(evicted)
+        self.evicted(evicted)
+
+    def delete(self, game_id):
+        with self.write_lock:
+            with self.hot_lock:
+                entry = self.hot.pop(game_id, None)
+                if entry:
+                    self.hot_bytes -= entry[1]
+                self.pending.pop(game_id, None)
+            try:
+                os.remove(self.path(game_id))
+            except FileNotFoundError:
+                pass
+        self.locks.pop(game_id, None)
+
+    def loaded_games(self):
+        with self.hot_lock:
+            return [entry[0] for entry in self.hot.values()]
+
+    def flush(self):
+        """Write every changed game in the hot tier to disk, e.g. before
+        shutting down."""
+
+        with self.hot_lock:
+            for game_id, entry in self.hot.items():
+                if entry[3] is not None:
+                    self.pending[game_id] = entry[3]
+                    entry[3] = None
+            game_ids = list(self.pending)
+        self.write_pending(game_ids)
+
+    def insert(self, game_id, game, size, data):
+        """Add or replace a hot tier entry. data is the dumped game if it
+        hasn't been written to disk. Must hold self.hot_lock."""
+
+        old = self.hot.pop(game_id, None)
+        if old:
+            self.hot_bytes -= old[1]
+            if data is None:
+                data = old[3]
+
+        self.hot[game_id] = [game, size, self.clock(), data]
+        self.hot_bytes += size
+
+    def evict(self):
+        """Move games out of the hot tier until it's within its limits, and
+        return their ids, for writing the ones that have changed to disk
+        (with write_pending) and passing to evicted, after letting go of the
+        lock. Must hold self.hot_lock."""
+
+        evicted = []
+        now = self.clock()
+        if now - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = now
+            for game_id, (game, _, last_used, _) in list(self.hot.items()):
+                timeout = (self.finished_timeout if game.winner
+                           else self.idle_timeout)
+                if now - last_used >= timeout:
+                    self.evict_one(game_id, evicted)
+
+        while self.hot and (len(self.hot) > self.max_games or
+                            self.hot_bytes > self.max_bytes):
+            self.evict_one(next(iter(self.hot)), evicted)
+        return evicted
+
+    def evict_one(self, game_id, evicted):
+        game, size, _, data = self.hot.pop(game_id)
+        self.hot_bytes -= size
+        self.evictions += 1
+        if data is not None:
+            self.pending[game_id] = data
+        evicted.append(game_id)
+
+    def write_pending(self, game_ids):
+        """Write the pending versions of the given games to disk. Must not
+        hold self.hot_lock."""
+
+        for game_id in game_ids:
+            with self.write_lock:
+                with self.hot_lock:
+                    data = self.pending.get(game_id)
+                if data is None:
+                    # Unchanged, or already written by someone else
+                    continue
+                self.write(game_id, data)
+                with self.hot_lock:
+                    if self.pending.get(game_id) is data:
+                        del self.pending[game_id]
+
+    def write(self, game_id, data):
+        """Atomically write a dumped game to its file in the cold tier."""
+
+        path = self.path(game_id)
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
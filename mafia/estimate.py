@@ -0,0 +1,364 @@
+"""Estimate how likely each faction is to win with a given setup by playing
+many games at once with NumPy.
+
+Games follow the same random-play model as simulation.RandomPolicy, but
+instead of a Game object per game, the state of all the games is kept in
+arrays with one row per game and one column per player, and each step of
+the game is carried out for every game at once.
+
+NumPy is optional; if it isn't installed, available is False and the rest
+of the app works as usual.
+"""
+
+from mafia.engine.roles import registry, alignments, MAFIA, TOWN, CULT
+from mafia.simulation import RandomPolicy, SimulationResult
+from mafia.engine.game import priority_key
+
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+available = np is not None
+
+# Winner codes. Factions are represented by their alignment id.
+UNDECIDED = -1
+NO_ONE = len(alignments)
+
+winner_names = {MAFIA: "Mafia", TOWN: "Town", CULT: "Cult", NO_ONE: "no one",
+                UNDECIDED: None}
+
+# Actions that have no effect on who wins under random play
+no_op_actions = ("inspect", "parity", "oracle")
+
+supported_night_actions = ("kill", "block", "heal", "give gun") + no_op_actions
+supported_day_actions = ("shoot",)
+supported_passive_actions = ("bleed",)
+
+def choose(rng, candidates):
+    """For each row of the boolean array candidates, return the column of a
+    uniformly random True entry, or -1 if there are none."""
+
+    keys = rng.random(candidates.shape)
+    keys[~candidates] = -1
+    choices = keys.argmax(axis=1)
+    choices[~candidates.any(axis=1)] = -1
+    return choices
+
+def calculate_winners(alive, alignment_ids):
+    """Game.calculate_winner for many games at once. alive is a boolean array
+    with a row for each game; return an array of winner codes.
+    There are no third-party roles with a win condition yet, so those are
+    not checked."""
+
+    num_living = alive.sum(axis=1)
+    living_mafia = alive[:, alignment_ids == MAFIA].sum(axis=1)
+    living_town = alive[:, alignment_ids == TOWN].sum(axis=1)
+    living_cult = alive[:, alignment_ids == CULT].sum(axis=1)
+
+    # Assigned from the lowest priority up, so that later ones win
+    winners = np.full(len(alive), UNDECIDED)
+    winners[living_cult >= num_living / 2] = CULT
+    winners[living_mafia >= num_living / 2] = MAFIA
+    winners[num_living == living_town] = TOWN
+    winners[num_living == 0] = NO_ONE
+    return winners
+
+def resolve_blocks(block_targets, blockers, num_players):
+    """game.resolve_blocks for many games at once. block_targets has a row
+    for each game and a column for each player in blockers, holding the
+    player they blocked (-1 for no one). Return a boolean array of which
+    players are blocked in each game."""
+
+    UNKNOWN, BLOCKED, UNBLOCKED = range(3)
+
+    # targeted[game, i, player]: blockers[i] blocked player
+    targeted = block_targets[:, :, None] == np.arange(num_players)
+    num_blockers = targeted.sum(axis=1)
+    status = np.where(num_blockers > 0, UNKNOWN, UNBLOCKED)
+
+    # Each pass settles at least one more blocker, unless the rest are in
+    # cycles
+    for i in range(len(blockers) + 1):
+        blocker_status = status[:, blockers][:, :, None]
+        has_unblocked_blocker = (targeted &
+                                 (blocker_status == UNBLOCKED)).any(axis=1)
+        num_blocked_blockers = (targeted &
+                                (blocker_status == BLOCKED)).sum(axis=1)
+
+        undecided = status == UNKNOWN
+        new_status = status.copy()
+        new_status[undecided & has_unblocked_blocker] = BLOCKED
+        new_status[undecided & (num_blocked_blockers == num_blockers)] = \
+            UNBLOCKED
+        if (new_status == status).all():
+            break
+        status = new_status
+
+    # Anyone left over is part of (or blocked from) a cycle
+    return status != UNBLOCKED
+
+
+class GameBatch():
+    """The state of many games with the same setup, as arrays with a row for
+    each game and a column for each player. Players are in the same order as
+    in Game.players."""
+
+    def __init__(self, game_roles, num_games, policy, rng, role_table):
+        self.policy = policy
+        self.rng = rng
+
+        setup = sorted((role_table.roles[role_id] for role_id in game_roles),
+            key=lambda r: (r.alignment_id, priority_key(r.night_action)))
+        for role in setup:
+            check_supported(role)
+
+        self.num_games = num_games
+        self.num_players = len(setup)
+        self.role_ids = np.array([role.id for role in setup])
+        self.alignment_ids = np.array([role.alignment_id for role in setup])
+
+        def uses(uses, action):
+            return uses if action else 0
+
+        shape = (num_games, self.num_players)
+        self.alive = np.ones(shape, dtype=bool)
+        self.night_uses = np.tile([uses(r.night_action_uses, r.night_action)
+                                   for r in setup], (num_games, 1))
+        self.day_uses = np.tile([uses(r.day_action_uses, r.day_action)
+                                 for r in setup], (num_games, 1))
+        self.guns = np.zeros(shape, dtype=int)
+        self.is_bleeding = np.zeros(shape, dtype=bool)
+        self.last_target = np.full(shape, -1)
+        self.winners = np.full(num_games, UNDECIDED)
+        # Winners of games that are over and have been dropped from the
+        # arrays above
+        self.finished = []
+
+        def with_action(name):
+            return [i for i, role in enumerate(setup)
+                    if role.night_action and role.night_action.name == name]
+
+        # Night actions that matter, in the order they're carried out
+        self.night_actors = [(i, setup[i].night_action)
+                             for name in ("block", "kill", "give gun", "heal")
+                             for i in with_action(name)]
+        self.blockers = with_action("block")
+        self.day_actors = [i for i, role in enumerate(setup)
+                           if role.day_action]
+        self.bleeders = [i for i, role in enumerate(setup)
+                         if role.passive_action]
+
+        # Mafia members in the order they carry out the mafia kill
+        mafia = [i for i, role in enumerate(setup)
+                 if role.alignment_id == MAFIA]
+        self.mafia_hierarchy = np.array(sorted(mafia,
+            key=lambda i: setup[i].id), dtype=int)
+        self.is_mafia = self.alignment_ids == MAFIA
+
+    def active(self):
+        return self.winners == UNDECIDED
+
+    def drop_finished(self):
+        """Remove games that are over from the arrays, so that later turns
+        only spend time on the ones still going."""
+
+        active = self.active()
+        self.finished.append(self.winners[~active])
+        for name in ("alive", "night_uses", "day_uses", "guns", "is_bleeding",
+                     "last_target", "winners"):
+            setattr(self, name, getattr(self, name)[active])
+        self.num_games = len(self.winners)
+
+    def kill(self, games, targets):
+        """Kill targets[i] in games[i] immediately and check for winners,
+        like Game.kill."""
+
+        self.alive[games, targets] = False
+        self.winners[games] = calculate_winners(self.alive[games],
+                                                self.alignment_ids)
+
+    def shoot_random_other(self, shooting, player):
+        """Pick a random living player other than player in each game where
+        shooting is True, and kill them."""
+
+        games = np.flatnonzero(shooting)
+        candidates = self.alive[games]
+        candidates[:, player] = False
+        targets = choose(self.rng, candidates)
+        self.kill(games[targets >= 0], targets[targets >= 0])
+
+    def play_day(self):
+        chance = self.policy.day_action_chance
+
+        # Living players use their day action and then their gun, in order,
+        # as long as the game isn't over
+        for player in range(self.num_players):
+            if player in self.day_actors:
+                shooting = (self.active() & self.alive[:, player] &
+                            (self.day_uses[:, player] != 0) &
+                            (self.rng.random(self.num_games) < chance))
+                self.day_uses[shooting & (self.day_uses[:, player] > 0),
+                              player] -= 1
+                self.shoot_random_other(shooting, player)
+
+            if self.guns.any():
+                shooting = (self.active() & self.alive[:, player] &
+                            (self.guns[:, player] > 0) &
+                            (self.rng.random(self.num_games) < chance))
+                self.guns[shooting, player] -= 1
+                self.shoot_random_other(shooting, player)
+
+        # Lynch a random living player
+        games = np.flatnonzero(self.active())
+        self.kill(games, choose(self.rng, self.alive[games]))
+
+    def night_targets(self, player, action):
+        """Return the target each game's player uses their night action on,
+        or -1 if they don't use it, and use up one of their uses."""
+
+        non_consecutive = action.non_consecutive
+
+        acting = (self.active() & self.alive[:, player] &
+                  (self.night_uses[:, player] != 0))
+        if action.optional:
+            acting &= (self.rng.random(self.num_games) <
+                       self.policy.optional_action_chance)
+
+        candidates = self.alive.copy()
+        if not action.can_target_self:
+            candidates[:, player] = False
+        if non_consecutive:
+            games = np.flatnonzero(self.last_target[:, player] >= 0)
+            candidates[games, self.last_target[games, player]] = False
+
+        targets = choose(self.rng, candidates)
+        acting &= targets >= 0
+        targets[~acting] = -1
+
+        self.night_uses[acting & (self.night_uses[:, player] > 0),
+                        player] -= 1
+        if non_consecutive:
+            self.last_target[acting, player] = targets[acting]
+        return targets
+
+    def play_night(self):
+        active = self.active()
+        kills = np.zeros(self.alive.shape, dtype=int)
+
+        # The first living member of the mafia hierarchy does the mafia kill
+        living_mafia = self.alive[:, self.mafia_hierarchy]
+        has_killer = active & living_mafia.any(axis=1)
+        killer = np.zeros(self.num_games, dtype=int)
+        if has_killer.any():
+            killer[has_killer] = self.mafia_hierarchy[
+                living_mafia[has_killer].argmax(axis=1)]
+        mafia_targets = choose(self.rng, self.alive & ~self.is_mafia)
+        mafia_targets[~has_killer] = -1
+
+        targets = {player: self.night_targets(player, action)
+                   for player, action in self.night_actors}
+
+        if self.blockers:
+            blocked = resolve_blocks(
+                np.stack([targets[p] for p in self.blockers], axis=1),
+                self.blockers, self.num_players)
+        else:
+            blocked = np.zeros(self.alive.shape, dtype=bool)
+
+        def performed(player_targets, players):
+            """Return the games in which players weren't blocked and used
+            their action, and their targets in those games."""
+
+            games = np.flatnonzero((player_targets >= 0) &
+                                   ~blocked[np.arange(self.num_games),
+                                            players])
+            return games, player_targets[games]
+
+        # Resolve actions in the same order as Game.process_night_actions.
+        # Blocks have already been taken care of.
+        games, victims = performed(mafia_targets, killer)
+        kills[games, victims] += 1
+        for player, action in self.night_actors:
+            games, player_targets = performed(targets[player], player)
+            if action.name == "kill":
+                kills[games, player_targets] += 1
+            elif action.name == "give gun":
+                self.guns[games, player_targets] += 1
+            elif action.name == "heal":
+                kills[games, player_targets] = 0
+
+        # Bleeders survive their first night kill, and die the night after
+        for player in self.bleeders:
+            can_bleed = active & self.alive[:, player]
+            bleeding = can_bleed & self.is_bleeding[:, player]
+            hit = can_bleed & ~bleeding & (kills[:, player] > 0)
+            kills[bleeding, player] += 1
+            kills[hit, player] -= 1
+            self.is_bleeding[hit, player] = True
+
+        self.alive &= kills == 0
+        games = np.flatnonzero(active)
+        self.winners[games] = calculate_winners(self.alive[games],
+                                                self.alignment_ids)
+
+    def result(self):
+        """Return a SimulationResult with who won each game."""
+
+        winners = np.concatenate(self.finished + [self.winners])
+
+        result = SimulationResult()
+        result.num_games = len(winners)
+        for code, count in zip(*np.unique(winners, return_counts=True)):
+            result.wins[winner_names[code]] += int(count)
+
+        for player, role_id in enumerate(self.role_ids):
+            role_id = int(role_id)
+            result.role_counts[role_id] += len(winners)
+            result.role_wins[role_id] += int(
+                (winners == self.alignment_ids[player]).sum())
+        return result
+
+def check_supported(role):
+    """Raise ValueError if role has an action this module can't simulate."""
+
+    for action, supported in ((role.night_action, supported_night_actions),
+                              (role.day_action, supported_day_actions),
+                              (role.passive_action,
+                               supported_passive_actions)):
+        if action and action.name not in supported:
+            raise ValueError("Can't estimate setups with the {} role".format(
+                role.name))
+
+def estimate(game_roles, day_start, num_games=10000, policy=None, seed=None,
+             max_turns=200, role_table=None):
+    """Play num_games games with the given roles (from role_table, the
+    current one by default), following policy (a RandomPolicy; only its
+    chances are used), and return a SimulationResult. Games that aren't
+    over after max_turns phases count as won by None."""
+
+    if not available:
+        raise RuntimeError("Estimating win chances needs NumPy")
+
+    start_time = time.perf_counter()
+    batch = GameBatch(game_roles, num_games, policy or RandomPolicy(),
+                      np.random.default_rng(seed),
+                      role_table or registry.table)
+
+    is_day = day_start
+    for turn in range(max_turns):
+        if is_day:
+            batch.play_day()
+        else:
+            batch.play_night()
+        is_day = not is_day
+
+        batch.drop_finished()
+        if not batch.num_games:
+            break
+
+    result = batch.result()
+    result.elapsed = time.perf_counter() - start_time
+    return result
@@ -1 +0,0 @@
-from .roles import roles
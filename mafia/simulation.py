@@ -0,0 +1,248 @@
+"""Play lots of games without a UI to see how balanced a setup is.
+
+Usage:
+    python -m mafia.simulation [--games N] [--processes N] [--night] ROLE_ID...
+"""
+
+from mafia.engine.roles import registry, MAFIA
+from mafia.engine.actions import ActionError
+from mafia.engine.game import Game, GameOver
+
+from collections import Counter
+from multiprocessing import Pool
+from random import Random
+import argparse
+import os
+import time
+
+class RandomPolicy():
+    """Makes every decision uniformly at random, according to this
+    random-play model:
+
+    - During the day, each living player (in order of id) uses their day
+      action, if they can, with probability day_action_chance, and then
+      their gun, if they have one, with the same probability, each time on
+      a random other living player. Then a random living player is lynched.
+    - At night, each player asked for an action (in the game's order) uses
+      it on random valid targets: living players, not themselves unless the
+      action allows it, not their last target for heals, and never a
+      member of the mafia for the mafia kill. Optional actions are only used
+      with probability optional_action_chance.
+    """
+
+    def __init__(self, day_action_chance=0.5, optional_action_chance=0.5):
+        self.day_action_chance = day_action_chance
+        self.optional_action_chance = optional_action_chance
+
+    def day_action_target(self, game, player, rng):
+        """Return the target of player's day action today, or None if they
+        shouldn't use it."""
+
+        return self.random_other(game, player, rng)
+
+    def gunshot_target(self, game, player, rng):
+        """Return the player that player should shoot today, or None."""
+
+        return self.random_other(game, player, rng)
+
+    def lynch_target(self, game, rng):
+        """Return the player to lynch today, or None for no lynch."""
+
+        return rng.choice(game.living_players())
+
+    def night_targets(self, game, player, action, rng):
+        """Return a list of targets for player's night action, or None if
+        they shouldn't use it."""
+
+        if action.optional and rng.random() >= self.optional_action_chance:
+            return None
+
+        is_mafia_kill = action == game.role_table.actions["mafia kill"]
+        is_heal = action.name == "heal"
+        candidates = [p for p in game.living_players()
+                      if (p != player or action.can_target_self)
+                      and not (is_mafia_kill and p.alignment_id == MAFIA)
+                      and not (is_heal and p == player.last_target)]
+
+        if len(candidates) < action.targets:
+            return None
+        return rng.sample(candidates, action.targets)
+
+    def random_other(self, game, player, rng):
+        if rng.random() >= self.day_action_chance:
+            return None
+
+        candidates = [p for p in game.living_players() if p != player]
+        return rng.choice(candidates) if candidates else None
+
+
+def play_day(game, policy, rng):
+    for player in game.living_players():
+        if player.has_day_action():
+            target = policy.day_action_target(game, player, rng)
+            if target:
+                game.do_day_action(player, [target])
+
+        if player.can_use_gun():
+            target = policy.gunshot_target(game, player, rng)
+            if target:
+                game.do_gunshot(player, target)
+
+    lynchee = policy.lynch_target(game, rng)
+    if lynchee:
+        game.lynch(lynchee)
+    else:
+        game.end_day()
+    game.start_night()
+
+def play_night(game, policy, rng):
+    while game.action_queue:
+        player, action = game.next_action()
+        game.pop_next_action()
+
+        if not (action == game.role_table.actions["mafia kill"] or
+                player.has_night_action()):
+            continue
+
+        targets = policy.night_targets(game, player, action, rng)
+        if targets:
+            try:
+                game.do_night_action(player, action, targets)
+            except ActionError:
+                pass
+
+    game.process_night_actions()
+    game.end_night()
+    game.start_day()
+
+def play_game(game_roles, day_start, policy, rng, max_turns=200,
+              role_table=None):
+    """Play a game to the end and return it. If it isn't over after
+    max_turns phases, its winner is left as None."""
+
+    game = Game(game_roles, day_start, seed=rng.getrandbits(32),
+                role_table=role_table)
+
+    try:
+        for turn in range(max_turns):
+            if game.phase == "day":
+                play_day(game, policy, rng)
+            else:
+                play_night(game, policy, rng)
+    except GameOver:
+        pass
+
+    return game
+
+
+class SimulationResult():
+    """Counts of who won a batch of simulated games."""
+
+    def __init__(self):
+        self.num_games = 0
+        # Winning faction -> number of games won
+        self.wins = Counter()
+        # Role id -> number of players with that role that were on the
+        # winning side, and number of players with that role overall
+        self.role_wins = Counter()
+        self.role_counts = Counter()
+        self.elapsed = 0
+
+    def add_game(self, game):
+        self.num_games += 1
+        self.wins[game.winner] += 1
+        for player in game.players:
+            self.role_counts[player.role.id] += 1
+            if player.alignment.capitalize() == game.winner:
+                self.role_wins[player.role.id] += 1
+
+    def merge(self, other):
+        self.num_games += other.num_games
+        self.wins.update(other.wins)
+        self.role_wins.update(other.role_wins)
+        self.role_counts.update(other.role_counts)
+
+    def win_rates(self):
+        """Return a dict of winning faction -> fraction of games won."""
+
+        return {winner: n / self.num_games for winner, n in self.wins.items()}
+
+    def role_win_rates(self):
+        """Return a dict of role id -> fraction of players with that role
+        who ended up on the winning side."""
+
+        return {role_id: self.role_wins[role_id] / n
+                for role_id, n in self.role_counts.items()}
+
+    def games_per_second(self):
+        return self.num_games / self.elapsed if self.elapsed else 0
+
+    def __str__(self):
+        lines = ["{} games in {:.2f}s ({:.0f} games/s)".format(
+            self.num_games, self.elapsed, self.games_per_second())]
+        for winner, rate in sorted(self.win_rates().items(),
+                                   key=lambda t: -t[1]):
+            lines.append("  {:<20} {:6.1%}".format(str(winner), rate))
+        lines.append("Win rate by role:")
+        for role_id, rate in sorted(self.role_win_rates().items()):
+            lines.append("  {:<20} {:6.1%}".format(
+                registry.table.roles[role_id].name, rate))
+        return "\n".join(lines)
+
+def simulate_chunk(args):
+    """Play games start, ..., start + count - 1 of a simulation. Each game
+    gets its own random number generator seeded from the simulation's seed
+    and the game's number, so results don't depend on how games are split
+    between processes."""
+
+    game_roles, day_start, policy, seed, start, count, role_table = args
+    result = SimulationResult()
+    for i in range(start, start + count):
+        rng = Random("{}-{}".format(seed, i))
+        result.add_game(play_game(game_roles, day_start, policy, rng,
+                                  role_table=role_table))
+    return result
+
+def simulate(game_roles, day_start, num_games, policy=None, seed=0,
+             processes=None, chunk_size=500, role_table=None):
+    """Play num_games games with the given roles (from role_table, the
+    current one by default) and return a SimulationResult. Games are spread
+    over a pool of processes (as many as there are CPUs by default); with
+    processes=1 everything runs in this process."""
+
+    policy = policy or RandomPolicy()
+    role_table = role_table or registry.table
+    chunks = [(game_roles, day_start, policy, seed, start,
+               min(chunk_size, num_games - start), role_table)
+              for start in range(0, num_games, chunk_size)]
+
+    result = SimulationResult()
+    start_time = time.perf_counter()
+
+    if processes == 1:
+        for chunk in chunks:
+            result.merge(simulate_chunk(chunk))
+    else:
+        with Pool(processes) as pool:
+            for chunk_result in pool.imap_unordered(simulate_chunk, chunks):
+                result.merge(chunk_result)
+
+    result.elapsed = time.perf_counter() - start_time
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate games with random play.")
+    parser.add_argument("roles", metavar="ROLE_ID", type=int, nargs="+")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--night", action="store_true",
+                        help="start at night instead of during the day")
+    args = parser.parse_args()
+
+    print(simulate(args.roles, not args.night, args.games, seed=args.seed,
+                   processes=args.processes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""Work out exactly how likely each faction is to win with a small setup.
+
+Games follow the random-play model of simulation.RandomPolicy. Instead of
+sampling games, the solver goes through every way each phase can turn out,
+with its probability, and combines the chances of winning from each
+resulting state. States are canonicalized so that states which only differ
+in which of several identical players something happened to are solved
+once, and solved states are kept in a table that can be saved to disk.
+
+A state is a tuple of the living players in the same order as
+Game.players, each described by a tuple
+(role id, night uses left, day uses left, guns, is bleeding, last target),
+where the last target (of heals) is an index into the state or -1.
+Each Solver works with one RoleTable, and its saved tables are kept apart
+from those of other versions of the roles.
+"""
+
+from mafia.estimate import no_op_actions, check_supported
+from mafia.engine.roles import registry, MAFIA, TOWN, CULT
+from mafia.simulation import RandomPolicy
+from mafia.engine.game import priority_key, resolve_blocks
+
+from itertools import product
+import os
+import pickle
+import threading
+import zlib
+
+# Indices into a player's tuple
+ROLE, NIGHT_USES, DAY_USES, GUNS, BLEEDING, LAST_TARGET = range(6)
+
+# Order of the probabilities in the solver's results
+winners = ("Mafia", "Town", "Cult", "no one")
+NO_ONE = winners.index("no one")
+
+def calculate_winner(alignment_ids):
+    """Game.calculate_winner, given the alignment ids of the living players.
+    Return an index into winners, or None."""
+
+    num_living = len(alignment_ids)
+    living_mafia = alignment_ids.count(MAFIA)
+    living_cult = alignment_ids.count(CULT)
+
+    if not num_living:
+        return NO_ONE
+    if alignment_ids.count(TOWN) == num_living:
+        return TOWN
+    elif living_mafia >= num_living / 2:
+        return MAFIA
+    elif living_cult >= num_living / 2:
+        return CULT
+
+class SetupTooLarge(Exception):
+    """Raised when solving a setup would take too long."""
+
+    pass
+
+def add_result(total, result, probability):
+    for i, p in enumerate(result):
+        total[i] += probability * p
+
+def dump_table(table):
+    """Serialize a table of solved states. States only hold numbers, so
+    there's no need for the game store's helpers."""
+
+    return zlib.compress(pickle.dumps(table, pickle.HIGHEST_PROTOCOL))
+
+def load_table(data):
+    """Inverse of dump_table."""
+
+    return pickle.loads(zlib.decompress(data))
+
+def use(uses):
+    """Return the number of uses left after using an action once."""
+
+    return uses - 1 if uses > 0 else uses
+
+
+class Solver():
+    """Solves setups under a RandomPolicy. Results for every state solved so
+    far are kept in self.table. If directory is given, the states solved for
+    each setup are saved there and loaded again the next time the same setup
+    is asked for.
+
+    Solving takes time exponential in the number of players, so solve raises
+    SetupTooLarge once it has gone through max_steps ways that actions can
+    turn out without finishing. Setups are made of the roles in role_table
+    (the current one by default).
+
+    Once the table has more than max_states states, it's emptied before
+    the next setup is looked up, so that a long-running process doesn't
+    keep every state it has ever solved. Saved tables are loaded again
+    when they're needed."""
+
+    def __init__(self, policy=None, directory=None, max_steps=10**6,
+                 role_table=None, max_states=10**6):
+        self.policy = policy or RandomPolicy()
+        self.role_table = role_table or registry.table
+        self.roles = self.role_table.roles
+        # Role id -> whether players with that role keep track of their
+        # last target
+        self.tracks_target = [
+            bool(role.night_action) and role.night_action.non_consecutive
+            for role in self.roles]
+        self.directory = directory
+        self.max_steps = max_steps
+        self.max_states = max_states
+        self.steps = 0
+        # (is day, state) -> tuple of probabilities of each winner
+        self.table = {}
+        self.lock = threading.Lock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def has_target(self, player):
+        """Return True if this player's role keeps track of its last
+        target."""
+
+        return self.tracks_target[player[ROLE]]
+
+    def state_winner(self, players):
+        return calculate_winner([self.roles[p[ROLE]].alignment_id
+                                 for p in players])
+
+    def canonical(self, players, alive=None):
+        """Return the canonical state for a list of players (in id order),
+        only keeping the ones that are alive (all of them by default).
+
+        Players next to each other with exactly the same tuple can be
+        swapped without changing anything, so last targets that point into
+        a run of such players are moved to the start of the run."""
+
+        if alive is None:
+            alive = [True] * len(players)
+        if all(alive) and all(p[LAST_TARGET] < 0 for p in players):
+            return tuple(players)
+
+        # Drop dead players and renumber last targets
+        new_index = []
+        living = []
+        for player, is_alive in zip(players, alive):
+            new_index.append(len(living) if is_alive else -1)
+            if is_alive:
+                living.append(player)
+        for i, player in enumerate(living):
+            if player[LAST_TARGET] >= 0:
+                living[i] = player[:LAST_TARGET] + (
+                    new_index[player[LAST_TARGET]],)
+
+        # Point last targets to the start of their run. Players that keep
+        # track of their own targets are left alone, since swapping them
+        # would also mean swapping their targets.
+        moved = {}
+        taken = set()
+        for i, player in enumerate(living):
+            target = player[LAST_TARGET]
+            if target < 0 or self.has_target(living[target]):
+                continue
+
+            if target not in moved:
+                start = target
+                while start > 0 and living[start - 1] == living[target]:
+                    start -= 1
+                while start in taken:
+                    start += 1
+                moved[target] = start
+                taken.add(start)
+            living[i] = player[:LAST_TARGET] + (moved[target],)
+
+        return tuple(living)
+
+    def initial_state(self, game_roles):
+        """Return the state at the start of a game with the given roles.
+        Players with the same alignment and priority are ordered by role
+        id."""
+
+        setup = sorted((self.roles[role_id]
+                        for role_id in sorted(game_roles)),
+            key=lambda r: (r.alignment_id, priority_key(r.night_action)))
+        for role in setup:
+            check_supported(role)
+            if role.passive_action and role.passive_action_uses != -1:
+                raise ValueError("Can't solve setups with limited passive "
+                                 "actions")
+
+        return self.canonical([
+            (role.id, role.night_action_uses if role.night_action else 0,
+             role.day_action_uses if role.day_action else 0, 0, False, -1)
+            for role in setup])
+
+    def path(self, game_roles, day_start):
+        name = "{}-{}-{}-{}-{}.table".format(
+            self.role_table.version, "day" if day_start else "night",
+            "-".join(str(role_id) for role_id in sorted(game_roles)),
+            self.policy.day_action_chance,
+            self.policy.optional_action_chance)
+        return os.path.join(self.directory, name)
+
+    def load(self, game_roles, day_start):
+        """Load the saved table for a setup, if there is one, and return the
+        key of its starting state. Must hold self.lock."""
+
+        if len(self.table) > self.max_states:
+            self.table.clear()
+
+        key = (day_start, self.initial_state(game_roles))
+        if key not in self.table and self.directory:
+            try:
+                with open(self.path(game_roles, day_start), "rb") as f:
+                    self.table.update(load_table(f.read()))
+            except FileNotFoundError:
+                pass
+        return key
+
+    def lookup(self, game_roles, day_start):
+        """Return what solve would, if the setup has already been solved
+        (here or in a saved table), or None otherwise."""
+
+        with self.lock:
+            result = self.table.get(self.load(game_roles, day_start))
+        if result is not None:
+            return {winner: p for winner, p in zip(winners, result) if p}
+
+    def solve(self, game_roles, day_start):
+        """Return a dict of winner -> probability of winning for a game
+        with the given roles."""
+
+        with self.lock:
+            key = self.load(game_roles, day_start)
+
+            if key not in self.table:
+                num_solved = len(self.table)
+                old_keys = set(self.table)
+                self.steps = 0
+                result = self.value(*key)
+                if self.directory and len(self.table) > num_solved:
+                    self.save(game_roles, day_start,
+                              {k: v for k, v in self.table.items()
+                               if k not in old_keys})
+
+            result = self.table[key]
+            return {winner: p for winner, p in zip(winners, result) if p}
+
+    def save(self, game_roles, day_start, table):
+        """Atomically write table to the file for the given setup."""
+
+        path = self.path(game_roles, day_start)
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(dump_table(table))
+        os.replace(temp, path)
+
+    def take_steps(self, n):
+        self.steps += n
+        if self.steps > self.max_steps:
+            raise SetupTooLarge("Setup is too large to solve exactly")
+
+    def value(self, is_day, state):
+        """Return the probability of each winner from the start of the given
+        phase in the given state."""
+
+        key = (is_day, state)
+        result = self.table.get(key)
+        if result is not None:
+            return result
+
+        total = [0] * len(winners)
+        outcomes = self.day(state) if is_day else self.night(state)
+        for outcome, probability in outcomes.items():
+            if isinstance(outcome, int):
+                # The game is over
+                total[outcome] += probability
+            else:
+                add_result(total, self.value(not is_day, outcome),
+                           probability)
+
+        result = self.table[key] = tuple(total)
+        return result
+
+    def day(self, state):
+        """Return a dict of outcome -> probability for a day starting in the
+        given state, where an outcome is either the state at the start of
+        the next night or the index of a winner."""
+
+        chance = self.policy.day_action_chance
+        # (players, alive) -> probability, in the middle of the day
+        current = {(state, (True,) * len(state)): 1}
+        outcomes = {}
+
+        def shoot(players, alive, shooter, probability, next_states):
+            """Kill a random other living player."""
+
+            targets = [i for i, is_alive in enumerate(alive)
+                       if is_alive and i != shooter]
+            for target in targets:
+                new_alive = alive[:target] + (False,) + alive[target + 1:]
+                winner = calculate_winner([
+                    self.roles[p[ROLE]].alignment_id
+                    for p, a in zip(players, new_alive) if a])
+                if winner is not None:
+                    add(outcomes, winner, probability / len(targets))
+                else:
+                    add(next_states, (players, new_alive),
+                        probability / len(targets))
+            return bool(targets)
+
+        # Players use their day action and then their gun, in order
+        for i in range(len(state)):
+            for step in ("day action", "gun"):
+                self.take_steps(len(current))
+                next_states = {}
+                for (players, alive), probability in current.items():
+                    player = players[i]
+                    if step == "day action":
+                        can_shoot = (self.roles[player[ROLE]].day_action and
+                                     player[DAY_USES] != 0)
+                        used = player[:DAY_USES] + (use(player[DAY_USES]),) + \
+                            player[DAY_USES + 1:]
+                    else:
+                        can_shoot = player[GUNS] > 0
+                        used = player[:GUNS] + (player[GUNS] - 1,) + \
+                            player[GUNS + 1:]
+
+                    if not (alive[i] and can_shoot):
+                        add(next_states, (players, alive), probability)
+                        continue
+
+                    shooters = players[:i] + (used,) + players[i + 1:]
+                    if shoot(shooters, alive, i, probability * chance,
+                             next_states):
+                        add(next_states, (players, alive),
+                            probability * (1 - chance))
+                    else:
+                        add(next_states, (players, alive), probability)
+                current = next_states
+
+        # Lynch a random living player
+        for (players, alive), probability in current.items():
+            next_states = {}
+            shoot(players, alive, None, probability, next_states)
+            for (players, alive), p in next_states.items():
+                add(outcomes, self.canonical(players, alive), p)
+
+        return outcomes
+
+    def night(self, state):
+        """Like day, but for a night starting in the given state."""
+
+        n = len(state)
+        alignment_ids = [self.roles[p[ROLE]].alignment_id for p in state]
+        outcomes = {}
+
+        # Each choice is a list of (probability, player, action name,
+        # target), with an action name of None for not using the action
+        blocks = []
+        choices = []
+
+        # The first living member of the mafia hierarchy does the mafia kill
+        mafia = [i for i in range(n) if alignment_ids[i] == MAFIA]
+        targets = [i for i in range(n) if alignment_ids[i] != MAFIA]
+        if mafia and targets:
+            killer = min(mafia, key=lambda i: (state[i][ROLE], i))
+            choices.append((self.role_table.actions["mafia kill"],
+                            [(1 / len(targets), killer, "mafia kill", t)
+                             for t in targets]))
+
+        for i, player in enumerate(state):
+            action = self.roles[player[ROLE]].night_action
+            if not action or not player[NIGHT_USES]:
+                continue
+            if action.name in no_op_actions and player[NIGHT_USES] < 0:
+                continue
+
+            targets = [t for t in range(n)
+                       if (t != i or action.can_target_self)
+                       and not (self.has_target(player) and
+                                t == player[LAST_TARGET])]
+            if len(targets) < action.targets:
+                continue
+
+            if action.name in no_op_actions:
+                # Only the number of uses left matters
+                targets = [None]
+
+            options = []
+            chance = (self.policy.optional_action_chance if action.optional
+                      else 1)
+            if chance < 1:
+                options.append((1 - chance, i, None, None))
+            options.extend((chance / len(targets), i, action.name, t)
+                           for t in targets)
+            if action.name == "block":
+                blocks.append(options)
+            else:
+                choices.append((action, options))
+
+        # Carry out actions in the same order as process_night_actions
+        choices = [options for action, options in
+                   sorted(choices, key=lambda t: priority_key(t[0]))]
+
+        # Blocks decide whose actions go through, so go through each way
+        # they can turn out first. Everything else only changes players and
+        # kill counts, so ways of getting to the same players and kill
+        # counts can be merged after each action.
+        for combination in product(*blocks):
+            probability = 1
+            players = list(state)
+            blocked_by = {}
+            for p, i, action, target in combination:
+                probability *= p
+                if action:
+                    players[i] = self.used_night_action(players[i], target)
+                    blocked_by.setdefault(target, []).append(i)
+            blocked = resolve_blocks(blocked_by)
+
+            current = {(tuple(players), (0,) * n): probability}
+            for options in choices:
+                self.take_steps(len(current) * len(options))
+                next_states = {}
+                for (players, kills), probability in current.items():
+                    for p, i, action, target in options:
+                        add(next_states,
+                            self.perform(players, kills, blocked, i, action,
+                                         target),
+                            probability * p)
+                current = next_states
+
+            for (players, kills), probability in current.items():
+                players, alive = self.bleed(players, kills)
+                next_state = self.canonical(players, alive)
+                winner = self.state_winner(next_state)
+                add(outcomes, next_state if winner is None else winner,
+                    probability)
+
+        return outcomes
+
+    def used_night_action(self, player, target):
+        """Return player after using their night action on target."""
+
+        last_target = (target if self.has_target(player)
+                       else player[LAST_TARGET])
+        return (player[ROLE], use(player[NIGHT_USES])) + \
+            player[DAY_USES:LAST_TARGET] + (last_target,)
+
+    def perform(self, players, kills, blocked, i, action, target):
+        """Return (players, kills) after player i tries to use action on
+        target."""
+
+        if action is None:
+            return players, kills
+
+        if action != "mafia kill":
+            # Uses go down even if the player is blocked
+            players = replace(players, i,
+                              self.used_night_action(players[i], target))
+        if i in blocked:
+            return players, kills
+
+        if action in ("mafia kill", "kill"):
+            kills = replace(kills, target, kills[target] + 1)
+        elif action == "give gun":
+            player = players[target]
+            players = replace(players, target,
+                              player[:GUNS] + (player[GUNS] + 1,) +
+                              player[GUNS + 1:])
+        elif action == "heal":
+            kills = replace(kills, target, 0)
+        return players, kills
+
+    def bleed(self, players, kills):
+        """Carry out bleeders' passive actions, and return the players at the
+        end of the night and which of them are still alive."""
+
+        if not any(self.roles[player[ROLE]].passive_action
+                   for player in players):
+            return players, [not k for k in kills]
+
+        players = list(players)
+        kills = list(kills)
+        for i, player in enumerate(players):
+            if not self.roles[player[ROLE]].passive_action:
+                continue
+            if player[BLEEDING]:
+                kills[i] += 1
+            elif kills[i]:
+                kills[i] -= 1
+                players[i] = (player[:BLEEDING] + (True,) +
+                              player[BLEEDING + 1:])
+        return players, [not k for k in kills]
+
+def replace(t, i, x):
+    """Return tuple t with t[i] replaced by x."""
+
+    return t[:i] + (x,) + t[i + 1:]
+
+def add(outcomes, outcome, probability):
+    outcomes[outcome] = outcomes.get(outcome, 0) + probability
@@ -1,6 +1,6 @@
-from mafia.models.roles import actions
-from mafia.views.game import *
-from mafia.views.actions import InvalidTargetError
+from mafia.engine.roles import actions
+from mafia.engine.game import *
+from mafia.engine.actions import InvalidTargetError
 
 import pytest
 
@@ -42,6 +42,55 @@ def test_block():
     do_default_night_action(game, hooker, [detective])
     assert game.has_been_blocked(detective)
 
+def test_blocked_vig():
+    game = Game([2, 6, 3, 3], False)
+
+    hooker = next(players_with_role_id(game, 2))
+    vigilante = next(players_with_role_id(game, 6))
+    villager = next(players_with_role_id(game, 3))
+
+    do_default_night_action(game, vigilante, [villager])
+    do_default_night_action(game, hooker, [vigilante])
+    game.process_night_actions()
+    game.end_night()
+
+    assert villager.is_alive
+
+def test_blocked_hooker():
+    # The order the blocks were submitted in shouldn't matter
+    for order in [0, 1]:
+        game = Game([2, 2, 6, 3, 3, 3, 3], False)
+
+        hookers = list(players_with_role_id(game, 2))
+        vigilante = next(players_with_role_id(game, 6))
+        villager = next(players_with_role_id(game, 3))
+
+        do_default_night_action(game, vigilante, [villager])
+        blocks = [(hookers[0], hookers[1]), (hookers[1], vigilante)]
+        if order:
+            blocks.reverse()
+        for hooker, target in blocks:
+            do_default_night_action(game, hooker, [target])
+        game.process_night_actions()
+        game.end_night()
+
+        assert not villager.is_alive
+
+def test_night_log_kept():
+    game = Game([2, 4, 3], False)
+
+    hooker = next(players_with_role_id(game, 2))
+    detective = next(players_with_role_id(game, 4))
+
+    do_default_night_action(game, hooker, [detective])
+    do_default_night_action(game, detective, [hooker])
+    game.process_night_actions()
+
+    assert isinstance(game.action_logs[-1], ActionLog)
+    assert len(game.action_logs[-1]) == 2
+    assert [e.player for e in game.action_log.targeting(detective)] == \
+        [hooker]
+
 ## INSPECTING
 def test_detective_town():
     game = Game([3, 4], False)
@@ -276,3 +325,16 @@ def test_bleeder_healed_after():
     game.end_night()
 
     assert not bleeder.is_alive
+
+### BINDING ACTIONS
+
+def test_bind_actions():
+    from mafia.engine.actions import bind_actions, heal
+    from mafia.engine.roles import Action
+
+    assert actions["heal"].handler is heal
+    assert actions["heal"].non_consecutive
+    assert not actions["kill"].non_consecutive
+
+    with pytest.raises(ValueError):
+        bind_actions([Action(id=99, name="teleport", priority=0.0)])
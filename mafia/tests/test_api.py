@@ -0,0 +1,125 @@
+from mafia.engine.store import GameConflict
+from mafia import views
+from mafia.wsgi import app
+
+import pytest
+
+## HELPERS
+@pytest.fixture
+def client():
+    return app.test_client()
+
+def create(client, roles, day_start=False):
+    response = client.post("/api/v1/games", json={
+        "roles": roles, "day_start": day_start, "seed": 0})
+    assert response.status_code == 201
+    state = response.get_json()
+    client.environ_base["HTTP_AUTHORIZATION"] = "Bearer " + state["token"]
+    return "/api/v1/games/{}".format(state["id"]), state
+
+def player_with_role(state, role):
+    return next(p["id"] for p in state["players"] if p["role"] == role)
+
+## TESTS
+def test_create_game(client):
+    url, state = create(client, [0, 3, 3, 5])
+
+    assert state["phase"] == "Night 1"
+    assert state["next_action"]["action"] == "mafia kill"
+    assert [p["id"] for p in state["players"]] == [0, 1, 2, 3]
+    assert client.get(url).get_json() == {
+        key: value for key, value in state.items()
+        if key not in ["id", "token"]}
+
+def test_night(client):
+    url, state = create(client, [0, 3, 3, 3, 5])
+    villager = player_with_role(state, "Villager")
+    doctor = player_with_role(state, "Doctor")
+
+    delta = client.post(url + "/night-action",
+                        json={"targets": [villager]}).get_json()
+    assert delta["next_action"] == {"player": doctor, "action": "heal"}
+    assert delta["players"] == []
+
+    # Skip the heal
+    delta = client.post(url + "/night-action", json={}).get_json()
+    assert delta["next_action"] is None
+
+    delta = client.post(url + "/end-phase").get_json()
+    assert delta["phase"] == "Day 1"
+    assert [p["id"] for p in delta["players"]] == [villager]
+    assert not delta["players"][0]["alive"]
+    assert "Tell everyone to wake up" in delta["messages"]
+
+def test_lynch_game_over(client):
+    url, state = create(client, [0, 3, 3], day_start=True)
+    mafia = player_with_role(state, "Mafia")
+
+    # Rejected by the game itself
+    response = client.post(url + "/day-action",
+                           json={"player": mafia, "target": 1})
+    assert response.status_code == 400
+
+    delta = client.post(url + "/lynch", json={"player": mafia}).get_json()
+    assert delta["winner"] == "Town"
+
+    response = client.post(url + "/end-phase")
+    assert response.status_code == 409
+
+def test_errors(client):
+    url, state = create(client, [0, 3, 3, 5])
+
+    assert client.get("/api/v1/games/100000").status_code == 404
+    assert client.post(url + "/lynch", json={"player": 0}).status_code == 409
+    assert client.post(url + "/night-action",
+                       json={"targets": [99]}).status_code == 400
+    assert client.post(url + "/night-action", json={
+        "targets": [1], "version": state["version"] - 1}).status_code == 409
+    assert client.post("/api/v1/games", json={"roles": []}).status_code == 400
+
+    response = client.post(url + "/night-action", json={"targets": [1, 2]})
+    assert response.status_code == 400
+    assert response.get_json()["error"]
+
+def test_error_version(client):
+    url, state = create(client, [0, 3, 3, 5], day_start=True)
+    unarmed = next(p["id"] for p in state["players"] if not p["guns"])
+
+    response = client.post(url + "/gunshot", json={
+        "player": unarmed, "target": 0, "version": state["version"]})
+    assert response.status_code == 400
+    assert response.get_json()["version"] == state["version"]
+
+    # Failed calls don't change the version
+    response = client.post(url + "/lynch", json={
+        "player": 0, "version": state["version"]})
+    assert response.status_code == 200
+
+def test_conflict(client, monkeypatch):
+    url, state = create(client, [0, 3, 3, 5], day_start=True)
+
+    def put(game_id, game):
+        raise GameConflict(game_id)
+    monkeypatch.setattr(views.store, "put", put)
+    response = client.post(url + "/lynch", json={"player": 0})
+    assert response.status_code == 409
+    assert response.get_json()["error"]
+
+def test_create_game_validation(client):
+    for data in [{"names": 5}, {"names": ["A"]}, {"day_start": "yes"},
+                 {"seed": "abc"}, {"seed": True}]:
+        data["roles"] = [0, 3, 3]
+        response = client.post("/api/v1/games", json=data)
+        assert response.status_code == 400
+        assert response.get_json()["error"]
+
+def test_token_required(client):
+    url, state = create(client, [0, 3, 3, 5])
+    other_url, other_state = create(client, [0, 3, 3, 5])
+
+    # The client now only has the second game's token
+    assert client.get(other_url).status_code == 200
+    assert client.get(url).status_code == 404
+    assert client.post(url + "/end-phase").status_code == 404
+    response = client.get(url, headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 404
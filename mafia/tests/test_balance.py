@@ -0,0 +1,95 @@
+from mafia.balance import Balance, BalanceCache, wilson_interval
+from mafia.simulation import SimulationResult
+
+import pytest
+import sqlite3
+
+class FakeClock():
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        self.time += 1
+        return self.time
+
+def result(mafia, town):
+    result = SimulationResult()
+    result.num_games = mafia + town
+    result.wins.update({"Mafia": mafia, "Town": town})
+    return result
+
+def test_wilson_interval():
+    low, high = wilson_interval(50, 100)
+
+    assert low < 0.5 < high
+    assert high - low == pytest.approx(0.19, abs=0.01)
+    assert wilson_interval(0, 10)[0] == 0
+    assert wilson_interval(10, 10)[1] == 1
+
+def test_exact():
+    balance = Balance.exact({"Mafia": 0.25, "Town": 0.75})
+
+    assert balance.is_exact
+    assert balance.intervals()["Town"] == (0.75, 0.75)
+
+def test_add_and_get():
+    cache = BalanceCache(":memory:")
+    assert cache.get([0, 3, 3], True) is None
+
+    cache.add([0, 3, 3], True, result(60, 40))
+    cache.add([3, 0, 3], True, result(20, 80))
+    balance = cache.get([3, 3, 0], True)
+
+    assert balance.num_games == 200
+    assert balance.win_rates() == {"Mafia": 0.4, "Town": 0.6}
+    assert cache.get([0, 3, 3], False) is None
+
+def test_refine():
+    cache = BalanceCache(":memory:")
+
+    assert cache.refine([0, 3, 3, 4, 5], True, 100).num_games == 100
+    assert cache.refine([0, 3, 3, 4, 5], True, 100).num_games == 200
+
+def test_lru(tmp_path):
+    cache = BalanceCache(str(tmp_path / "balance.db"), max_setups=2,
+                         clock=FakeClock())
+    cache.add([0, 3], True, result(1, 1))
+    cache.add([0, 3, 3], True, result(1, 1))
+    cache.get([0, 3], True)
+    cache.add([0, 3, 3, 3], True, result(1, 1))
+
+    assert cache.get([0, 3], True)
+    assert cache.get([0, 3, 3], True) is None
+    assert cache.get([0, 3, 3, 3], True)
+
+def test_persistent(tmp_path):
+    path = str(tmp_path / "balance.db")
+    BalanceCache(path).add([0, 3, 3], False, result(3, 1))
+
+    assert BalanceCache(path).get([0, 3, 3], False).wins["Mafia"] == 3
+
+def test_every_game_counted():
+    cache = BalanceCache(":memory:")
+    games = result(5, 3)
+    games.wins.update({"Serial Killer": 1, "no one": 1, None: 2})
+    games.num_games = 12
+    cache.add([0, 3, 3, 8], False, games)
+
+    balance = cache.get([0, 3, 3, 8], False)
+    assert sum(balance.wins.values()) == balance.num_games == 12
+    assert balance.win_rates()["Serial Killer"] == pytest.approx(1 / 12)
+    assert balance.win_rates()[None] == pytest.approx(2 / 12)
+
+def test_old_database(tmp_path):
+    path = str(tmp_path / "balance.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE setups (setup TEXT PRIMARY KEY, "
+               "num_games INTEGER NOT NULL, mafia INTEGER NOT NULL, "
+               "town INTEGER NOT NULL, cult INTEGER NOT NULL, "
+               "no_one INTEGER NOT NULL, last_access REAL NOT NULL)")
+    db.commit()
+    db.close()
+
+    cache = BalanceCache(path)
+    cache.add([0, 3, 3], False, result(3, 1))
+    assert cache.get([0, 3, 3], False).wins["Mafia"] == 3
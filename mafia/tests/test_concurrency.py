@@ -0,0 +1,87 @@
+from mafia import views
+from mafia.wsgi import app
+from mafia.engine.game import Game
+
+from statistics import median
+import re
+import threading
+import time
+
+### HELPERS
+
+class TimedLock():
+    """Wraps a lock to record how long each acquire waited."""
+
+    def __init__(self, lock, waits):
+        self.lock = lock
+        self.waits = waits
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.waits.append(time.perf_counter() - start)
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+def named_game(game_roles, day_start):
+    game = Game(game_roles, day_start)
+    for i, player in enumerate(game.players):
+        player.name = "Player {}".format(i)
+    game.unnamed_players = []
+    return game
+
+### STRESS TESTS
+
+def test_store_lock_per_game():
+    a, b = views.store.allocate_id(), views.store.allocate_id()
+
+    assert views.game_lock(a) is views.game_lock(a)
+    assert views.game_lock(a) is not views.game_lock(b)
+
+def test_hammer_one_game(monkeypatch):
+    num_threads = 8
+    game = named_game([0] + [4] * 30, False)
+    num_actions = len(game.action_queue)
+    game_id = views.add_game(game)
+
+    waits = []
+    lock = views.store.lock(game_id)
+    monkeypatch.setattr(views.store, "lock",
+                        lambda game_id: TimedLock(lock, waits))
+
+    # (version submitted, status code) for every POST
+    results = []
+
+    deadline = time.monotonic() + 30
+
+    def hammer():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["game_id"] = game_id
+
+        while game.phase == "night" and time.monotonic() < deadline:
+            page = client.get("/play").get_data(as_text=True)
+            version = re.search(r'name="version" value="(\d+)"', page)
+            if not version or 'id="night-action"' not in page:
+                continue
+
+            response = client.post("/play", data={
+                "submit": "Skip", "version": version.group(1)})
+            results.append((version.group(1), response.status_code))
+
+    threads = [threading.Thread(target=hammer) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    accepted = [version for version, status in results if status == 302]
+    # Every action was popped exactly once, and each accepted submission was
+    # made against a different version of the game
+    assert len(accepted) == num_actions
+    assert len(set(accepted)) == len(accepted)
+    assert game.phase == "day"
+
+    print("{} requests, lock wait: median {:.1f}us, max {:.1f}us".format(
+        len(waits), median(waits) * 1e6, max(waits) * 1e6))
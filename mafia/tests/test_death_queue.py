@@ -0,0 +1,109 @@
+from mafia.engine.game import DeathQueue
+
+from collections import Counter, deque
+from random import Random
+
+import pytest
+
+### HELPERS
+
+class DequeDeathQueue():
+    """The original deque-based DeathQueue, to check the new one against."""
+
+    def __init__(self):
+        self.queue = deque()
+
+    def enqueue(self, x):
+        self.queue.append(x)
+
+    def dequeue(self):
+        return self.queue.popleft()
+
+    def remove(self, x):
+        self.queue.remove(x)
+
+    def remove_all(self, x):
+        self.queue = deque(e for e in self.queue if e != x)
+
+    def __bool__(self):
+        return bool(self.queue)
+
+    def __contains__(self, x):
+        return x in self.queue
+
+    def __len__(self):
+        return len(self.queue)
+
+def drain(queue):
+    result = []
+    while queue:
+        result.append(queue.dequeue())
+    return result
+
+def random_operations(rng, num_players, length):
+    """Return a random list of (method name, argument) pairs."""
+
+    methods = ["enqueue"] * 4 + ["remove", "remove_all", "dequeue"]
+    return [(rng.choice(methods), rng.randrange(num_players))
+            for i in range(length)]
+
+def apply(queue, method, x):
+    """Call the method on queue, returning the result or the type of
+    exception it raised."""
+
+    try:
+        if method == "dequeue":
+            return queue.dequeue()
+        return getattr(queue, method)(x)
+    except (ValueError, IndexError) as e:
+        return type(e)
+
+### PROPERTY TESTS
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_deque(seed):
+    rng = Random(seed)
+    num_players = rng.randint(1, 8)
+    queue, reference = DeathQueue(), DequeDeathQueue()
+
+    for method, x in random_operations(rng, num_players, rng.randint(0, 60)):
+        result = apply(queue, method, x)
+        expected = apply(reference, method, x)
+
+        if method == "dequeue":
+            # Which player comes out first may differ, but both must agree
+            # on whether the queue was empty. Keep them in sync.
+            assert (result is IndexError) == (expected is IndexError)
+            if result is not IndexError and result != expected:
+                reference.queue.remove(result)
+                reference.queue.appendleft(expected)
+        else:
+            assert result == expected
+
+        assert len(queue) == len(reference)
+        assert bool(queue) == bool(reference)
+        assert all((p in queue) == (p in reference)
+                   for p in range(num_players))
+        assert Counter(queue) == Counter(reference.queue)
+
+    assert Counter(drain(queue)) == Counter(drain(reference))
+
+@pytest.mark.parametrize("seed", range(50))
+def test_insertion_order(seed):
+    rng = Random(seed)
+    queue = DeathQueue()
+    # Players in the order they were added, since they last left the queue
+    order = []
+
+    for method, x in random_operations(rng, 6, 40):
+        apply(queue, method, x)
+        order = [p for p in order if p in queue]
+        if x in queue and x not in order:
+            order.append(x)
+
+    drained = drain(queue)
+    assert list(dict.fromkeys(drained)) == order
+    # All instances of a player come out together
+    assert len(list(dict.fromkeys(drained))) == \
+        len([i for i in range(len(drained))
+             if i == 0 or drained[i] != drained[i - 1]])
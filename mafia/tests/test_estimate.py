@@ -0,0 +1,68 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from mafia.estimate import (estimate, calculate_winners, resolve_blocks,
+                            winner_names)
+from mafia.simulation import simulate
+from mafia.engine.game import Game
+from mafia.engine import game as game_module
+
+from random import Random
+
+def test_calculate_winners():
+    game = Game([0, 2, 3, 3, 4], True)
+    alignment_ids = np.array([p.alignment_id for p in game.players])
+    rng = Random(0)
+
+    for i in range(50):
+        for player in game.players:
+            player.is_alive = rng.random() < 0.5
+        alive = np.array([[p.is_alive for p in game.players]])
+        winner = calculate_winners(alive, alignment_ids)[0]
+
+        assert winner_names[winner] == game.calculate_winner()
+
+def test_resolve_blocks():
+    rng = Random(0)
+    blockers = [0, 1, 2, 3]
+
+    for i in range(100):
+        block_targets = [rng.choice([-1, 0, 1, 2, 3, 4]) for b in blockers]
+        blocked_by = {}
+        for blocker, target in zip(blockers, block_targets):
+            if target >= 0 and target != blocker:
+                blocked_by.setdefault(target, []).append(blocker)
+            else:
+                block_targets[blocker] = -1
+
+        blocked = resolve_blocks(np.array([block_targets]), blockers, 5)[0]
+
+        assert (set(np.flatnonzero(blocked)) ==
+                game_module.resolve_blocks(blocked_by))
+
+@pytest.mark.parametrize("game_roles, day_start", [
+    ([0, 3, 3, 4, 5], True),
+    ([0, 2, 3, 3, 5, 6, 8], False),
+    ([0, 3, 3, 3, 7, 10], True),
+])
+def test_consistent_with_game(game_roles, day_start):
+    # Both play by the same rules, so their results should only differ by
+    # sampling noise
+    estimated = estimate(game_roles, day_start, 4000, seed=0)
+    simulated = simulate(game_roles, day_start, 4000, processes=1)
+
+    for winner in ("Mafia", "Town"):
+        assert (abs(estimated.win_rates().get(winner, 0) -
+                    simulated.win_rates().get(winner, 0)) < 0.04)
+
+    estimated_roles = estimated.role_win_rates()
+    for role_id, rate in simulated.role_win_rates().items():
+        assert abs(estimated_roles[role_id] - rate) < 0.04
+
+def test_estimate_counts():
+    result = estimate([0, 1, 3, 3, 3, 3, 4, 5, 6], False, 500, seed=1)
+
+    assert result.num_games == 500
+    assert sum(result.wins.values()) == 500
+    assert result.role_counts[3] == 2000
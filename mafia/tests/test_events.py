@@ -0,0 +1,85 @@
+from mafia import views
+from mafia.wsgi import app
+from mafia.views.events import GameEvents
+from mafia.engine.game import Game
+
+import threading
+
+def test_publish():
+    events = GameEvents()
+    game = Game([0, 3, 3, 3], True)
+    events.publish(1, game)
+
+    assert [name for _, name, _ in events.wait(1, 0, 0)] == \
+        ["message", "state"]
+    assert events.wait(1, events.last_id(1), 0) == []
+
+    # Nothing changed, so nothing new
+    game.pop_messages()
+    events.publish(1, game)
+    assert events.last_id(1) == 2
+
+    game.kill(game.players[1])
+    events.publish(1, game)
+    event_id, name, state = events.wait(1, 2, 0)[0]
+    assert (event_id, name) == (3, "state")
+    assert state["living"] == [0, 2, 3]
+
+def test_wait_wakes_up():
+    events = GameEvents()
+    game = Game([0, 3, 3, 3], True)
+    result = []
+
+    waiter = threading.Thread(
+        target=lambda: result.extend(events.wait(1, 0, 10)))
+    waiter.start()
+    events.publish(1, game)
+    waiter.join(5)
+
+    assert not waiter.is_alive()
+    assert result
+
+def test_reset_when_behind():
+    events = GameEvents(buffer_size=2)
+    game = Game([0, 3, 3, 3], True)
+    for i in range(5):
+        game.post_message(str(i))
+        events.publish(1, game)
+
+    new_events = events.wait(1, 0, 0)
+    assert new_events[0][1] == "reset"
+    assert [data for _, _, data in new_events[1:]] == ["3", "4"]
+
+def test_reset_when_forgotten():
+    events = GameEvents()
+    game = Game([0, 3, 3, 3], True)
+    events.publish(1, game)
+    last_id = events.last_id(1)
+    events.forget(1)
+    assert events.last_id(1) == 0
+
+    # The client is told to start again rather than waiting for ids that
+    # have gone back to the start
+    assert events.wait(1, last_id, 10) == [(0, "reset", None)]
+    events.publish(1, game)
+    assert [event_id for event_id, _, _ in events.wait(1, 0, 0)] == [1, 2]
+
+def test_stream_and_ack(monkeypatch):
+    monkeypatch.setitem(app.config, "EVENT_STREAM_TIMEOUT", 0)
+    game = Game([0, 3, 3, 3], True)
+    game.unnamed_players = []
+    game_id = views.add_game(game)
+    views.save_game(game_id, game)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["game_id"] = game_id
+
+    response = client.get("/play/events")
+    assert response.mimetype == "text/event-stream"
+    assert "event: state" in response.get_data(as_text=True)
+
+    response = client.post("/play", data={"version": -1},
+                           headers={"Accept": "application/json"})
+    assert response.get_json()["version"] == game.version
+    assert response.get_json()["errors"]
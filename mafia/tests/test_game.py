@@ -1,4 +1,9 @@
-from mafia.views.game import *
+from mafia.engine.roles import TOWN, actions
+from mafia.engine.game import *
+
+import pytest
+import subprocess
+import sys
 
 ## HELPERS
 def do_default_night_action(game, player, targets):
@@ -67,6 +72,28 @@ def test_has_been_blocked_multiple_hookers():
 
     assert game.has_been_blocked(detective)
 
+def test_has_been_blocked_cycle():
+    game = Game([2, 2, 2], False)
+
+    hookers = list(filter(lambda p: p.role.id == 2, game.players))
+    do_default_night_action(game, hookers[0], [hookers[1]])
+    do_default_night_action(game, hookers[1], [hookers[2]])
+    do_default_night_action(game, hookers[2], [hookers[0]])
+
+    assert all(game.has_been_blocked(hooker) for hooker in hookers)
+
+def test_has_been_blocked_broken_cycle():
+    game = Game([2, 2, 2], False)
+
+    hookers = list(filter(lambda p: p.role.id == 2, game.players))
+    do_default_night_action(game, hookers[0], [hookers[1]])
+    do_default_night_action(game, hookers[1], [hookers[0]])
+    do_default_night_action(game, hookers[2], [hookers[0]])
+
+    assert game.has_been_blocked(hookers[0])
+    assert not game.has_been_blocked(hookers[1])
+    assert not game.has_been_blocked(hookers[2])
+
 ### CALCULATING WINNERS
 
 def test_winner_town():
@@ -93,3 +120,160 @@ def test_winner_none_yet():
     game = Game([3, 5, 0], True)
 
     assert not game.calculate_winner()
+
+### LIVING PLAYERS
+
+def test_roster_counts():
+    game = Game([0, 3, 3, 5], True)
+
+    assert game.num_living() == 4
+    assert game.roster.count(TOWN) == 3
+
+    villager = next(filter(lambda p: p.role.id == 3, game.players))
+    game.kill(villager)
+
+    assert villager not in game.living_players()
+    assert game.num_living() == 3
+    assert game.roster.count(TOWN) == 2
+
+def test_roster_by_name():
+    game = Game([0, 3, 3], True)
+    for player, name in zip(game.players, ["c", "a", "b"]):
+        game.set_player_name(player, name)
+
+    assert [name for _, name in game.roster.by_name()] == ["a", "b", "c"]
+
+    game.players[1].is_alive = False
+    assert [name for _, name in game.roster.by_name()] == ["b", "c"]
+
+def test_roster_empty():
+    game = Game([0, 3], True)
+    for player in game.players:
+        player.is_alive = False
+    game.players[0].is_alive = True
+
+    assert game.living_players() == [game.players[0]]
+
+### NIGHT SCHEDULE
+
+def test_schedule_ask_order():
+    game = Game([0, 2, 4, 5, 3, 3, 3], True)
+    detective = next(filter(lambda p: p.role.id == 4, game.players))
+    game.kill(detective)
+    game.start_night()
+
+    # Dead players are still asked, so modless games don't give them away
+    assert [p.role.id for p, _ in game.action_queue] == [0, 2, 4, 5]
+
+def test_schedule_passive_actors():
+    game = Game([0, 8, 3, 3], True)
+    bleeder = next(filter(lambda p: p.role.id == 8, game.players))
+
+    assert list(game.schedule.passive_actors) == [bleeder]
+
+    game.kill(bleeder)
+    assert not game.schedule.passive_actors
+
+def test_schedule_priorities():
+    game = Game([0, 2, 4, 5, 3], False)
+
+    assert game.schedule.priorities == [100, 10, 1, -1]
+    assert list(game.action_log.buckets) == [100, 10, 1, -1]
+
+### ROLE DATA
+
+def test_extra_csv_columns():
+    from mafia.engine.roles import Action
+
+    action = Action(id=0, name="kill", priority=0.0, color="red")
+
+    assert action.name == "kill"
+    assert action.color == "red"
+    assert not hasattr(action, "size")
+
+### VERSIONS
+
+def test_failed_call_keeps_version():
+    game = Game([0, 3, 3, 11], True)
+    version = game.version
+    unarmed = next(player for player in game.players if not player.guns)
+    with pytest.raises(ActionError):
+        game.do_gunshot(unarmed, game.players[-1])
+    assert game.version == version
+
+    with pytest.raises(GameOver):
+        for player in list(game.players):
+            game.lynch(player)
+    assert game.version > version
+
+### FORKS
+
+def player_state(game):
+    return [(p.is_alive, p.guns, p.is_bleeding, p.last_target)
+            for p in game.players]
+
+def test_preview_night():
+    game = Game([0, 0, 3, 3, 3, 5, 10], False)
+    doctor = next(filter(lambda p: p.role.id == 5, game.players))
+    gunsmith = next(filter(lambda p: p.role.id == 10, game.players))
+    villager = next(filter(lambda p: p.role.id == 3, game.players))
+
+    game.do_night_action(game.killing_mafia(), actions["mafia kill"],
+                         [villager])
+    do_default_night_action(game, doctor, [gunsmith])
+    do_default_night_action(game, gunsmith, [doctor])
+    state = player_state(game)
+
+    assert game.preview_night() == ([villager], None)
+    assert player_state(game) == state
+    assert not game.death_queue
+    assert game.num_living() == 7
+
+    game.process_night_actions()
+    game.end_night()
+    assert not villager.is_alive
+    assert doctor.guns == 1
+
+def test_preview_night_winner():
+    game = Game([0, 3, 5], False)
+    doctor = next(filter(lambda p: p.role.id == 5, game.players))
+
+    game.do_night_action(game.killing_mafia(), actions["mafia kill"],
+                         [doctor])
+    assert game.preview_night() == ([doctor], "Mafia")
+    assert game.winner is None
+    assert doctor.is_alive
+    assert game.roster.count(TOWN) == 2
+
+def test_fork_shares_untouched_players():
+    game = Game([0, 3, 3, 3, 8], False)
+    bleeder = next(filter(lambda p: p.role.id == 8, game.players))
+    villager = next(filter(lambda p: p.role.id == 3, game.players))
+
+    game.do_night_action(game.killing_mafia(), actions["mafia kill"],
+                         [villager])
+    fork = game.fork()
+
+    assert fork.players[villager.id] is not villager
+    assert fork.players[bleeder.id] is not bleeder
+    assert sum(a is b for a, b in zip(fork.players, game.players)) == 2
+    assert fork.roster.alive is game.roster.alive
+
+    fork.process_night_actions()
+    fork.end_night()
+    assert fork.num_living() == 4
+    assert game.num_living() == 5
+
+### PACKAGING
+
+def test_engine_without_flask():
+    # The engine and the tools built on it shouldn't pull in the web app
+    code = ("import sys, mafia.engine.journal, mafia.simulation, mafia.solver\n"
+            "web = ('flask', 'werkzeug', 'wtforms', 'flask_wtf', 'multidict',"
+            " 'pkg_resources')\n"
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in web or"
+            " m.startswith('mafia.views')))")
+    output = subprocess.run([sys.executable, "-c", code],
+                            stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,208 @@
+from mafia.engine.roles import actions
+from mafia.engine.game import Game, GameOver
+from mafia.engine.actions import ActionError
+from mafia.engine.journal import GameJournal, GameHistory
+
+import os
+import pytest
+
+## HELPERS
+def state(game):
+    """Return a summary of a game's state for comparisons."""
+
+    return (game.version, game.turn(), game.winner, game.is_modless,
+            list(game.message_queue), len(game.action_logs),
+            [(p.name, p.role.id, p.is_alive, p.night_action_uses_left,
+              p.last_target and p.last_target.id) for p in game.players])
+
+def play(game):
+    """Play through a couple of phases of a Game([0, 0, 3, 3, 4, 5, 6])."""
+
+    for player in list(reversed(game.unnamed_players)):
+        game.set_player_name(player, "Player {}".format(player.id))
+        game.pop_next_unnamed_player()
+
+    mafia, _, villager, _, detective, doctor, vigilante = sorted(
+        game.players, key=lambda p: p.role.id)
+
+    # Night 1
+    game.do_night_action(mafia, actions["mafia kill"], [villager])
+    game.do_night_action(detective, actions["inspect"], [mafia])
+    game.do_night_action(doctor, actions["heal"], [doctor])
+    game.pop_messages()
+    game.process_night_actions()
+    game.end_night()
+    game.start_day()
+
+    # Day 2
+    game.switch_to_modded()
+    game.lynch(mafia)
+    game.start_night()
+
+    # Night 2: invalid target, then a valid one
+    with pytest.raises(Exception):
+        game.do_night_action(doctor, actions["heal"], [doctor])
+    game.do_night_action(vigilante, actions["kill"], [doctor])
+
+def new_game(tmp_path, snapshot_interval=100):
+    game = Game([0, 0, 3, 3, 4, 5, 6], False)
+    GameJournal.create(str(tmp_path), 1, game, snapshot_interval)
+    return game
+
+## TESTS
+def test_same_seed_same_game():
+    game1 = Game([0, 0, 3, 3, 4, 5, 6], False, seed=42)
+    game2 = Game([0, 0, 3, 3, 4, 5, 6], False, seed=42)
+
+    assert [p.id for p in game1.unnamed_players] == \
+        [p.id for p in game2.unnamed_players]
+    assert [p.id for p in game1.mafia_hierarchy] == \
+        [p.id for p in game2.mafia_hierarchy]
+
+def test_recover(tmp_path):
+    game = new_game(tmp_path)
+    play(game)
+
+    recovered = GameJournal.recover(str(tmp_path), 1)
+    assert state(recovered) == state(game)
+
+def test_recover_from_snapshot(tmp_path):
+    game = new_game(tmp_path, snapshot_interval=5)
+    play(game)
+
+    snapshot, num_events = GameJournal.load_snapshot(str(tmp_path), 1, 100)
+    assert num_events > 1
+
+    recovered = GameJournal.recover(str(tmp_path), 1)
+    assert state(recovered) == state(game)
+
+    # The recovered game keeps recording to the same journal
+    recovered.process_night_actions()
+    assert state(GameJournal.recover(str(tmp_path), 1)) == state(recovered)
+
+def test_recover_partial_line(tmp_path):
+    game = new_game(tmp_path)
+    play(game)
+    with open(game.journal.journal_path, "a") as f:
+        f.write('["lynch",')
+
+    assert state(GameJournal.recover(str(tmp_path), 1)) == state(game)
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"),
+                    reason="needs /proc")
+def test_no_open_files(tmp_path):
+    before = len(os.listdir("/proc/self/fd"))
+    games = []
+    for game_id in range(1, 21):
+        game = Game([0, 0, 3, 3, 4, 5, 6], False)
+        GameJournal.create(str(tmp_path), game_id, game)
+        play(game)
+        games.append(game)
+    games += [GameJournal.recover(str(tmp_path), game_id)
+              for game_id in range(1, 21)]
+    assert len(os.listdir("/proc/self/fd")) == before
+
+def test_rebuild_turn(tmp_path):
+    game = new_game(tmp_path)
+    play(game)
+
+    day = GameJournal.rebuild(str(tmp_path), 1, turn="Day 1")
+    assert day.turn() == "Day 1"
+    assert day.is_modless
+    assert sum(p.is_alive for p in day.players) == 6
+
+def test_recover_game_over(tmp_path):
+    game = Game([0, 3], True)
+    GameJournal.create(str(tmp_path), 1, game)
+
+    with pytest.raises(GameOver):
+        game.lynch(game.players[1])
+
+    assert GameJournal.recover(str(tmp_path), 1).winner == "Mafia"
+
+def new_game_with_history(depth=20):
+    game = Game([0, 0, 3, 3, 4, 5, 6], False)
+    game.history = GameHistory(depth)
+    return game
+
+def test_undo(tmp_path):
+    game = new_game_with_history()
+    GameJournal.create(str(tmp_path), 1, game)
+    play(game)
+    night2 = state(game)
+
+    vigilante = next(filter(lambda p: p.role.id == 6, game.players))
+    game.do_night_action(vigilante, actions["kill"], [vigilante])
+    game.undo()
+
+    assert state(game)[1:] == night2[1:]
+    assert game.version > night2[0]
+
+    # Undone in the journal too
+    assert state(GameJournal.recover(str(tmp_path), 1)) == state(game)
+
+def test_undo_game_over():
+    game = Game([0, 3, 3], True)
+    game.history = GameHistory(20)
+    with pytest.raises(GameOver):
+        game.lynch(game.players[1])
+
+    game.undo()
+    assert game.winner is None
+    assert game.num_living() == 3
+
+    with pytest.raises(ActionError):
+        game.undo()
+
+def test_undo_new_messages():
+    game = Game([0, 3, 3, 3, 5], True)
+    game.history = GameHistory(20)
+    villagers = [p for p in game.players if p.role.id == 3]
+    for i, villager in enumerate(villagers):
+        villager.name = "Villager {}".format(i)
+    before = game.num_messages
+    game.lynch(villagers[0])
+    seen = game.num_messages
+
+    # Someone who saw the first lynch sees the second one, even though the
+    # game went back to fewer messages in between
+    game.undo()
+    game.lynch(villagers[1])
+    lynched = "{} was lynched".format(villagers[1].name)
+    assert game.messages_since(seen) == [lynched]
+    assert game.messages_since(before) == [lynched]
+
+def test_failed_action_not_undone():
+    game = new_game_with_history()
+    play(game)
+
+    # play made a failed heal before the vigilante's kill
+    game.undo()
+    game.undo()
+    assert game.turn() == "Day 1"
+
+def test_rewind():
+    game = new_game_with_history()
+    play(game)
+    game.rewind()
+
+    assert game.turn() == "Night 2"
+    assert not game.action_log
+
+    game.rewind()
+    assert game.turn() == "Day 1"
+    assert sum(p.is_alive for p in game.players) == 6
+
+def test_history_depth():
+    game = new_game_with_history(depth=2)
+    play(game)
+
+    assert len(game.history.checkpoints) <= 4
+    assert game.history.base
+
+    # Only the last few checkpoints can be gone back to
+    game.rewind()
+    assert game.turn() == "Night 2"
+    with pytest.raises(ActionError):
+        for i in range(4):
+            game.undo()
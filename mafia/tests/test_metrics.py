@@ -0,0 +1,64 @@
+from mafia.engine.metrics import Histogram
+from mafia.wsgi import app
+
+import re
+import threading
+
+def test_histogram_threads():
+    histogram = Histogram("test_seconds", "Test.", ["route"],
+                          buckets=(0.1, 1))
+    barrier = threading.Barrier(5)
+
+    def record(i):
+        histogram.observe(("/play",), 0.5)
+        histogram.observe(("/done",), 5)
+        # Counted while the thread is running...
+        barrier.wait()
+        barrier.wait()
+
+    threads = [threading.Thread(target=record, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    assert histogram.totals()[("/play",)] == [0, 4, 0, 2.0]
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    # ...and after it's finished
+    histogram.observe(("/play",), 0.05)
+    assert histogram.totals() == {("/play",): [1, 4, 0, 2.05],
+                                  ("/done",): [0, 0, 4, 20]}
+    assert len(histogram.shards) == 1
+
+    lines = histogram.expose().splitlines()
+    assert lines[:2] == ["# HELP test_seconds Test.",
+                         "# TYPE test_seconds histogram"]
+    assert 'test_seconds_bucket{route="/play",le="1"} 5' in lines
+    assert 'test_seconds_bucket{route="/play",le="+Inf"} 5' in lines
+    assert 'test_seconds_count{route="/done"} 4' in lines
+
+def test_metrics_page():
+    client = app.test_client()
+    state = client.post("/api/v1/games", json={
+        "roles": [0, 3, 3, 5], "day_start": False, "seed": 0}).get_json()
+    url = "/api/v1/games/{}/".format(state["id"])
+    client.environ_base["HTTP_AUTHORIZATION"] = "Bearer " + state["token"]
+    while state.get("next_action"):
+        state = client.post(url + "night-action", json={
+            "targets": [state["next_action"]["player"]]}).get_json()
+    client.post(url + "end-phase", json={})
+
+    text = client.get("/metrics").get_data(as_text=True)
+    def value(series):
+        match = re.search("^" + re.escape(series) + r" (\S+)$", text, re.M)
+        return float(match.group(1))
+
+    assert value('mafia_request_seconds_count'
+                 '{route="/api/v1/games",method="POST"}') >= 1
+    assert value('mafia_engine_call_seconds_count'
+                 '{call="process_night_actions"}') >= 1
+    assert value('mafia_action_seconds_count{action="heal"}') >= 1
+    assert (value('mafia_games{state="active"}') +
+            value('mafia_games{state="finished"}')) >= 1
+    assert value("mafia_action_log_entries") >= 2
@@ -0,0 +1,104 @@
+from mafia import views
+from mafia.wsgi import app
+from mafia.engine.game import Game
+from mafia.engine.store import GameConflict
+
+import re
+
+def named_game(game_roles, day_start):
+    game = Game(game_roles, day_start, seed=0)
+    for i, player in enumerate(game.players):
+        player.name = "Player {}".format(i)
+    game.unnamed_players = []
+    return game
+
+def client_for(game_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["game_id"] = game_id
+    return client
+
+def test_not_modified():
+    game = named_game([0, 3, 3, 3], True)
+    game_id = views.add_game(game)
+    client = client_for(game_id)
+
+    response = client.get("/play")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert "Tell everyone to wake up" in response.get_data(as_text=True)
+    assert etag == '"{}-{}-day"'.format(game_id, game.version)
+
+    # Loading the page didn't change the game
+    response = client.get("/play", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert not response.get_data()
+
+    # Each message is shown once per session
+    response = client.get("/play")
+    assert response.status_code == 200
+    assert "Tell everyone to wake up" not in response.get_data(as_text=True)
+    response = client_for(game_id).get("/play")
+    assert "Tell everyone to wake up" in response.get_data(as_text=True)
+
+    game.kill(game.players[1])
+    response = client.get("/play", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_flash_not_cached():
+    game_id = views.add_game(named_game([0, 3, 3, 3], False))
+    client = client_for(game_id)
+    etag = client.get("/play").headers["ETag"]
+
+    # A stale click changes nothing, but its error still has to be shown
+    client.post("/play", data={"submit": "Skip", "version": -1})
+    response = client.get("/play", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "The game has changed" in response.get_data(as_text=True)
+
+def test_conflict(monkeypatch):
+    game = named_game([0, 3, 3, 3], False)
+    game_id = views.add_game(game)
+    client = client_for(game_id)
+
+    def put(game_id, game):
+        raise GameConflict(game_id)
+    monkeypatch.setattr(views.store, "put", put)
+    response = client.post("/play", data={"submit": "Skip",
+                                          "version": game.version})
+    assert response.status_code == 303
+    monkeypatch.undo()
+    assert "The game has changed" in client.get("/play").get_data(
+        as_text=True)
+
+def test_finished_games_deleted(monkeypatch):
+    game = named_game([0, 3, 3, 3], True)
+    game_id = views.add_game(game)
+    game.winner = "Town"
+    views.save_game(game_id, game)
+    client = client_for(game_id)
+    assert client.get("/done").status_code == 200
+    assert game_id in views.finished_games
+
+    monkeypatch.setitem(app.config, "FINISHED_GAME_TIMEOUT", 0)
+    app.test_client().get("/")
+    assert views.store.get(game_id) is None
+    assert game_id not in views.finished_games
+    assert game_id not in views.store.locks
+
+def test_night_resolved_by_last_action():
+    game = named_game([0, 3, 3, 3], False)
+    game_id = views.add_game(game)
+    client = client_for(game_id)
+
+    page = client.get("/play").get_data(as_text=True)
+    while game.phase == "night":
+        version = re.search(r'name="version" value="(\d+)"', page).group(1)
+        client.post("/play", data={"submit": "Skip", "version": version})
+        if game.phase == "night":
+            page = client.get("/play").get_data(as_text=True)
+
+    assert game.phase == "day"
+    assert "Tell everyone to wake up" in client.get("/play").get_data(
+        as_text=True)
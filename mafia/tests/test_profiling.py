@@ -0,0 +1,81 @@
+from mafia.views.profiling import Profiler
+from mafia.views import play
+from mafia.wsgi import app
+
+import os
+import pstats
+import time
+
+def slow_view():
+    time.sleep(0.002)
+    return "done"
+
+def profile_request(profiler, url, address="127.0.0.1"):
+    with app.test_request_context(url,
+                                  environ_base={"REMOTE_ADDR": address}):
+        return app.make_response(profiler.wrap(slow_view)())
+
+def test_not_wrapped_by_default():
+    assert app.view_functions["play.play_game"] is play.play_game
+    assert (app.view_functions["play.play_game_process"] is
+            play.play_game_process)
+
+def test_requested_profile(tmp_path):
+    profiler = Profiler(str(tmp_path), admins=["127.0.0.1"])
+
+    response = profile_request(profiler, "/play?profile")
+    name = response.headers["X-Mafia-Profile"]
+    assert response.get_data(as_text=True) == "done"
+    assert sorted(os.listdir(str(tmp_path))) == [name + ".collapsed",
+                                                 name + ".pstats"]
+
+    stats = pstats.Stats(str(tmp_path / (name + ".pstats")))
+    assert any(func[2] == "slow_view" for func in stats.stats)
+    with open(str(tmp_path / (name + ".collapsed"))) as f:
+        lines = f.read().splitlines()
+    stacks = dict(line.rsplit(" ", 1) for line in lines)
+    assert all(stack.startswith("slow_view (test_profiling.py:")
+               for stack in stacks)
+    sleep = [stack for stack in stacks if "sleep" in stack]
+    assert sleep[0].count(";") == 1
+    assert int(stacks[sleep[0]]) >= 1000
+
+    # Only for admins, and only when asked for
+    response = profile_request(profiler, "/play")
+    assert "X-Mafia-Profile" not in response.headers
+    response = profile_request(profiler, "/play?profile", address="10.0.0.1")
+    assert "X-Mafia-Profile" not in response.headers
+    assert len(os.listdir(str(tmp_path))) == 2
+
+def test_sampled_profiles(tmp_path):
+    profiler = Profiler(str(tmp_path), sample_every=2, keep=3)
+    for i in range(10):
+        response = profile_request(profiler, "/play")
+        assert "X-Mafia-Profile" not in response.headers
+
+    # 5 profiles taken, the oldest 2 deleted
+    files = os.listdir(str(tmp_path))
+    assert len(files) == 6
+    assert sorted(int(file.split("-")[2]) for file in files
+                  if file.endswith(".pstats")) == [3, 4, 5]
+
+def test_keep_none(tmp_path):
+    profiler = Profiler(str(tmp_path), admins=["127.0.0.1"], keep=0)
+    response = profile_request(profiler, "/play?profile")
+    assert response.headers["X-Mafia-Profile"]
+    assert not os.listdir(str(tmp_path))
+
+def test_fewer_than_keep(tmp_path):
+    profiler = Profiler(str(tmp_path), admins=["127.0.0.1"], keep=5)
+    names = [profile_request(profiler, "/play?profile").headers[
+        "X-Mafia-Profile"] for i in range(2)]
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        name + extension for name in names
+        for extension in [".collapsed", ".pstats"])
+
+def test_no_admins_by_default(tmp_path):
+    # Behind a local reverse proxy, every request comes from 127.0.0.1
+    profiler = Profiler(str(tmp_path), admins=app.config["PROFILE_ADMINS"])
+    response = profile_request(profiler, "/play?profile")
+    assert "X-Mafia-Profile" not in response.headers
+    assert not os.listdir(str(tmp_path))
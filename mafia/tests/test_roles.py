@@ -0,0 +1,175 @@
+from mafia.balance import BalanceCache
+from mafia.engine import rolecache, roles as roles_module
+from mafia.engine.game import Game
+from mafia.engine.journal import GameJournal
+from mafia.engine.roles import RoleRegistry, load_table, read_rows
+from mafia.engine.store import dump_game, load_game
+from mafia.solver import Solver
+
+import gc
+import os
+import pytest
+import shutil
+import time
+
+NEW_ROLE = "12,Baker,,,,,,,1,1,Bakes bread.\n"
+
+@pytest.fixture
+def directory(tmp_path):
+    package = os.path.dirname(roles_module.__file__)
+    for name in ["actions.csv", "roles.csv"]:
+        shutil.copy(os.path.join(package, name), str(tmp_path))
+    return str(tmp_path)
+
+@pytest.fixture
+def registry(directory):
+    return RoleRegistry(directory, interval=0)
+
+def edit_roles(directory, text):
+    path = os.path.join(directory, "roles.csv")
+    with open(path, "a") as f:
+        f.write(text)
+    # Make sure the change is seen even if the clock is coarse
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+def test_reload(registry):
+    old = registry.table
+    game = Game([0, 3, 3, 3], True, role_table=old)
+
+    # Nothing changed
+    assert registry.reload() is old
+
+    edit_roles(registry.directory, NEW_ROLE)
+    new = registry.reload()
+    assert new.version != old.version
+    assert new.roles[12].name == "Baker"
+    assert len(old.roles) == 12
+    assert registry.tables == {old.version: old, new.version: new}
+
+    # The game keeps the roles and actions it started with
+    assert game.role_table is old
+    assert game.players[0].role is old.roles[0]
+    game.start_night()
+    assert game.next_action()[1] is old.actions["mafia kill"]
+    new_game = Game([0, 12, 3], True, role_table=new)
+    assert "Baker" in [player.role_name for player in new_game.players]
+
+def test_unused_tables_dropped(registry):
+    old_version = registry.table.version
+    game = Game([0, 3, 3, 3], True, role_table=registry.table)
+    edit_roles(registry.directory, NEW_ROLE)
+    new = registry.reload()
+
+    # Kept while a game uses it
+    gc.collect()
+    assert old_version in registry.tables
+    del game
+    gc.collect()
+    assert list(registry.tables) == [new.version]
+
+def test_solve_reloaded_roles(registry):
+    old = registry.table
+    edit_roles(registry.directory, NEW_ROLE)
+    new = registry.reload()
+
+    # Bakers are vanilla townies
+    chances = Solver(role_table=new).solve([0, 12, 12], True)
+    assert chances == Solver(role_table=old).solve([0, 3, 3], True)
+
+    cache = BalanceCache(":memory:")
+    cache.refine([0, 3, 3, 4, 5], True, 10, role_table=old)
+    assert cache.get([0, 3, 3, 4, 5], True, role_table=new) is None
+    assert cache.refine([0, 12, 12], True, 10, role_table=new).num_games == 10
+
+def test_poll(registry):
+    old = registry.table
+    registry.poll()
+    assert registry.table is old
+
+    edit_roles(registry.directory, NEW_ROLE)
+    registry.poll()
+    deadline = time.monotonic() + 5
+    while registry.table is old and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert registry.table.roles[12].name == "Baker"
+
+def test_bad_file_keeps_table(registry):
+    old = registry.table
+    edit_roles(registry.directory, "12,Baker,not a number\n")
+    with pytest.raises(ValueError):
+        registry.reload()
+    assert registry.table is old
+
+def test_pickle_by_version(registry, monkeypatch):
+    monkeypatch.setattr(roles_module, "registry", registry)
+    old = registry.table
+    game = Game([0, 3, 3, 3], True, role_table=old)
+    edit_roles(registry.directory, NEW_ROLE)
+    registry.reload()
+
+    loaded = load_game(dump_game(game))
+    assert loaded.role_table is old
+    assert loaded.players[1].role is old.roles[3]
+
+def test_load_dropped_table(registry, monkeypatch, tmp_path):
+    monkeypatch.setattr(roles_module, "registry", registry)
+    old_version = registry.table.version
+    game = Game([0, 3, 3, 3], True, role_table=registry.table)
+    GameJournal.create(str(tmp_path), 1, game)
+    game.start_night()
+    data = dump_game(game)
+    path = os.path.join(registry.directory, "roles.csv")
+    with open(path) as f:
+        text = f.read()
+    with open(path, "w") as f:
+        f.write(text.replace(",Villager,", ",Baker,"))
+    edit_roles(registry.directory, "")
+    registry.reload()
+    del game
+    gc.collect()
+    assert old_version not in registry.tables
+
+    # Made again from the saved game rather than taking the current roles
+    loaded = load_game(data)
+    assert loaded.role_table.version == old_version
+    assert registry.tables[old_version] is loaded.role_table
+    assert loaded.players[1].role.name == "Villager"
+    assert loaded.players[1].role is loaded.role_table.roles[3]
+    assert loaded.next_action()[1] is \
+        loaded.role_table.actions["mafia kill"]
+    assert registry.table.roles[3].name == "Baker"
+
+    rebuilt = GameJournal.rebuild(str(tmp_path), 1)
+    assert rebuilt.role_table is loaded.role_table
+
+def test_cache(directory, monkeypatch):
+    assert rolecache.load(directory) is None
+    version = rolecache.build(directory)
+    assert rolecache.load(directory) == read_rows(directory)
+
+    # The csv files aren't parsed at all
+    monkeypatch.setattr(roles_module, "read_rows", None)
+    table = load_table(directory)
+    assert table.version == version
+    assert table.roles[2].night_action is table.actions["block"]
+
+    # Touched but not changed
+    path = os.path.join(directory, "actions.csv")
+    os.utime(path, (0, 0))
+    assert rolecache.load(directory)[0] == version
+
+    monkeypatch.undo()
+    edit_roles(directory, NEW_ROLE)
+    assert rolecache.load(directory) is None
+    assert load_table(directory).roles[12].name == "Baker"
+
+def test_corrupt_cache(directory):
+    rolecache.build(directory)
+    path = rolecache.cache_path(directory)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert rolecache.load(directory) is None
+    with open(path, "wb"):
+        pass
+    assert rolecache.load(directory) is None
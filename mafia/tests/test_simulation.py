@@ -0,0 +1,26 @@
+from mafia.simulation import simulate, play_game, RandomPolicy
+
+from random import Random
+
+def test_play_game():
+    game = play_game([0, 2, 3, 3, 4, 5, 6, 7, 8, 10, 11], True,
+                     RandomPolicy(), Random(0))
+
+    assert game.winner in ("Mafia", "Town", "no one")
+
+def test_simulate_counts():
+    result = simulate([0, 3, 3, 4, 5], False, 50, processes=1)
+
+    assert result.num_games == 50
+    assert sum(result.wins.values()) == 50
+    assert result.role_counts[3] == 100
+    assert 0 <= result.role_win_rates()[5] <= 1
+
+def test_simulate_deterministic():
+    # Results only depend on the seed, not on how games are split up
+    result1 = simulate([0, 3, 3, 4, 5, 6], True, 40, seed=3, processes=1)
+    result2 = simulate([0, 3, 3, 4, 5, 6], True, 40, seed=3, processes=2,
+                       chunk_size=7)
+
+    assert result1.wins == result2.wins
+    assert result1.role_wins == result2.role_wins
@@ -0,0 +1,65 @@
+from mafia.simulation import simulate
+from mafia.solver import Solver, SetupTooLarge
+
+import pytest
+
+def test_solve_simple():
+    solver = Solver()
+
+    assert solver.solve([0, 3], True) == pytest.approx(
+        {"Mafia": 1 / 2, "Town": 1 / 2})
+    assert solver.solve([0, 3, 3], True) == pytest.approx(
+        {"Mafia": 2 / 3, "Town": 1 / 3})
+    assert solver.solve([0, 3, 3], False) == {"Mafia": 1}
+
+def test_role_order():
+    solver = Solver()
+
+    assert (solver.solve([5, 3, 0, 4, 3], False) ==
+            solver.solve([0, 3, 3, 4, 5], False))
+
+def test_canonical():
+    villager = (3, 0, 0, 0, False, -1)
+    doctor = (5, -1, 0, 0, False, 2)
+    canonical = Solver().canonical
+
+    # It doesn't matter which of two identical villagers was healed
+    assert (canonical([doctor, villager, villager]) ==
+            canonical([doctor[:-1] + (1,), villager, villager]))
+    # Or which one died
+    assert (canonical([villager, villager, villager], [True, True, False]) ==
+            canonical([villager, villager, villager], [True, False, True]))
+
+@pytest.mark.parametrize("game_roles, day_start", [
+    ([0, 3, 3, 4, 5], True),
+    ([0, 2, 3, 3, 5, 6, 8], False),
+    ([0, 3, 3, 3, 7, 10], True),
+])
+def test_consistent_with_game(game_roles, day_start):
+    exact = Solver().solve(game_roles, day_start)
+    simulated = simulate(game_roles, day_start, 4000, processes=1)
+
+    assert sum(exact.values()) == pytest.approx(1)
+    for winner in ("Mafia", "Town"):
+        assert abs(exact[winner] - simulated.win_rates()[winner]) < 0.04
+
+def test_saved_tables(tmp_path):
+    result = Solver(directory=str(tmp_path)).solve([0, 3, 3, 4, 5], True)
+
+    solver = Solver(directory=str(tmp_path), max_steps=0)
+    assert solver.solve([0, 3, 3, 4, 5], True) == result
+
+def test_too_large():
+    with pytest.raises(SetupTooLarge):
+        Solver(max_steps=100).solve([0, 2, 3, 3, 4, 5, 6], False)
+
+def test_max_states(tmp_path):
+    solver = Solver(directory=str(tmp_path), max_states=10)
+    result = solver.solve([0, 3, 3, 4, 5], True)
+    assert len(solver.table) > 10
+    solver.solve([0, 3, 3], True)
+    assert len(solver.table) <= 10
+
+    # Loaded back from the saved table
+    solver.max_steps = 0
+    assert solver.solve([0, 3, 3, 4, 5], True) == result
@@ -0,0 +1,230 @@
+from mafia.engine.game import Game
+from mafia.engine.store import (MemoryGameStore, SQLiteGameStore,
+                                TieredGameStore, GameUnpickler, GameConflict)
+
+import io
+import pytest
+
+@pytest.fixture(params=["memory", "sqlite", "tiered"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryGameStore()
+    if request.param == "tiered":
+        return TieredGameStore(str(tmp_path / "games"))
+    return SQLiteGameStore(str(tmp_path / "games.db"))
+
+def test_add_get(store):
+    game = Game([0, 3, 5], True)
+    game_id = store.add(game)
+
+    assert store.get(game_id) is game
+
+def test_distinct_ids(store):
+    assert store.allocate_id() != store.allocate_id()
+
+def test_missing(store):
+    assert store.get(12345) is None
+
+def test_delete(store):
+    game_id = store.add(Game([0, 3], True))
+    store.delete(game_id)
+
+    assert store.get(game_id) is None
+
+def test_loaded_games(store):
+    game = Game([0, 3, 5], True)
+    game_id = store.add(game)
+    assert store.loaded_games() == [game]
+
+    store.delete(game_id)
+    assert store.loaded_games() == []
+
+def test_locks(store):
+    assert store.lock(1) is store.lock(1)
+    assert store.lock(1) is not store.lock(2)
+
+def test_evicted(store):
+    forgotten = []
+    store.on_evict = forgotten.append
+    store.lock(1)
+    held = store.lock(2)
+    with held:
+        store.evicted([1, 2])
+
+    # Held locks are still needed
+    assert store.lock(2) is held
+    assert 1 not in store.locks
+    assert forgotten == [1, 2]
+
+def test_sqlite_shared(tmp_path):
+    path = str(tmp_path / "games.db")
+    worker1 = SQLiteGameStore(path)
+    worker2 = SQLiteGameStore(path)
+
+    game = Game([0, 3, 3, 11], True)
+    game_id = worker1.add(game)
+
+    copy = worker2.get(game_id)
+    assert [p.role for p in copy.players] == [p.role for p in game.players]
+    assert copy.players[0].role is game.players[0].role
+
+    # Changes made by one worker are seen by the other
+    game.lynch(game.players[-1])
+    worker1.put(game_id, game)
+    assert not worker2.get(game_id).players[-1].is_alive
+
+def test_sqlite_stale_cache(tmp_path):
+    path = str(tmp_path / "games.db")
+    worker1 = SQLiteGameStore(path)
+    worker2 = SQLiteGameStore(path)
+    game1 = Game([0, 3, 3, 11], True)
+    game2 = Game([0, 3, 3, 11], True)
+    id1, id2 = worker1.add(game1), worker1.add(game2)
+    worker2.get(id1)
+    worker2.get(id2)
+
+    # Looking up one game doesn't hide changes to another
+    game1.lynch(game1.players[-1])
+    worker1.put(id1, game1)
+    worker2.get(id2)
+    assert not worker2.get(id1).players[-1].is_alive
+
+def test_sqlite_conflict(tmp_path):
+    path = str(tmp_path / "games.db")
+    worker1 = SQLiteGameStore(path)
+    worker2 = SQLiteGameStore(path)
+    game_id = worker1.add(Game([0, 3, 3, 3, 3], True))
+    game1, game2 = worker1.get(game_id), worker2.get(game_id)
+    town1, town2 = [p.id for p in game1.players if p.role.id == 3][:2]
+
+    # Both change the game at once; the second save is turned away
+    game1.lynch(game1.players[town1])
+    worker1.put(game_id, game1)
+    game2.lynch(game2.players[town2])
+    with pytest.raises(GameConflict):
+        worker2.put(game_id, game2)
+
+    game = worker2.get(game_id)
+    assert not game.players[town1].is_alive
+    assert game.players[town2].is_alive
+    game.lynch(game.players[town2])
+    worker2.put(game_id, game)
+
+def test_sqlite_cache_bounded(tmp_path):
+    store = SQLiteGameStore(str(tmp_path / "games.db"), max_games=2)
+    ids = [store.add(Game([0, 3, 3], True)) for i in range(3)]
+    assert list(store.cache) == ids[1:]
+    assert store.evictions == 1
+
+    # Games that are being changed stay
+    with store.lock(ids[1]):
+        game = store.get(ids[1])
+        store.get(ids[0])
+        store.get(ids[2])
+        store.put(ids[1], game)
+    assert list(store.cache) == [ids[2], ids[1]]
+    assert store.get(ids[0]).phase == "day"
+
+def test_sqlite_survives_restart(tmp_path):
+    path = str(tmp_path / "games.db")
+    game_id = SQLiteGameStore(path).add(Game([0, 3, 3], False))
+
+    assert SQLiteGameStore(path).get(game_id).phase == "night"
+
+### TIERED STORE
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+def test_tiered_evicts_lru(tmp_path):
+    store = TieredGameStore(str(tmp_path), max_games=2)
+    forgotten = []
+    store.on_evict = forgotten.append
+    ids = [store.add(Game([0, 3, 3], True)) for i in range(3)]
+
+    assert ids[0] not in store.hot
+    assert store.stats()["evictions"] == 1
+    assert forgotten == ids[:1]
+
+    # Evicted games are loaded back from disk
+    assert store.get(ids[0]).players[0].role.id == 0
+    assert store.stats()["misses"] == 1
+    assert ids[1] not in store.hot
+
+def test_tiered_writes_outside_lock(tmp_path):
+    store = TieredGameStore(str(tmp_path), max_games=1)
+    written = []
+    write = store.write
+
+    def checked_write(game_id, data):
+        # Requests for other games can carry on meanwhile
+        assert not store.hot_lock.locked()
+        write(game_id, data)
+        written.append(game_id)
+
+    store.write = checked_write
+    first = store.add(Game([0, 3, 3], True))
+    second = store.add(Game([0, 3, 3], True))
+    assert written == [first]
+    assert not store.pending
+
+    # Unchanged games aren't written again
+    assert store.get(first) is not None
+    assert written == [first, second]
+    store.get(second)
+    assert written == [first, second]
+
+def test_tiered_max_bytes(tmp_path):
+    store = TieredGameStore(str(tmp_path), max_bytes=1)
+    game_id = store.add(Game([0, 3, 3], True))
+
+    assert not store.hot
+    assert store.get(game_id) is not None
+
+def test_tiered_idle_timeout(tmp_path):
+    clock = FakeClock()
+    store = TieredGameStore(str(tmp_path), idle_timeout=100,
+                            finished_timeout=10, sweep_interval=0,
+                            clock=clock)
+    running = store.add(Game([0, 3, 3], True))
+    finished = Game([0, 3], True)
+    finished.winner = "Mafia"
+    finished = store.add(finished)
+
+    clock.now = 50
+    store.get(running)
+    assert finished not in store.hot
+    assert running in store.hot
+
+    clock.now = 150
+    store.get(finished)
+    assert running not in store.hot
+    assert store.stats()["evictions"] == 2
+
+def test_tiered_hits(tmp_path):
+    store = TieredGameStore(str(tmp_path))
+    game = Game([0, 3, 3], True)
+    game_id = store.add(game)
+
+    assert store.get(game_id) is game
+    assert store.stats()["hits"] == 1
+
+def test_tiered_restart(tmp_path):
+    store = TieredGameStore(str(tmp_path))
+    game_id = store.add(Game([0, 3, 3], True))
+    store.flush()
+
+    restarted = TieredGameStore(str(tmp_path))
+    assert restarted.get(game_id) is not None
+    assert restarted.allocate_id() > game_id
+
+def test_load_moved_classes():
+    # Games saved before the engine moved out of mafia.views
+    from mafia.engine.roles import Action
+    unpickler = GameUnpickler(io.BytesIO())
+    assert unpickler.find_class("mafia.views.game", "Game") is Game
+    assert unpickler.find_class("mafia.models.roles", "Action") is Action
@@ -1,15 +1,191 @@
-# Main-memory table of running games
-games = {}
-next_game_id = 1
+from flask import request, session
+import atexit
+import os
+import time
+from .events import GameEvents
+from ..engine.journal import GameJournal, GameHistory, last_game_id
+from ..engine.roles import registry
+from ..engine.store import (MemoryGameStore, SQLiteGameStore,
+                            TieredGameStore, GameConflict)
+
+# The app the views are registered on, and the state they share, set up by
+# init_app. Only one app can be set up per process.
+app = None
+store = None
+journal_directory = None
+events = None
+# game_id -> time.monotonic() when this process saw the game end, for
+# deleting finished games (see delete_finished_games)
+finished_games = {}
+
+def init_app(flask_app):
+    """Set up the game store and the rest of the views' shared state from
+    flask_app's config, and register the views on it."""
+
+    global app, store, journal_directory, events
+    app = flask_app
+
+    # Table of running games. Set GAME_DATABASE to a file path to keep games
+    # in SQLite instead, so they survive restarts and can be shared between
+    # workers. Set GAME_COLD_STORAGE to a directory to move idle games out of
+    # memory.
+    if app.config.get("GAME_DATABASE"):
+        store = SQLiteGameStore(app.config["GAME_DATABASE"],
+                                max_games=app.config["GAME_CACHE_MAX_GAMES"])
+    elif app.config.get("GAME_COLD_STORAGE"):
+        store = TieredGameStore(
+            app.config["GAME_COLD_STORAGE"],
+            max_games=app.config["GAME_CACHE_MAX_GAMES"],
+            max_bytes=app.config["GAME_CACHE_MAX_BYTES"],
+            idle_timeout=app.config["GAME_IDLE_TIMEOUT"],
+            finished_timeout=app.config["FINISHED_GAME_TIMEOUT"])
+        atexit.register(store.flush)
+    else:
+        store = MemoryGameStore()
+
+    # Set GAME_JOURNAL to a directory to record every change to every game
+    # there, so games can be recovered after a crash. Make sure new game ids
+    # don't clash with the ones in the journal.
+    journal_directory = app.config.get("GAME_JOURNAL")
+    if journal_directory:
+        os.makedirs(journal_directory, exist_ok=True)
+        if hasattr(store, "next_game_id"):
+            store.next_game_id = max(store.next_game_id,
+                                     last_game_id(journal_directory) + 1)
+
+    # Recent changes to each game, streamed to clients by /play/events. Only
+    # changes made by this process are seen.
+    events = GameEvents(app.config["EVENT_BUFFER_SIZE"])
+    store.on_evict = events.forget
+
+    # Delete games FINISHED_GAME_TIMEOUT seconds after they end
+    app.before_request(delete_finished_games)
+
+    # Pick up changes to the role and action csv files without a restart.
+    # New games get the new roles; games already going keep theirs.
+    if app.config["ROLES_POLL_INTERVAL"]:
+        registry.interval = app.config["ROLES_POLL_INTERVAL"]
+        app.before_request(registry.poll)
+
+    # Imported here so that the forms and everything else they need are
+    # only loaded by processes that serve pages
+    from . import start, play, done, api, metrics
+    for module in [start, play, done, api, metrics]:
+        app.register_blueprint(module.bp)
+
+    # Set PROFILE_DIRECTORY to profile requests to the gameplay page (see
+    # profiling.py). Otherwise the views are left as they are.
+    if app.config.get("PROFILE_DIRECTORY"):
+        from .profiling import Profiler
+        profiler = Profiler(app.config["PROFILE_DIRECTORY"],
+                            admins=app.config["PROFILE_ADMINS"],
+                            sample_every=app.config["PROFILE_SAMPLE_EVERY"],
+                            keep=app.config["PROFILE_KEEP"])
+        for endpoint in ["play.play_game", "play.play_game_process"]:
+            app.view_functions[endpoint] = profiler.wrap(
+                app.view_functions[endpoint])
+
+def game_lock(game_id):
+    """Return the lock to hold while handling a request for a game."""
+
+    return store.lock(game_id)
 
 def add_game(game):
-    global games
-    global next_game_id
-    games[next_game_id] = game
-    next_game_id += 1
-    return next_game_id - 1
+    if app.config["CHECKPOINT_DEPTH"]:
+        game.history = GameHistory(app.config["CHECKPOINT_DEPTH"])
+    game_id = store.add(game)
+    if journal_directory:
+        GameJournal.create(journal_directory, game_id, game,
+            snapshot_interval=app.config["JOURNAL_SNAPSHOT_INTERVAL"])
+    return game_id
 
 def get_game(game_id):
-    global games
-    if game_id in games:
-        return games[game_id]
+    game = store.get(game_id)
+    if not journal_directory or game_id is None:
+        return game
+
+    if game is None:
+        # Lost in a crash or restart
+        game = GameJournal.recover(journal_directory, game_id,
+            snapshot_interval=app.config["JOURNAL_SNAPSHOT_INTERVAL"])
+        if game:
+            try:
+                store.put(game_id, game)
+            except GameConflict:
+                # Saved by another process meanwhile, or not in the
+                # database at all
+                game = store.get(game_id) or game
+    elif game.journal is None:
+        # Loaded from somewhere that can't keep the journal
+        GameJournal.attach(journal_directory, game_id, game,
+            snapshot_interval=app.config["JOURNAL_SNAPSHOT_INTERVAL"])
+    return game
+
+def save_game(game_id, game):
+    """Must be called after any change to game's state. Raises GameConflict
+    if another process changed the game first (see the handlers in play.py
+    and api.py)."""
+
+    store.put(game_id, game)
+    events.publish(game_id, game)
+    if game.winner:
+        finished_games.setdefault(game_id, time.monotonic())
+    else:
+        # Still going, or undone back to before the end
+        finished_games.pop(game_id, None)
+
+def delete_game(game_id):
+    """Forget a game everywhere it's kept. Must hold the game's lock."""
+
+    store.delete(game_id)
+    events.forget(game_id)
+    finished_games.pop(game_id, None)
+    if journal_directory:
+        GameJournal.delete(journal_directory, game_id)
+
+def delete_finished_games():
+    """Delete the games that ended at least FINISHED_GAME_TIMEOUT seconds
+    ago. Called before every request."""
+
+    if not finished_games:
+        return
+    deadline = time.monotonic() - app.config["FINISHED_GAME_TIMEOUT"]
+    for game_id, finished in list(finished_games.items()):
+        if finished <= deadline:
+            with game_lock(game_id):
+                if finished_games.get(game_id) == finished:
+                    delete_game(game_id)
+
+def game_etag(game_id, game):
+    """Return the ETag of pages showing game. Everything that changes a game
+    bumps its version, so the pages only change when this does."""
+
+    return "{}-{}-{}".format(game_id, game.version, game.phase)
+
+def cacheable(response, etag):
+    """Give a page its ETag, and have browsers check it every time."""
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def not_modified(etag):
+    """Return a 304 response if the client already has the page with etag,
+    or None if it needs to be rendered. Pages with flashed messages waiting
+    to be shown are always rendered."""
+
+    if "_flashes" in session or not request.if_none_match.contains(etag):
+        return None
+    return cacheable(app.response_class(status=304), etag)
+
+def new_messages(game_id, game):
+    """Return the game's messages that haven't been shown in this session
+    yet, and remember that they have been now. Messages are left on the
+    game, so rendering a page doesn't change it, and each device modding a
+    game sees every message."""
+
+    seen_id, num_seen = session.get("messages_seen", (None, 0))
+    if seen_id != game_id:
+        num_seen = 0
+    session["messages_seen"] = (game_id, game.num_messages)
+    return game.messages_since(num_seen)
@@ -0,0 +1,269 @@
+"""A JSON API for playing games without the HTML forms, e.g. from
+lightweight clients or load testing tools. It calls the same Game methods
+as the gameplay page, and keeps games in the same store.
+
+Players are referred to by their ids, which are fixed for the whole game.
+Every request that changes a game responds with only what changed: the new
+version, any other top-level fields of the state that changed, the players
+that changed and any new messages. Requests that change a game may include
+"version", to be rejected with 409 if the game has changed since then.
+They're also rejected with 409 if another worker changed the game at the
+same time.
+Errors for a game include its current version.
+
+Creating a game returns a token for it, which has to be sent with every
+other request for the game as "Authorization: Bearer <token>"; without
+it, the game can't be found. Games started from the HTML pages have no
+token, so they can't be reached from here."""
+
+from flask import Blueprint, current_app, request
+
+from ..engine.actions import ActionError
+from ..engine.game import Game, GameOver
+from ..engine.roles import registry
+from ..engine.store import GameConflict
+from ..views import add_game, get_game, save_game, game_lock
+
+from functools import wraps
+import hashlib
+import hmac
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+class InvalidRequest(Exception):
+    """Raised when a request doesn't make sense for the game it's for."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def error(message, status=400, **fields):
+    fields["error"] = message
+    return fields, status
+
+@bp.errorhandler(GameConflict)
+def conflict(e):
+    return error("The game was changed by another request at the same time",
+                 409)
+
+def game_token(game_id):
+    """Return the token that gives access to a game through the API. It's
+    made from the game id and the app's secret key, so there's nothing to
+    store."""
+
+    return hmac.new(current_app.config["SECRET_KEY"].encode(),
+                    "api-game-{}".format(game_id).encode(),
+                    hashlib.sha256).hexdigest()
+
+def authorized(game_id):
+    """Return whether the request has the token for the game."""
+
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header, "Bearer " + game_token(game_id))
+
+def player_state(player):
+    return {"id": player.id, "name": player.name, "role": player.role_name,
+            "alignment": player.alignment, "alive": player.is_alive,
+            "guns": player.guns, "bleeding": player.is_bleeding}
+
+def game_state(game):
+    """Return the whole state of a game, as seen by the mod."""
+
+    next_action = game.next_action() if game.phase == "night" else None
+    return {"version": game.version, "phase": game.turn(),
+            "winner": game.winner, "is_modless": game.is_modless,
+            "next_action": next_action and {"player": next_action[0].id,
+                                            "action": next_action[1].name},
+            "players": [player_state(player) for player in game.players]}
+
+def state_delta(before, after, messages):
+    """Return the parts of the state after that are different from the
+    state before, along with the messages posted in between."""
+
+    delta = {key: value for key, value in after.items()
+             if key != "players" and value != before[key]}
+    delta["version"] = after["version"]
+    delta["players"] = [player for old, player
+                        in zip(before["players"], after["players"])
+                        if player != old]
+    delta["messages"] = messages
+    return delta
+
+def get_player(game, player_id):
+    if (not isinstance(player_id, int) or isinstance(player_id, bool) or
+            not 0 <= player_id < len(game.players)):
+        raise InvalidRequest("No player with id {!r}".format(player_id))
+    return game.players[player_id]
+
+def command(method):
+    """Decorator for API views that change a game. The view is called as
+    method(game, data), where data is the JSON body of the request, and the
+    response is the change to the game's state."""
+
+    @wraps(method)
+    def wrapper(game_id):
+        if not authorized(game_id):
+            return error("No such game", 404)
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+
+        with game_lock(game_id):
+            game = get_game(game_id)
+            if not game:
+                return error("No such game", 404)
+            if game.winner:
+                return error("The game is over", 409, version=game.version)
+            if data.get("version", game.version) != game.version:
+                return error("The game has changed since version {}".format(
+                    data["version"]), 409, version=game.version)
+
+            before = game_state(game)
+            num_messages = game.num_messages
+            try:
+                method(game, data)
+            except GameOver:
+                pass
+            except (ActionError, InvalidRequest) as e:
+                # Failed calls don't change the game, so there's nothing to
+                # save
+                return error(str(e), getattr(e, "status", 400),
+                             version=game.version)
+
+            save_game(game_id, game)
+            return state_delta(before, game_state(game),
+                               game.messages_since(num_messages))
+
+    return wrapper
+
+@bp.route("/games", methods=["POST"])
+def api_create_game():
+    """Start a game. Takes "roles", a list of role ids, and optionally
+    "day_start" (default true), "seed" and "names", a list of player names
+    in order of player id (players are named "Player 1" and so on by
+    default). Returns the game's state, id and token."""
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return error("Expected a JSON object")
+
+    role_table = registry.table
+    game_roles = data.get("roles")
+    if (not isinstance(game_roles, list) or not game_roles or
+            not all(isinstance(r, int) and 0 <= r < len(role_table.roles)
+                    for r in game_roles)):
+        return error("roles must be a non-empty list of role ids")
+
+    names = data.get("names") or ["Player {}".format(i + 1)
+                                  for i in range(len(game_roles))]
+    if not isinstance(names, list) or len(names) != len(game_roles):
+        return error("names must be a list with one name for each role")
+
+    day_start = data.get("day_start", True)
+    if not isinstance(day_start, bool):
+        return error("day_start must be true or false")
+    seed = data.get("seed")
+    if seed is not None and (not isinstance(seed, int) or
+                             isinstance(seed, bool)):
+        return error("seed must be an integer")
+
+    game = Game(game_roles, day_start, seed, role_table)
+    game_id = add_game(game)
+    with game_lock(game_id):
+        for player, name in zip(game.players, names):
+            game.set_player_name(player, str(name))
+        while game.next_unnamed_player():
+            game.pop_next_unnamed_player()
+        save_game(game_id, game)
+
+        state = game_state(game)
+        state["id"] = game_id
+        state["token"] = game_token(game_id)
+        return state, 201
+
+@bp.route("/games/<int:game_id>", methods=["GET"])
+def api_game_state(game_id):
+    """Return the whole state of a game."""
+
+    if not authorized(game_id):
+        return error("No such game", 404)
+    with game_lock(game_id):
+        game = get_game(game_id)
+        if not game:
+            return error("No such game", 404)
+        return game_state(game)
+
+@bp.route("/games/<int:game_id>/night-action", methods=["POST"])
+@command
+def api_night_action(game, data):
+    """Submit the action the game is asking for (its "next_action"), with
+    "targets", a list of player ids. Leaving out targets skips the action;
+    actions without targets are used if "use" is true. "player" may be
+    given to check whose action it is."""
+
+    if game.phase != "night" or not game.next_action():
+        raise InvalidRequest("No night action is being asked for", 409)
+
+    player, action = game.next_action()
+    if data.get("player", player.id) != player.id:
+        raise InvalidRequest("It's player {}'s turn".format(player.id), 409)
+
+    targets = data.get("targets") or []
+    if not isinstance(targets, list):
+        raise InvalidRequest("targets must be a list of player ids")
+    targets = [get_player(game, target) for target in targets]
+    use = data.get("use") if not action.targets else bool(targets)
+    can_use = (action == game.role_table.actions["mafia kill"] or
+               player.has_night_action())
+
+    if use and can_use:
+        if len(targets) != action.targets:
+            raise InvalidRequest("This action takes {} target(s)".format(
+                action.targets))
+        game.do_night_action(player, action, targets)
+    game.pop_next_action()
+
+@bp.route("/games/<int:game_id>/day-action", methods=["POST"])
+@command
+def api_day_action(game, data):
+    """Use "player"'s day action on "target"."""
+
+    if game.phase != "day":
+        raise InvalidRequest("It isn't day", 409)
+    game.do_day_action(get_player(game, data.get("player")),
+                       [get_player(game, data.get("target"))])
+
+@bp.route("/games/<int:game_id>/gunshot", methods=["POST"])
+@command
+def api_gunshot(game, data):
+    """Have "player" shoot "target"."""
+
+    if game.phase != "day":
+        raise InvalidRequest("It isn't day", 409)
+    game.do_gunshot(get_player(game, data.get("player")),
+                    get_player(game, data.get("target")))
+
+@bp.route("/games/<int:game_id>/lynch", methods=["POST"])
+@command
+def api_lynch(game, data):
+    """Lynch "player". The day carries on until it's ended."""
+
+    if game.phase != "day":
+        raise InvalidRequest("It isn't day", 409)
+    game.lynch(get_player(game, data.get("player")))
+
+@bp.route("/games/<int:game_id>/end-phase", methods=["POST"])
+@command
+def api_end_phase(game, data):
+    """End the current phase and start the next one. Ending the night skips
+    any actions that haven't been submitted yet and resolves it."""
+
+    if game.phase == "day":
+        game.end_day()
+        game.start_night()
+    else:
+        while game.next_action():
+            game.pop_next_action()
+        game.process_night_actions()
+        game.end_night()
+        game.start_day()
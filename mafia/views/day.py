@@ -1,4 +1,4 @@
-from .actions import ActionError
+from ..engine.actions import ActionError
 
 from flask_wtf import FlaskForm
 import wtforms
@@ -82,7 +82,7 @@ def process_day_click(form, game):
     # No mod yet - minimal information form
     if isinstance(form, ModlessDayForm):
         if form.switch_to_modded.data:
-            game.is_modless = False
+            game.switch_to_modded()
 
         elif form.lynch_submit.data:
             game.lynch(game.players[form.lynchee.data])
@@ -1,20 +1,31 @@
-from mafia import app
-from flask import session, redirect, url_for, render_template, flash
+from flask import (Blueprint, session, redirect, url_for, render_template,
+                   flash, make_response)
 
-from ..views import get_game
+from ..views import (get_game, game_lock, game_etag, cacheable,
+                     not_modified, new_messages)
 
-@app.route("/done")
+bp = Blueprint("done", __name__)
+
+@bp.route("/done")
 def game_over():
 
     game_id = session.setdefault("game_id", None)
-    game = get_game(game_id)
+    with game_lock(game_id):
+        game = get_game(game_id)
+
+        if not game:
+            flash("You don't have a game in progress.")
+            return redirect("/", code=303)
 
-    if not game:
-        flash("You don't have a game in progress.")
-        return redirect("/", code=303)
+        if not game.winner:
+            flash("This game isn't over yet.")
+            return redirect(url_for("play.play_game"), code=303)
 
-    if not game.winner:
-        flash("This game isn't over yet.")
-        return redirect(url_for("play_game"), code=303)
+        etag = game_etag(game_id, game)
+        response = not_modified(etag)
+        if response:
+            return response
 
-    return render_template("done.html", game=game, messages=game.pop_messages())
+        return cacheable(make_response(render_template(
+            "done.html", game=game, messages=new_messages(game_id, game))),
+            etag)
@@ -0,0 +1,128 @@
+from collections import deque
+import json
+import threading
+
+def format_event(event_id, name, data):
+    """Return an event in the text/event-stream format."""
+
+    return "id: {}\nevent: {}\ndata: {}\n\n".format(
+        event_id, name, json.dumps(data, separators=(",", ":")))
+
+def game_summary(game):
+    """Return the parts of a game's state that are streamed to clients when
+    they change."""
+
+    return {"version": game.version, "phase": game.turn(),
+            "winner": game.winner,
+            "living": sorted(player.id for player in game.roster)}
+
+
+class GameEvents():
+    """The latest changes to each game, for streaming to clients as
+    server-sent events.
+
+    Every time a game is saved, publish() works out what has changed since
+    the last time: new messages, a new phase or winner, or players dying.
+    Each change becomes an event with an id that goes up by one each time,
+    and the last buffer_size events of each game are kept, so that clients
+    that lose their connection can pick up where they left off.
+
+    Clients wait on a condition for their game, so waiting costs no more
+    than the greenlet or thread serving the request. Run the app under
+    gevent to serve lots of streams at once (see the README)."""
+
+    def __init__(self, buffer_size=100):
+        self.buffer_size = buffer_size
+        # One lock for everything; each game gets a condition on it, so that
+        # publishing a change only wakes up clients of that game
+        self.lock = threading.Lock()
+        # game_id -> condition notified when the game has new events
+        self.conditions = {}
+        # game_id -> deque of (id, name, data) for the game's recent events
+        self.buffers = {}
+        # game_id -> (number of messages, summary) as of the last event
+        self.published = {}
+        # game_id -> id of the game's last event
+        self.last_ids = {}
+
+    def publish(self, game_id, game):
+        """Add events for whatever has changed in game since it was last
+        published, and wake up anyone waiting for them."""
+
+        summary = game_summary(game)
+        with self.lock:
+            num_messages, old_summary = self.published.get(
+                game_id, (0, None))
+            events = []
+
+            events.extend(("message", message) for message in
+                          game.messages_since(num_messages))
+
+            if summary != old_summary:
+                events.append(("state", summary))
+
+            self.published[game_id] = (game.num_messages, summary)
+            if not events:
+                return
+
+            buffer = self.buffers.get(game_id)
+            if buffer is None:
+                buffer = self.buffers[game_id] = deque(
+                    maxlen=self.buffer_size)
+            for name, data in events:
+                self.last_ids[game_id] = self.last_ids.get(game_id, 0) + 1
+                buffer.append((self.last_ids[game_id], name, data))
+
+            condition = self.conditions.get(game_id)
+            if condition:
+                condition.notify_all()
+
+    def last_id(self, game_id):
+        """Return the id of the game's last event, or 0 if it has none."""
+
+        with self.lock:
+            return self.last_ids.get(game_id, 0)
+
+    def summary(self, game_id):
+        """Return the game's state as of its last event, or None."""
+
+        with self.lock:
+            return self.published.get(game_id, (0, None))[1]
+
+    def wait(self, game_id, last_id, timeout):
+        """Return a list of (id, name, data) for the game's events after the
+        one with id last_id, waiting up to timeout seconds for one if there
+        aren't any yet. If some of the events asked for have already been
+        dropped from the buffer, or the game's events have been forgotten
+        since last_id, the list starts with a "reset" event, telling the
+        client to get the whole state again."""
+
+        with self.lock:
+            condition = self.conditions.get(game_id)
+            if condition is None:
+                condition = self.conditions[game_id] = threading.Condition(
+                    self.lock)
+
+            if self.last_ids.get(game_id, 0) < last_id:
+                # Forgotten since the client's last event
+                return [(self.last_ids.get(game_id, 0), "reset", None)]
+            if self.last_ids.get(game_id, 0) == last_id:
+                condition.wait(timeout)
+
+            buffer = self.buffers.get(game_id, ())
+            events = [event for event in buffer if event[0] > last_id]
+            if buffer and buffer[0][0] > last_id + 1:
+                events.insert(0, (events[0][0] - 1, "reset", None))
+            return events
+
+    def forget(self, game_id):
+        """Drop the events of a game that has been deleted or moved out of
+        memory, waking up anyone waiting for them."""
+
+        with self.lock:
+            self.buffers.pop(game_id, None)
+            self.published.pop(game_id, None)
+            self.last_ids.pop(game_id, None)
+            condition = self.conditions.pop(game_id, None)
+            if condition:
+                condition.notify_all()
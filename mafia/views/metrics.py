@@ -0,0 +1,61 @@
+"""Request latencies, engine timings and game counts at /metrics, in the
+Prometheus text format."""
+
+from flask import Blueprint, Response, g, request
+
+from ..engine.metrics import Histogram, engine_calls, action_calls
+from .. import views
+
+from time import perf_counter
+
+bp = Blueprint("metrics", __name__)
+
+request_times = Histogram("mafia_request_seconds",
+                          "Time taken to handle requests, by route.",
+                          ["route", "method"])
+
+@bp.before_app_request
+def start_timer():
+    g.request_start = perf_counter()
+
+@bp.after_app_request
+def record_time(response):
+    # Only requests that matched a route, so there's a bounded number of
+    # series. Streamed responses are timed until they start.
+    if request.url_rule is not None and "request_start" in g:
+        request_times.observe((request.url_rule.rule, request.method),
+                              perf_counter() - g.request_start)
+    return response
+
+def game_metrics():
+    """Return the counts of the games held by this process, in the
+    Prometheus text format."""
+
+    games = views.store.loaded_games()
+    finished = sum(1 for game in games if game.winner)
+
+    # Past logs may be the same object as the current one
+    logs = {id(log): log for game in games
+            for log in game.action_logs + [game.action_log]}
+    entries = sum(len(log) for log in logs.values())
+
+    return "\n".join([
+        "# HELP mafia_games Games held in memory by this process.",
+        "# TYPE mafia_games gauge",
+        'mafia_games{{state="active"}} {}'.format(len(games) - finished),
+        'mafia_games{{state="finished"}} {}'.format(finished),
+        "# HELP mafia_games_evicted_total Games moved out of memory.",
+        "# TYPE mafia_games_evicted_total counter",
+        "mafia_games_evicted_total {}".format(views.store.evictions),
+        "# HELP mafia_action_log_entries Action log entries held by the "
+        "games in memory.",
+        "# TYPE mafia_action_log_entries gauge",
+        "mafia_action_log_entries {}".format(entries),
+    ]) + "\n"
+
+@bp.route("/metrics")
+def metrics():
+    text = "".join(histogram.expose() for histogram
+                   in [request_times, engine_calls, action_calls])
+    return Response(text + game_metrics(),
+                    mimetype="text/plain; version=0.0.4")
@@ -1,19 +1,64 @@
-from flask import flash, session, redirect, url_for, render_template, request
-from mafia import app
+from flask import (Blueprint, current_app, flash, session, redirect,
+                   url_for, render_template, request, make_response, Response)
 
-from ..models import roles
-from .actions import ActionError
-from .game import GameOver
+from ..engine.actions import ActionError
+from ..engine.game import Game, GameOver
+from ..engine.store import GameConflict
 from .day import *
 from .night import *
-from ..views import get_game
+from .events import format_event, game_summary
+from ..views import (get_game, save_game, game_lock, events, game_etag,
+                     cacheable, not_modified, new_messages)
 
 from flask_wtf import FlaskForm
+import time
 import wtforms
 
+bp = Blueprint("play", __name__)
+
+STALE_PAGE = ("The game has changed since this page was loaded. "
+              "Please try again.")
+
+def wants_ack():
+    """Return True if the client asked for a JSON acknowledgement of a
+    click instead of a redirect, e.g. because it gets updates to the game
+    from /play/events."""
+
+    return request.accept_mimetypes.best == "application/json"
+
+def acknowledge(game, errors=(), endpoint="play.play_game", code=302):
+    """Respond to a click on the gameplay page, either with a small JSON
+    acknowledgement, or by flashing any errors and redirecting to
+    endpoint."""
+
+    if wants_ack():
+        return {"version": game.version, "phase": game.turn(),
+                "winner": game.winner, "errors": list(errors)}
+
+    for error in errors:
+        flash(error)
+    return redirect(url_for(endpoint), code=code)
+
+@bp.errorhandler(GameConflict)
+def conflict(e):
+    """Another worker saved the game while this request was changing it."""
+
+    if wants_ack():
+        return {"errors": [STALE_PAGE]}, 409
+    flash(STALE_PAGE)
+    return redirect(url_for("play.play_game"), code=303)
+
 def strip_whitespace(str):
     return str.strip() if str else None
 
+def resolve_night(game):
+    """Resolve the night once all its actions are in and start the next day.
+    Raises GameOver if the game ends."""
+
+    game.process_night_actions()
+    game.end_night()
+    game.start_day()
+
 class PlayerForm(FlaskForm):
     """A form for entering player info."""
 
@@ -27,143 +72,273 @@ class NextPlayerForm(FlaskForm):
 
     submit = wtforms.SubmitField("Next")
 
-@app.route("/play", methods=["GET"])
+@bp.route("/play", methods=["GET"])
 def play_game():
     """The gameplay page."""
 
     game_id = session.setdefault("game_id", None)
-    game = get_game(game_id)
-
-    if not game:
-        flash("You don't have a game in progress.")
-        return redirect("/", code=303)
-
-    if game.winner:
-        # Current game is already over
-        return redirect(url_for("game_over"), code=303)
-
-    # Check if not all players have entered their names
-    unnamed_player = game.next_unnamed_player()
-    if unnamed_player:
-        if unnamed_player.name:
-            return render_template(
-                "game.html", game=game, pregame=True, form=NextPlayerForm(),
-                role=unnamed_player.secret_role_name())
+    with game_lock(game_id):
+        game = get_game(game_id)
+
+        if not game:
+            flash("You don't have a game in progress.")
+            return redirect("/", code=303)
+
+        if game.winner:
+            # Current game is already over
+            return redirect(url_for("done.game_over"), code=303)
+
+        # Nothing has changed since the client last loaded the page
+        etag = game_etag(game_id, game)
+        response = not_modified(etag)
+        if response:
+            return response
+
+        # Check if not all players have entered their names
+        unnamed_player = game.next_unnamed_player()
+        if unnamed_player:
+            if unnamed_player.name:
+                return cacheable(make_response(render_template(
+                    "game.html", game=game, pregame=True,
+                    form=NextPlayerForm(),
+                    role=unnamed_player.secret_role_name())), etag)
+            else:
+                return cacheable(make_response(render_template(
+                    "game.html", game=game, pregame=True,
+                    form=PlayerForm())), etag)
+
+
+        players = game.roster.by_name()
+
+        # Day phase
+        if game.phase == "day":
+            form = build_day_form(game, players)
+            messages = new_messages(game_id, game)
+
+            return cacheable(make_response(render_template(
+                "game.html", game=game, form=form, messages=messages)), etag)
+
+        # Night phase
         else:
-            return render_template(
-                "game.html", game=game, pregame=True, form=PlayerForm())
+            next_action = game.next_action()
+
+            if next_action:
+                # Ask for a target
+                player = next_action[0]
+                action = next_action[1]
+                messages = new_messages(game_id, game)
+                messages.append("Ask {} for their {} action".format(
+                    player.role_name, action.name))
+                form = build_night_form(game, next_action, players)
+                return cacheable(make_response(render_template(
+                    "game.html", game=game, form=form,
+                    form_type=form.__class__.__name__, messages=messages,
+                    player=player, action=action)), etag)
+
+            else:
+                # All night actions taken. This is normally done when the
+                # last one is submitted, but not if the night started with
+                # none to take.
+                try:
+                    resolve_night(game)
+                except GameOver:
+                    return redirect(url_for("done.game_over"))
+                finally:
+                    save_game(game_id, game)
+
+                # Refresh
+                return redirect(url_for("play.play_game"))
+
+
+        return {"game": game, "messages": game.pop_messages()}
+
+@bp.route("/play/events", methods=["GET"])
+def game_events():
+    """Stream changes to the current game (see events.py). Clients that
+    reconnect with a Last-Event-ID header get the events they missed."""
 
+    game_id = session.setdefault("game_id", None)
+    with game_lock(game_id):
+        game = get_game(game_id)
+        if not game:
+            # Tells EventSource not to reconnect
+            return "", 204
+
+        last_id = request.headers.get("Last-Event-ID", type=int)
+        if last_id is None:
+            # New clients start from the current state
+            last_id = events.last_id(game_id)
+            first = format_event(last_id, "state", game_summary(game))
+        else:
+            first = ""
+
+    heartbeat = current_app.config["EVENT_HEARTBEAT"]
+    timeout = current_app.config["EVENT_STREAM_TIMEOUT"]
+
+    def stream(last_id):
+        yield first
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            new_events = events.wait(game_id, last_id, heartbeat)
+            if not new_events:
+                # A comment, to keep the connection open
+                yield ":\n\n"
+            for event in new_events:
+                yield format_event(*event)
+                last_id = event[0]
+
+    return Response(stream(last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache",
+                             "X-Accel-Buffering": "no"})
+
+@bp.route("/play/preview", methods=["GET"])
+def preview_night():
+    """Tell the mod what would happen if the night were resolved now."""
 
-    players = [(i, player.name) for (i, player) in enumerate(game.players)
-                if player.is_alive]
-    players.sort(key=lambda t: t[1])
+    game_id = session.setdefault("game_id", None)
+    with game_lock(game_id):
+        game = get_game(game_id)
 
-    # Day phase
-    if game.phase == "day":
-        form = build_day_form(game, players)
+        # Modless games have no one who's allowed to know this
+        if (not game or game.winner or game.phase != "night" or
+            game.is_modless or game.next_unnamed_player()):
+            return redirect(url_for("play.play_game"), code=303)
 
-        return render_template(
-            "game.html", game=game, form=form, messages=game.pop_messages())
+        dying, winner = game.preview_night()
 
-    # Night phase
+    if dying:
+        message = "If the night ended now, {} would die".format(
+            ", ".join(player.name for player in dying))
     else:
-        next_action = game.next_action()
-
-        if next_action:
-            # Ask for a target
-            player = next_action[0]
-            action = next_action[1]
-            messages = game.pop_messages()
-            messages.append("Ask {} for their {} action".format(
-                player.role_name, action.name))
-            form = build_night_form(game, next_action, players)
-            return render_template(
-                "game.html", game=game, form=form,
-                form_type=form.__class__.__name__, messages=messages,
-                player=player, action=action)
+        message = "If the night ended now, no one would die"
+    if winner:
+        message += ", and {} would win".format(winner)
+    flash(message + ".")
 
-        else:
-            # All night actions taken
-            game.process_night_actions()
+    return redirect(url_for("play.play_game"), code=303)
 
-            try:
-                game.end_night()
-            except GameOver:
-                return redirect(url_for("game_over"))
+def go_back(method):
+    """Take the current game back with method (Game.undo or Game.rewind)
+    and refresh the gameplay page."""
+
+    game_id = session.setdefault("game_id", None)
+    with game_lock(game_id):
+        game = get_game(game_id)
 
-            game.start_day()
+        if not game:
+            flash("You don't have a game in progress.")
+            return redirect("/", code=303)
 
-            # Refresh
-            return redirect(url_for("play_game"))
+        if request.form.get("version", type=int) != game.version:
+            return acknowledge(game, [STALE_PAGE], code=303)
 
+        errors = []
+        try:
+            method(game)
+        except ActionError as e:
+            errors.append(str(e))
+        save_game(game_id, game)
+        return acknowledge(game, errors, code=303)
+
+@bp.route("/play/undo", methods=["POST"])
+def undo():
+    """Undo the last lynch, kill or action."""
+
+    return go_back(Game.undo)
+
+@bp.route("/play/rewind", methods=["POST"])
+def rewind():
+    """Go back to the start of the current phase."""
 
-    return {"game": game, "messages": game.pop_messages()}
+    return go_back(Game.rewind)
 
-@app.route("/play", methods=["POST"])
+@bp.route("/play", methods=["POST"])
 def play_game_process():
     """Process clicks on the gameplay page."""
 
     game_id = session.setdefault("game_id", None)
-    game = get_game(game_id)
-
-    if not game:
-        flash("You don't have a game in progress.")
-        return redirect("/", code=303)
-
-    if game.winner:
-        # Current game is already over
-        return redirect(url_for("game_over"), code=303)
-
-    # Check for entered player names
-    unnamed_player = game.next_unnamed_player()
-    if unnamed_player:
-        # Find out which form was used
-        submit = request.form["submit"]
-        if submit == "Submit":
-            form = PlayerForm()
-            if not form.validate():
+    with game_lock(game_id):
+        game = get_game(game_id)
+
+        if not game:
+            flash("You don't have a game in progress.")
+            return redirect("/", code=303)
+
+        if game.winner:
+            # Current game is already over
+            return acknowledge(game, endpoint="done.game_over", code=303)
+
+        # Reject clicks made on an out-of-date page, e.g. when two devices
+        # are modding the same game
+        if request.form.get("version", type=int) != game.version:
+            return acknowledge(game, [STALE_PAGE], code=303)
+
+        # Check for entered player names
+        unnamed_player = game.next_unnamed_player()
+        if unnamed_player:
+            # Find out which form was used
+            submit = request.form["submit"]
+            if submit == "Submit":
+                form = PlayerForm()
+                if not form.validate():
+                    return render_template(
+                        "game.html", game=game, pregame=True, form=form)
+
+                game.set_player_name(unnamed_player, form.player_name.data)
+                save_game(game_id, game)
                 return render_template(
-                    "game.html", game=game, pregame=True, form=form)
+                    "game.html", game=game, pregame=True,
+                    form=NextPlayerForm(),
+                    role=unnamed_player.secret_role_name())
+
+            else:
+                game.pop_next_unnamed_player()
+                save_game(game_id, game)
+                return acknowledge(game)
+
+        errors = []
+        if game.phase == "day":
+            if game.is_modless:
+                form = ModlessDayForm()
+            else:
+                form = DayForm()
 
-            unnamed_player.name = form.player_name.data
-            return render_template(
-                "game.html", game=game, pregame=True, form=NextPlayerForm(),
-                role=unnamed_player.secret_role_name())
+            try:
+                print(form.validate())
+                # Process individual player buttons
+                process_day_click(form, game)
+            except ActionError as e:
+                errors.append(str(e))
+            except GameOver:
+                save_game(game_id, game)
+                return acknowledge(game, endpoint="done.game_over")
 
-        else:
-            game.pop_next_unnamed_player()
-            return redirect(url_for("play_game"))
+            # Night phase button clicked
+            if form.start_night.data:
+                game.end_day()
+                game.start_night()
 
-    if game.phase == "day":
-        if game.is_modless:
-            form = ModlessDayForm()
         else:
-            form = DayForm()
-
-        try:
-            print(form.validate())
-            # Process individual player buttons
-            process_day_click(form, game)
-        except ActionError as e:
-            flash(str(e))
-        except GameOver:
-            return redirect(url_for("game_over"))
-
-        # Night phase button clicked
-        if form.start_night.data:
-            game.end_day()
-            game.start_night()
-
-    else:
-        success = False
-        try:
-            success = process_night_click(request, game)
-        except ActionError as e:
-            flash(str(e))
-
-        if success:
-            game.pop_next_action()
-
-    # Refresh the page to invoke play_game again.
-    # This also prevents accidental double requests.
-    return redirect(url_for("play_game"))
+            success = False
+            try:
+                success = process_night_click(request, game)
+            except ActionError as e:
+                errors.append(str(e))
+
+            if success:
+                game.pop_next_action()
+
+                # Resolve the night as soon as it's over, so that loading
+                # the gameplay page never changes the game
+                if not game.next_action():
+                    try:
+                        resolve_night(game)
+                    except GameOver:
+                        save_game(game_id, game)
+                        return acknowledge(game, endpoint="done.game_over")
+
+        save_game(game_id, game)
+
+        # Refresh the page to invoke play_game again.
+        # This also prevents accidental double requests.
+        return acknowledge(game, errors)
@@ -0,0 +1,165 @@
+"""Profiles of single requests to the gameplay page, for finding out why a
+particular game is slow.
+
+Only set up when PROFILE_DIRECTORY is set (see init_app), so that the views
+aren't touched otherwise. A request is profiled when it comes from one of
+PROFILE_ADMINS and has a "profile" query parameter or an X-Mafia-Profile
+header, or when it's one of every PROFILE_SAMPLE_EVERY requests. Each profile
+is written twice: as a .pstats file, for pstats or snakeviz, and as a
+.collapsed file of stacks, for flamegraph.pl or speedscope."""
+
+from flask import make_response, request, session
+
+from functools import wraps
+from itertools import count
+import cProfile
+import os
+import pstats
+import threading
+import time
+
+# Recorded at the end of every profile
+PROFILER_DISABLE = ("~", 0, "<method 'disable' of '_lsprof.Profiler' objects>")
+
+def frame_name(func):
+    """Return a name for a function in a pstats table."""
+
+    filename, line, name = func
+    if filename == "~":
+        # Built in
+        name = name.strip("<>")
+    else:
+        name = "{} ({}:{})".format(name, os.path.basename(filename), line)
+    # ; separates frames in collapsed stacks
+    return name.replace(";", ",")
+
+def collapsed_stacks(stats):
+    """Return the lines of a collapsed stack file for the functions in a
+    pstats.Stats, each a stack of frames and the microseconds spent in the
+    last one.
+
+    cProfile only records which function called which, not whole stacks, so
+    each function's time is shared between the stacks it's called from in
+    proportion to the time spent in it from each caller. Recursive calls
+    are left out."""
+
+    table = stats.stats
+    callees = {}
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in table.items():
+        for caller, edge in callers.items():
+            if caller in table:
+                callees.setdefault(caller, []).append((func, edge[3]))
+        if (not any(caller in table for caller in callers) and
+                func != PROFILER_DISABLE):
+            roots.append((func, ct))
+
+    lines = {}
+
+    def walk(func, stack, seconds):
+        # Stacks of less than a microsecond would show up as 0
+        if seconds < 1e-6:
+            return
+        stack = stack + [func]
+        tt, ct = table[func][2:4]
+        scale = seconds / ct if ct else 0
+        key = ";".join(frame_name(frame) for frame in stack)
+        lines[key] = lines.get(key, 0) + tt * scale
+        for callee, callee_seconds in callees.get(func, []):
+            if callee not in stack:
+                walk(callee, stack, callee_seconds * scale)
+
+    for func, seconds in roots:
+        walk(func, [], seconds)
+    return ["{} {}".format(key, round(seconds * 1e6))
+            for key, seconds in sorted(lines.items())
+            if round(seconds * 1e6) > 0]
+
+class Profiler():
+    """Wraps views to profile some of the requests to them, and keeps the
+    last keep profiles in directory."""
+
+    def __init__(self, directory, admins=(), sample_every=0, keep=50):
+        self.directory = directory
+        self.admins = set(admins)
+        self.sample_every = sample_every
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+        self.requests = count(1)
+        self.profiles = count(1)
+        # Only one profile at a time: the requests it slows down are slow
+        # enough, and newer Pythons only allow one profiler to run at once
+        self.lock = threading.Lock()
+
+    def wanted(self):
+        """Return whether the current request asked to be profiled."""
+
+        return (request.remote_addr in self.admins and
+                ("profile" in request.args or
+                 "X-Mafia-Profile" in request.headers))
+
+    def sampled(self):
+        return (self.sample_every and
+                next(self.requests) % self.sample_every == 0)
+
+    def wrap(self, view):
+        """Return view, profiled when the request asks for it or it's
+        sampled."""
+
+        @wraps(view)
+        def profiled_view(*args, **kwargs):
+            wanted = self.wanted()
+            if not (wanted or self.sampled()):
+                return view(*args, **kwargs)
+            if not self.lock.acquire(blocking=False):
+                # Someone else's request is being profiled
+                return view(*args, **kwargs)
+
+            try:
+                profile = cProfile.Profile()
+                response = profile.runcall(view, *args, **kwargs)
+                name = self.save(profile)
+            finally:
+                self.lock.release()
+
+            if wanted:
+                response = make_response(response)
+                response.headers["X-Mafia-Profile"] = name
+            return response
+
+        return profiled_view
+
+    def save(self, profile):
+        """Write a profile of the current request, delete the oldest
+        profiles past the limit, and return its file name (without the
+        extension)."""
+
+        name = "{}-{:04d}-{}-{}-game{}".format(
+            time.strftime("%Y%m%d-%H%M%S"), next(self.profiles) % 10000,
+            request.endpoint.replace(".", "-"), request.method,
+            session.get("game_id"))
+        path = os.path.join(self.directory, name)
+
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path + ".pstats")
+        with open(path + ".collapsed", "w") as f:
+            f.writelines(line + "\n" for line in collapsed_stacks(stats))
+
+        self.rotate()
+        return name
+
+    def rotate(self):
+        """Delete all but the newest keep profiles."""
+
+        paths = [os.path.join(self.directory, file)
+                 for file in os.listdir(self.directory)
+                 if file.endswith(".pstats")]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(0, len(paths) - self.keep)]:
+            for old in [path, path[:-len(".pstats")] + ".collapsed"]:
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    # Another process got there first
+                    pass
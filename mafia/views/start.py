@@ -1,15 +1,81 @@
-from flask import render_template, session, redirect
-from mafia import app
+from flask import (Blueprint, current_app, render_template, session,
+                   redirect, flash)
 
-from ..models import roles
-from .game import Game
+from ..balance import Balance, BalanceCache
+from ..engine.game import Game
+from ..engine.roles import registry
+from ..solver import Solver, SetupTooLarge
 from ..views import add_game, get_game
 
 from flask_wtf import FlaskForm
 import wtforms
 from multidict import MultiDict
 
-role_choices = [(role.id, role.name) for role in roles]
+bp = Blueprint("start", __name__)
+
+# Set up from the app's config when the views are registered
+solver = None
+balance_cache = None
+
+@bp.record_once
+def set_up_balance(state):
+    global solver, balance_cache
+    config = state.app.config
+    solver = Solver(directory=config["SOLVER_CACHE"],
+                    max_steps=config["SOLVER_MAX_STEPS"],
+                    max_states=config["SOLVER_MAX_STATES"])
+    balance_cache = BalanceCache(config["BALANCE_CACHE"],
+                                 config["BALANCE_CACHE_MAX_SETUPS"])
+
+def current_solver(role_table):
+    """Return a Solver for the roles in role_table. The solver's states only
+    make sense for the roles it was made with, so it's replaced when the
+    roles change."""
+
+    global solver
+    if solver.role_table is not role_table:
+        solver = Solver(directory=current_app.config["SOLVER_CACHE"],
+                        max_steps=current_app.config["SOLVER_MAX_STEPS"],
+                        role_table=role_table,
+                        max_states=current_app.config["SOLVER_MAX_STATES"])
+    return solver
+
+def check_known(game_roles, role_table):
+    """Raise ValueError if a setup has role ids that aren't in role_table,
+    e.g. because it was entered before roles were taken out of the csv
+    files."""
+
+    if any(role_id >= len(role_table.roles) for role_id in game_roles):
+        raise ValueError("This setup has roles that no longer exist")
+
+def cached_balance(game_roles, day_start):
+    """Return the Balance of a setup if it has already been worked out,
+    otherwise None."""
+
+    role_table = registry.table
+    try:
+        check_known(game_roles, role_table)
+        chances = current_solver(role_table).lookup(game_roles, day_start)
+    except ValueError:
+        return None
+    if chances is not None:
+        return Balance.exact(chances)
+    return balance_cache.get(game_roles, day_start, role_table)
+
+def work_out_balance(game_roles, day_start):
+    """Return the Balance of a setup: exact if the setup is small enough,
+    otherwise estimated by simulating more games on top of the ones that
+    have already been counted."""
+
+    role_table = registry.table
+    check_known(game_roles, role_table)
+    try:
+        return Balance.exact(
+            current_solver(role_table).solve(game_roles, day_start))
+    except SetupTooLarge:
+        return balance_cache.refine(game_roles, day_start,
+                                    current_app.config["ESTIMATE_GAMES"],
+                                    role_table)
 
 class GameForm(FlaskForm):
     """A form for entering info to start a game."""
@@ -17,12 +83,24 @@ class GameForm(FlaskForm):
     num_players = wtforms.IntegerField("How many players?")
     set_num_players = wtforms.SubmitField("Go")
 
-    roles = wtforms.FieldList(wtforms.SelectField(
-        choices=role_choices, coerce=int, default=3))
+    # Choices are filled in by __init__, since the roles can be reloaded
+    roles = wtforms.FieldList(wtforms.SelectField(coerce=int, default=3))
 
     start_phase = wtforms.SelectField("Start phase",
         choices=[(0, "Day"), (1, "Night")], coerce=int, default=0)
     submit = wtforms.SubmitField("Start Game")
+    estimate = wtforms.SubmitField("Estimate win chances")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The roles the game will be started with
+        self.role_table = registry.table
+        for entry in self.roles:
+            self.set_role_choices(entry)
+
+    def set_role_choices(self, field):
+        field.choices = [(role.id, role.name)
+                         for role in self.role_table.roles]
 
     def validate_num_players(form, field):
         """Make sure num_players contains an integer that is at least 3.
@@ -40,13 +118,12 @@ class GameForm(FlaskForm):
         fields for exactly n roles."""
 
         num_players = len(self.roles)
-        append_or_pop = (self.roles.append_entry if num_players < n
-            else self.roles.pop_entry)
-
-        for i in range(abs(n - num_players)):
-            append_or_pop()
+        for i in range(num_players, n):
+            self.set_role_choices(self.roles.append_entry())
+        for i in range(n, num_players):
+            self.roles.pop_entry()
 
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 def create_game():
     """The page to enter a number of players and player information."""
 
@@ -54,9 +131,14 @@ def create_game():
     game_id = session.setdefault("game_id", None)
     game = get_game(game_id)
 
-    return render_template("start.html", form=GameForm(data=form), game=game)
+    balance = None
+    if form.get("roles"):
+        balance = cached_balance(form["roles"], not form["start_phase"])
 
-@app.route("/", methods=["POST"])
+    return render_template("start.html", form=GameForm(data=form), game=game,
+                           balance=balance)
+
+@bp.route("/", methods=["POST"])
 def create_game_process():
     """Set the number of players in a game, or start a game if ready."""
 
@@ -80,9 +162,19 @@ def create_game_process():
     # Start a game
     if form.submit.data:
         game = Game([e.data for e in form.roles.entries],
-            not form.start_phase.data)
+            not form.start_phase.data, role_table=form.role_table)
         session["game_id"] = add_game(game)
 
         return redirect("/play")
 
+    # Work out each faction's chances of winning
+    if form.estimate.data:
+        try:
+            response["balance"] = work_out_balance(
+                [e.data for e in form.roles.entries],
+                not form.start_phase.data)
+        except ValueError as e:
+            flash(str(e))
+        return render_template("start.html", **response)
+
     return render_template("start.html", **response)
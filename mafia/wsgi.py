@@ -0,0 +1,5 @@
+"""The app, for WSGI servers, e.g. `gunicorn mafia.wsgi:app`."""
+
+from mafia import create_app
+
+app = create_app()
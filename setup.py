@@ -11,4 +11,10 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=requires,
+    extras_require={
+        # Win chance estimates on the start page
+        'estimate': ['numpy'],
+        # Serving lots of /play/events streams at once
+        'push': ['gevent'],
+    },
 )